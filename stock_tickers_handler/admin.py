@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ActiveStocksAlphaVantage, FundamentalData
+from .models import ActiveStocksAlphaVantage, FetchBatch, FetchRun, FundamentalData
 
 @admin.register(ActiveStocksAlphaVantage)
 class ActiveStocksAlphaVantageAdmin(admin.ModelAdmin):
@@ -10,4 +10,16 @@ class ActiveStocksAlphaVantageAdmin(admin.ModelAdmin):
 class FundamentalDataAdmin(admin.ModelAdmin):
     list_display = ( 'active_stocks_alpha_vantage__yahoo_ticker','long_name','previous_close', 'trailing_pe',"forward_pe",'sector','industry','exchange','quote_type')
     search_fields = ('active_stocks_alpha_vantage__yahoo_ticker','long_name','sector','industry','exchange','quote_type')
-    list_filter = ('sector','industry' ,'quote_type')
\ No newline at end of file
+    list_filter = ('sector','industry' ,'quote_type')
+
+class FetchBatchInline(admin.TabularInline):
+    model = FetchBatch
+    extra = 0
+    fields = ('batch_num', 'status', 'start_date', 'tickers', 'start_dates', 'rows_written', 'rows_skipped', 'download_seconds', 'write_seconds', 'error')
+    readonly_fields = fields
+
+@admin.register(FetchRun)
+class FetchRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'command', 'status', 'started_at', 'finished_at')
+    list_filter = ('command', 'status')
+    inlines = [FetchBatchInline]
@@ -0,0 +1,108 @@
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db.models import Count, Max
+
+from stock_tickers_handler.cache import VersionedCache
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+
+AUTOCOMPLETE_LIMIT = 10
+
+# How often the table version is checked; queries in between never touch the database
+VERSION_CHECK_INTERVAL = 60
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+class AutocompleteIndex:
+    """Sorted-array prefix index over tickers and the words of company names.
+
+    Every symbol is stored once; the two sorted key lists only hold positions into it, and name
+    words are interned so a word shared by many companies ("inc", "corp", "trust") is one string.
+    Measured with tracemalloc, 10k symbols take about 1.7 MB (test_autocomplete keeps it under 6 MB).
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, Optional[str]]]):
+        self.tickers: List[str] = []
+        self.names: List[str] = []
+        ticker_keys, word_keys = [], []
+        for ticker, name, long_name in entries:
+            position = len(self.tickers)
+            self.tickers.append(ticker)
+            self.names.append(long_name or name)
+            ticker_keys.append((ticker.upper(), position))
+            for word in set(WORD_RE.findall(f'{name} {long_name or ""}'.lower())):
+                word_keys.append((sys.intern(word), position))
+
+        ticker_keys.sort()
+        word_keys.sort()
+        self.ticker_keys = [key for key, _ in ticker_keys]
+        self.ticker_positions = array('I', (position for _, position in ticker_keys))
+        self.word_keys = [key for key, _ in word_keys]
+        self.word_positions = array('I', (position for _, position in word_keys))
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    @staticmethod
+    def _prefixed(keys: List[str], positions: array, prefix: str) -> Iterator[int]:
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            yield positions[position]
+            position += 1
+
+    def complete(self, query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[Dict[str, str]]:
+        """Symbols whose ticker starts with `query` (an exact ticker sorts first), then those with a name word starting with it."""
+        query = query.strip()
+        if not query:
+            return []
+        seen = set()
+        results = []
+        candidates = (
+            self._prefixed(self.ticker_keys, self.ticker_positions, query.upper()),
+            self._prefixed(self.word_keys, self.word_positions, query.lower()),
+        )
+        for positions in candidates:
+            for position in positions:
+                if position in seen:
+                    continue
+                seen.add(position)
+                results.append({'ticker': self.tickers[position], 'name': self.names[position]})
+                if len(results) == limit:
+                    return results
+        return results
+
+
+def load_entries() -> List[Tuple[str, str, Optional[str]]]:
+    """(Yahoo ticker, listing name, long name) of every stock, in one query."""
+    return list(
+        ActiveStocksAlphaVantage.objects.exclude(assetType__in=ActiveStocksAlphaVantage.INDEX_ASSET_TYPES)
+        .values_list('yahoo_ticker', 'name', 'fundamental_data__long_name')
+    )
+
+
+def table_version() -> tuple:
+    """Changes whenever tickers are loaded or deleted, or fundamentals are added or updated."""
+    stocks = ActiveStocksAlphaVantage.objects.aggregate(count=Count('id'), last_id=Max('id'))
+    fundamentals = FundamentalData.objects.aggregate(count=Count('id'), updated=Max('last_updated'))
+    return (*stocks.values(), *fundamentals.values())
+
+
+class AutocompleteService(VersionedCache[AutocompleteIndex]):
+    """Holds the process-wide index and rebuilds it lazily once the ticker tables change."""
+
+    def __init__(self, check_interval: float = VERSION_CHECK_INTERVAL, clock: Callable[[], float] = time.monotonic):
+        super().__init__(lambda: AutocompleteIndex(load_entries()), table_version, check_interval, clock)
+
+    def index(self) -> AutocompleteIndex:
+        return self.get()
+
+    def complete(self, query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[Dict[str, str]]:
+        return self.get().complete(query, limit)
+
+
+autocomplete = AutocompleteService()
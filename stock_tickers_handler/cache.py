@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, NamedTuple, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class CacheEntry(NamedTuple):
+    value: object
+    loaded_at: float
+
+
+class StaleWhileRevalidateCache(Generic[T]):
+    """Process-wide cache for one expensive value.
+
+    A value younger than `ttl` seconds is served as is. Between `ttl` and `ttl + stale_ttl` the
+    stale value is still served immediately while one background refresh runs. Past that (or
+    before the first load) callers wait for a refresh. Concurrent callers never start more than
+    one refresh: they all wait on the same in-flight load. A failed refresh keeps serving the
+    last good value if there is one.
+    """
+
+    def __init__(self, loader: Callable[[], T], ttl: float, stale_ttl: float, clock: Callable[[], float] = time.monotonic,
+                 background: bool = True):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.background = background
+        self.last_error: Optional[BaseException] = None
+        self._entry: Optional[CacheEntry] = None
+        self._inflight: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        entry = self._entry
+        if entry is not None:
+            age = self.clock() - entry.loaded_at
+            if age < self.ttl:
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self._start_refresh(wait=False)
+                return entry.value
+        return self._start_refresh(wait=True)
+
+    def peek(self) -> Optional[T]:
+        """The cached value (None before the first load) without ever waiting on the loader.
+
+        A value that is no longer fresh triggers a background refresh for later callers.
+        """
+        entry = self._entry
+        if entry is None or self.clock() - entry.loaded_at >= self.ttl:
+            self._start_refresh(wait=False)
+            entry = self._entry
+        return entry.value if entry is not None else None
+
+    def invalidate(self):
+        self._entry = None
+
+    def _start_refresh(self, wait: bool):
+        with self._lock:
+            future = self._inflight
+            leader = future is None
+            if leader:
+                future = self._inflight = Future()
+
+        if leader:
+            if wait or not self.background:
+                self._refresh(future)
+            else:
+                threading.Thread(target=self._refresh, args=(future,), daemon=True).start()
+        if not wait:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            if self._entry is not None:
+                return self._entry.value
+            raise
+
+    def _refresh(self, future: Future):
+        try:
+            value = self.loader()
+        except Exception as e:
+            self.last_error = e
+            future.set_exception(e)
+        else:
+            self._entry = CacheEntry(value, self.clock())
+            self.last_error = None
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight = None
+
+
+class VersionedCache(Generic[T]):
+    """Process-wide value rebuilt by `loader` whenever the cheap `version()` probe changes.
+
+    The probe runs at most every `check_interval` seconds, so reads in between are answered from
+    memory only. `invalidate()` forces a probe on the next read, e.g. right after this process wrote
+    the underlying rows; other processes notice within `check_interval`.
+    """
+
+    def __init__(self, loader: Callable[[], T], version: Callable[[], object], check_interval: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.loader = loader
+        self.version = version
+        self.check_interval = check_interval
+        self.clock = clock
+        self._value: Optional[T] = None
+        self._version = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        checked_at = self._checked_at
+        if self._value is not None and checked_at is not None and self.clock() - checked_at < self.check_interval:
+            return self._value
+        with self._lock:
+            version = self.version()
+            if self._value is None or version != self._version:
+                self._value = self.loader()
+                self._version = version
+            self._checked_at = self.clock()
+            return self._value
+
+    def invalidate(self):
+        self._checked_at = None
@@ -0,0 +1,170 @@
+import hashlib
+from datetime import date, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db.models import Max, Sum
+
+from stock_tickers_handler.models import TickerWatermark
+from stock_tickers_handler.performance import PriceMatrix, load_adjusted_closes
+
+METHODS = ('pearson', 'spearman')
+
+# Pairs with fewer overlapping returns than this get NaN instead of a noisy coefficient
+MIN_PERIODS = 20
+
+# Column pairs ranked together when scattered gaps leave them an overlap of their own
+PAIR_CHUNK_SIZE = 2000
+
+# Exact per-pair Spearman costs up to one ranking per pair, so it is only the default for sets this small
+EXACT_SPEARMAN_MAX_TICKERS = 30
+
+# Bounds of the ticker sets and windows correlations_view accepts
+MAX_TICKERS = 500
+MAX_WINDOW_DAYS = 3650
+
+# Results only change when new bars arrive, which also changes the cache key
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class CorrelationResult(NamedTuple):
+    tickers: List[str]
+    pearson: np.ndarray
+    spearman: np.ndarray
+    observations: np.ndarray
+
+
+def daily_returns(closes: np.ndarray) -> np.ndarray:
+    """Simple returns between consecutive dates; NaN wherever either close is missing."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return closes[1:] / closes[:-1] - 1
+
+
+def masked_correlation(values: np.ndarray, min_periods: int = MIN_PERIODS) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairwise-complete Pearson correlation of every column pair, in a handful of matrix products.
+
+    Each pair only uses the rows where both columns are present, matching pandas' DataFrame.corr().
+    Returns the correlation matrix and the number of overlapping rows behind each coefficient.
+    """
+    present = ~np.isnan(values)
+    mask = present.astype('float64')
+    x = np.where(present, values, 0.0)
+
+    n = mask.T @ mask
+    # sum_x[i, j] sums column i over the rows where column j is present too
+    sum_x = x.T @ mask
+    sum_xx = (x * x).T @ mask
+    sum_xy = x.T @ x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_xy - sum_x * sum_x.T / n
+        var_x = sum_xx - sum_x ** 2 / n
+        corr = cov / np.sqrt(var_x * var_x.T)
+    corr[n < min_periods] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return corr, n.astype('int64')
+
+
+def rank_columns(values: np.ndarray) -> np.ndarray:
+    """Average ranks within each column, leaving missing values missing."""
+    return pd.DataFrame(values).rank(method='average').to_numpy()
+
+
+def pair_correlations(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Pearson correlation of each column of `first` with the same column of `second`; both are NaN on the same rows."""
+    first = first - np.nanmean(first, axis=0)
+    second = second - np.nanmean(second, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nansum(first * second, axis=0) / np.sqrt(np.nansum(first ** 2, axis=0) * np.nansum(second ** 2, axis=0))
+
+
+def masked_spearman(values: np.ndarray, min_periods: int = MIN_PERIODS) -> np.ndarray:
+    """Pairwise-complete Spearman correlation of every column pair, matching pandas' DataFrame.corr(method='spearman').
+
+    Each pair is ranked over the rows where both columns are present. Pairs are grouped by those rows:
+    a group of several columns (e.g. tickers that only differ in listing date) is ranked and correlated
+    in one masked Pearson pass, and the single pairs left over by scattered gaps are ranked and
+    correlated PAIR_CHUNK_SIZE at a time.
+    """
+    present = ~np.isnan(values)
+    patterns, pattern_of = np.unique(present.T, axis=0, return_inverse=True)
+    pattern_of = pattern_of.ravel()
+    columns_of = [np.flatnonzero(pattern_of == pattern) for pattern in range(len(patterns))]
+
+    # Overlap rows -> the pattern pairs that share them
+    groups = {}
+    for a in range(len(patterns)):
+        for b in range(a, len(patterns)):
+            rows = patterns[a] & patterns[b]
+            if rows.sum() >= min_periods:
+                groups.setdefault(rows.tobytes(), (rows, []))[1].append((a, b))
+
+    corr = np.full((values.shape[1], values.shape[1]), np.nan)
+    single_pairs = []
+    for rows, pairs in groups.values():
+        involved = sorted({pattern for pair in pairs for pattern in pair})
+        columns = np.concatenate([columns_of[pattern] for pattern in involved])
+        if len(pairs) == 1 and len(columns) <= 2:
+            single_pairs.append((rows, columns[0], columns[-1]))
+            continue
+        offsets = dict(zip(involved, np.cumsum([0] + [len(columns_of[pattern]) for pattern in involved])))
+        group_corr, _ = masked_correlation(rank_columns(values[np.ix_(rows, columns)]), min_periods)
+        for a, b in pairs:
+            block = group_corr[offsets[a]:offsets[a] + len(columns_of[a]), offsets[b]:offsets[b] + len(columns_of[b])]
+            corr[np.ix_(columns_of[a], columns_of[b])] = block
+            corr[np.ix_(columns_of[b], columns_of[a])] = block.T
+
+    for chunk_start in range(0, len(single_pairs), PAIR_CHUNK_SIZE):
+        rows, first, second = (np.array(column) for column in zip(*single_pairs[chunk_start:chunk_start + PAIR_CHUNK_SIZE]))
+        rows = rows.T
+        ranks = rank_columns(np.where(np.hstack([rows, rows]), values[:, np.concatenate([first, second])], np.nan))
+        pair_corr = pair_correlations(ranks[:, :len(first)], ranks[:, len(first):])
+        corr[first, second] = corr[second, first] = pair_corr
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return corr
+
+
+def correlate(matrix: PriceMatrix, min_periods: int = MIN_PERIODS, exact_spearman: Optional[bool] = None) -> CorrelationResult:
+    """Pearson and Spearman correlation matrices of daily returns for every ticker of `matrix`.
+
+    By default Spearman ranks each ticker once over its own returns and runs the masked Pearson pass
+    on the ranks, which is exact for pairs covering the same dates and close otherwise. With
+    `exact_spearman` (the default up to EXACT_SPEARMAN_MAX_TICKERS tickers) every pair is ranked over
+    its common dates instead, see masked_spearman.
+    """
+    returns = daily_returns(matrix.closes)
+    pearson, observations = masked_correlation(returns, min_periods)
+    if exact_spearman is None:
+        exact_spearman = len(matrix.tickers) <= EXACT_SPEARMAN_MAX_TICKERS
+    if exact_spearman:
+        spearman = masked_spearman(returns, min_periods)
+    else:
+        spearman, _ = masked_correlation(rank_columns(returns), min_periods)
+    return CorrelationResult(list(matrix.tickers), pearson, spearman, observations)
+
+
+def data_watermark(tickers: Iterable[str]) -> Tuple[Optional[date], int]:
+    """Latest stored date and total row count of the tickers; changes whenever any of their bars do."""
+    watermark = TickerWatermark.objects.filter(active_stocks_alpha_vantage__yahoo_ticker__in=list(tickers)).aggregate(
+        last_date=Max('last_date'), rows=Sum('row_count')
+    )
+    return watermark['last_date'], watermark['rows'] or 0
+
+
+def cache_key(tickers: List[str], window_days: int, as_of: date, watermark: Tuple[Optional[date], int]) -> str:
+    digest = hashlib.sha1(','.join(tickers).encode()).hexdigest()
+    return f'correlations:{digest}:{window_days}:{as_of}:{watermark[0]}:{watermark[1]}'
+
+
+def get_correlations(tickers: Iterable[str], window_days: int = 365, as_of: Optional[date] = None) -> CorrelationResult:
+    """Correlation matrices for a ticker set over the last `window_days`, cached by (tickers, window, data watermark)."""
+    tickers = sorted(set(tickers))
+    as_of = as_of or date.today()
+    key = cache_key(tickers, window_days, as_of, data_watermark(tickers))
+    result = cache.get(key)
+    if result is None:
+        matrix = load_adjusted_closes(tickers, as_of - timedelta(days=window_days), as_of)
+        result = correlate(matrix)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+import pandas as pd
+import yfinance as yf
+
+from stock_tickers_handler.memory import current_rss_bytes
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available; a non-positive rate disables limiting."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class BatchResult(NamedTuple):
+    batch_num: int
+    tickers: List[str]
+    frames: Dict[str, object]
+    error: Optional[Exception]
+    elapsed: float
+
+
+def download_history(ticker: str, start_date, end_date=None):
+    """Download daily bars for one ticker with the same columns yf.download returns.
+
+    `end_date` is exclusive; any bar Yahoo returns on or after it is dropped.
+    """
+    frame = yf.Ticker(ticker).history(
+        start=start_date, end=end_date, interval='1d', auto_adjust=False, actions=False
+    )
+    if frame.index.tz is not None:
+        frame.index = frame.index.tz_localize(None)
+    if end_date is not None:
+        # Yahoo can still append the live bar of a session in progress
+        frame = frame[frame.index < pd.Timestamp(end_date)]
+    return frame
+
+
+class BatchDownloader:
+    """Keeps several ticker batches downloading at once and hands finished batches to a single consumer.
+
+    Download workers block on a bounded queue when the consumer falls behind, so at most
+    `concurrency + queue_size` downloaded batches are held in memory at any time. With a
+    `memory_limit` (bytes of RSS), workers also hold off starting new batches while the process
+    is above the limit and the consumer still has batches waiting.
+    """
+
+    def __init__(self, download: Callable = download_history, concurrency: int = 4, rate: float = 5.0,
+                 queue_size: Optional[int] = None, memory_limit: Optional[int] = None):
+        self.download = download
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate)
+        self.queue_size = queue_size or self.concurrency
+        self.memory_limit = memory_limit
+
+    def download_batch(self, start_dates: Dict[str, object], end_date=None) -> Dict[str, object]:
+        """Download every ticker of a batch from its own start date, one rate-limited request per ticker."""
+        frames = {}
+        for ticker, start_date in start_dates.items():
+            self.bucket.acquire()
+            frames[ticker] = self.download(ticker, start_date, end_date)
+        return frames
+
+    def run(self, jobs: List[Dict[str, object]], end_date=None) -> Iterator[BatchResult]:
+        """Download jobs mapping each ticker of a batch to its start date and yield a BatchResult for each in completion order.
+
+        batch_num is the 1-based position of the job in `jobs`.
+        """
+        results = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def put(result):
+            # Wait for room in the queue, but give up once the consumer has gone away
+            while not stop.is_set():
+                try:
+                    results.put(result, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def worker(batch_num, start_dates):
+            # Waiting only while results are queued means the consumer can always make progress
+            while self.memory_limit and not stop.is_set() and not results.empty() and (current_rss_bytes() or 0) > self.memory_limit:
+                time.sleep(0.1)
+            if stop.is_set():
+                return
+            batch = list(start_dates)
+            started = time.perf_counter()
+            try:
+                frames = self.download_batch(start_dates, end_date)
+                put(BatchResult(batch_num, batch, frames, None, time.perf_counter() - started))
+            except Exception as e:
+                put(BatchResult(batch_num, batch, {}, e, time.perf_counter() - started))
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for batch_num, start_dates in enumerate(jobs, start=1):
+                executor.submit(worker, batch_num, start_dates)
+            for _ in jobs:
+                yield results.get()
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
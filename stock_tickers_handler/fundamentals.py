@@ -0,0 +1,311 @@
+import hashlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from django.db import models
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, Now, NullIf
+
+from stock_tickers_handler.models import FundamentalData
+
+DECIMAL_PLACES = 5
+
+# Converters turn one info key into one field across the whole batch
+TEXT, NUMBER, TIMESTAMP = 'text', 'number', 'timestamp'
+
+
+class FieldMapping(NamedTuple):
+    field: str  # FundamentalData field
+    key: str  # key of the Yahoo info dict
+    converter: str  # TEXT, NUMBER or TIMESTAMP
+
+
+def text(field: str, key: str) -> FieldMapping:
+    return FieldMapping(field, key, TEXT)
+
+
+def number(field: str, key: str) -> FieldMapping:
+    return FieldMapping(field, key, NUMBER)
+
+
+def timestamp(field: str, key: str) -> FieldMapping:
+    return FieldMapping(field, key, TIMESTAMP)
+
+
+FIELD_MAPPINGS = (
+    text('long_name', 'longName'),
+    text('exchange', 'exchange'),
+    text('quote_type', 'quoteType'),
+    text('industry', 'industry'),
+    text('sector', 'sector'),
+    text('long_business_summary', 'longBusinessSummary'),
+    number('previous_close', 'previousClose'),
+    number('dividend_rate', 'dividendRate'),
+    number('dividend_yield', 'dividendYield'),
+    timestamp('ex_dividend_date', 'exDividendDate'),
+    number('payout_ratio', 'payoutRatio'),
+    number('beta', 'beta'),
+    number('trailing_pe', 'trailingPE'),
+    number('forward_pe', 'forwardPE'),
+    number('regular_market_volume', 'regularMarketVolume'),
+    number('average_volume', 'averageVolume'),
+    number('average_volume_10_days', 'averageVolume10days'),
+    number('market_cap', 'marketCap'),
+    number('price_52_week_low', 'fiftyTwoWeekLow'),
+    number('price_52_week_high', 'fiftyTwoWeekHigh'),
+    number('price_to_sales_trailing_12_months', 'priceToSalesTrailing12Months'),
+    number('price_50_day_moving_average', 'fiftyDayAverage'),
+    number('price_200_day_moving_average', 'twoHundredDayAverage'),
+    number('price_to_book', 'priceToBook'),
+    number('trailing_annual_dividend_rate', 'trailingAnnualDividendRate'),
+    number('trailing_annual_dividend_yield', 'trailingAnnualDividendYield'),
+    number('enterprise_value', 'enterpriseValue'),
+    number('profit_margins', 'profitMargins'),
+    number('float_shares', 'floatShares'),
+    number('shares_outstanding', 'sharesOutstanding'),
+    number('shares_short', 'sharesShort'),
+    number('shares_short_prior_month', 'sharesShortPriorMonth'),
+    timestamp('shares_short_previous_month_date', 'sharesShortPreviousMonthDate'),
+    timestamp('date_short_interest', 'dateShortInterest'),
+    number('shares_percent_shares_out', 'sharesPercentSharesOut'),
+    number('held_percent_insiders', 'heldPercentInsiders'),
+    number('held_percent_institutions', 'heldPercentInstitutions'),
+    number('short_ratio', 'shortRatio'),
+    number('short_percent_of_float', 'shortPercentOfFloat'),
+    number('implied_shares_outstanding', 'impliedSharesOutstanding'),
+    number('book_value', 'bookValue'),
+    timestamp('last_fiscal_year_end', 'lastFiscalYearEnd'),
+    timestamp('next_fiscal_year_end', 'nextFiscalYearEnd'),
+    timestamp('most_recent_quarter', 'mostRecentQuarter'),
+    timestamp('earnings_date', 'earningsTimestamp'),
+    number('earnings_quarterly_growth', 'earningsQuarterlyGrowth'),
+    number('net_income_to_common', 'netIncomeToCommon'),
+    number('trailing_eps', 'trailingEps'),
+    number('forward_eps', 'forwardEps'),
+    number('peg_ratio', 'pegRatio'),
+    text('last_split_factor', 'lastSplitFactor'),
+    timestamp('last_split_date', 'lastSplitDate'),
+    number('enterprise_to_revenue', 'enterpriseToRevenue'),
+    number('enterprise_to_ebitda', 'enterpriseToEbitda'),
+    number('last_dividend_value', 'lastDividendValue'),
+    timestamp('last_dividend_date', 'lastDividendDate'),
+    number('target_high_price', 'targetHighPrice'),
+    number('target_low_price', 'targetLowPrice'),
+    number('target_mean_price', 'targetMeanPrice'),
+    number('target_median_price', 'targetMedianPrice'),
+    number('number_of_analyst_opinions', 'numberOfAnalystOpinions'),
+    number('total_cash', 'totalCash'),
+    number('total_cash_per_share', 'totalCashPerShare'),
+    number('ebitda', 'ebitda'),
+    number('total_debt', 'totalDebt'),
+    number('quick_ratio', 'quickRatio'),
+    number('current_ratio', 'currentRatio'),
+    number('total_revenue', 'totalRevenue'),
+    number('debt_to_equity', 'debtToEquity'),
+    number('revenue_per_share', 'revenuePerShare'),
+    number('return_on_assets', 'returnOnAssets'),
+    number('return_on_equity', 'returnOnEquity'),
+    number('free_cashflow', 'freeCashflow'),
+    number('operating_cashflow', 'operatingCashflow'),
+    number('earnings_growth', 'earningsGrowth'),
+    number('revenue_growth', 'revenueGrowth'),
+    number('gross_margins', 'grossMargins'),
+    number('ebitda_margins', 'ebitdaMargins'),
+    number('operating_margins', 'operatingMargins'),
+    number('trailing_peg_ratio', 'trailingPegRatio'),
+    number('audit_risk', 'auditRisk'),
+    number('board_risk', 'boardRisk'),
+    number('compensation_risk', 'compensationRisk'),
+    number('shareholder_rights_risk', 'shareHolderRightsRisk'),
+    number('overall_risk', 'overallRisk'),
+)
+
+
+def nonzero(values):
+    """`values` with zeros made missing, for NumPy arrays and database expressions alike."""
+    if isinstance(values, np.ndarray):
+        return np.where(values != 0, values, np.nan)
+    return NullIf(values, Value(0.0))
+
+
+# Derived metrics are plain arithmetic over their operands, so the same function computes them from
+# NumPy columns of a fetched batch and, as a database expression, from the stored fields.
+
+def percent_from_52_week_high_low(close, low, high):
+    """Where the previous close sits in the 52 week range, 0 at the low and 100 at the high."""
+    return (close - low) / nonzero(high - low) * 100
+
+
+def percent_52_week_change(change):
+    return change * 100
+
+
+def upside(close, target):
+    """Distance from the previous close to the median analyst target, in percent."""
+    return (target - close) / nonzero(close) * 100
+
+
+class DerivedField(NamedTuple):
+    field: str  # FundamentalData field
+    compute: Callable
+    keys: Tuple[str, ...]  # info keys of the operands, in the order `compute` takes them
+    fields: Tuple[str, ...] = ()  # FundamentalData fields storing the same operands; empty when they are not stored
+
+
+DERIVED_FIELDS = (
+    DerivedField(
+        'percent_from_52_week_high_low', percent_from_52_week_high_low,
+        ('previousClose', 'fiftyTwoWeekLow', 'fiftyTwoWeekHigh'), ('previous_close', 'price_52_week_low', 'price_52_week_high'),
+    ),
+    DerivedField('percent_52_week_change', percent_52_week_change, ('52WeekChange',)),
+    DerivedField('upside', upside, ('previousClose', 'targetMedianPrice'), ('previous_close', 'target_median_price')),
+)
+
+# Derived fields whose operands are all stored, so they can be recomputed in the database
+RECOMPUTABLE_FIELDS = tuple(derived.field for derived in DERIVED_FIELDS if derived.fields)
+
+
+class CompiledMapping(NamedTuple):
+    text: List[Tuple[str, str]]
+    number: List[Tuple[str, str]]
+    timestamp: List[Tuple[str, str]]
+    # Every key read as a number, by mapped number fields and derived fields alike
+    number_keys: List[str]
+    # (field, compute, operand keys, decimal places of the field)
+    derived: List[Tuple[str, Callable, Tuple[str, ...], int]]
+    integer_fields: frozenset
+    # Every field the mapping produces, in the order they are fingerprinted
+    fields: List[str]
+    # attname of every concrete model field, in the order Model.__init__ takes positional values
+    attnames: List[str]
+
+
+def compile_mapping(mappings: Sequence[FieldMapping] = FIELD_MAPPINGS, derived=DERIVED_FIELDS) -> CompiledMapping:
+    """Resolve the declarative mapping against the model once: which keys each converter reads and which fields hold integers."""
+    by_converter = {TEXT: [], NUMBER: [], TIMESTAMP: []}
+    for mapping in mappings:
+        by_converter[mapping.converter].append((mapping.field, mapping.key))
+    number_keys = [key for _, key in by_converter[NUMBER]]
+    number_keys += [key for key in dict.fromkeys(key for item in derived for key in item.keys) if key not in number_keys]
+    fields = [mapping.field for mapping in mappings] + [item.field for item in derived]
+    integer_fields = frozenset(
+        field for field in fields if isinstance(FundamentalData._meta.get_field(field), models.IntegerField)
+    )
+    return CompiledMapping(
+        by_converter[TEXT], by_converter[NUMBER], by_converter[TIMESTAMP], number_keys,
+        [(item.field, item.compute, item.keys, FundamentalData._meta.get_field(item.field).decimal_places) for item in derived],
+        integer_fields, fields,
+        [field.attname for field in FundamentalData._meta.concrete_fields],
+    )
+
+
+MAPPING = compile_mapping()
+
+
+def number_matrix(infos: Sequence[dict], keys: Sequence[str]) -> np.ndarray:
+    """float64 matrix (infos x keys); None, "NaN", "Infinity", infinities and non-numbers all become NaN."""
+    rows = [[info.get(key) for key in keys] for info in infos]
+    try:
+        matrix = np.array(rows, dtype='float64').reshape(len(infos), len(keys))
+    except (TypeError, ValueError):
+        # Some value is not a number at all; coerce column by column
+        frame = pd.DataFrame(rows, columns=range(len(keys)), dtype=object)
+        matrix = np.column_stack([pd.to_numeric(frame[column], errors='coerce').astype('float64') for column in frame])
+    matrix[~np.isfinite(matrix)] = np.nan
+    return matrix
+
+
+def to_objects(values: np.ndarray, integer: bool = False) -> np.ndarray:
+    """Object array of Python numbers with None where missing, ready for the model."""
+    result = np.full(len(values), None, dtype=object)
+    present = ~np.isnan(values)
+    result[present] = (np.trunc(values[present]).astype('int64') if integer else values[present]).tolist()
+    return result
+
+
+def to_dates(seconds: np.ndarray) -> np.ndarray:
+    """Unix timestamps as dates (UTC); 0 counts as missing, as Yahoo uses it for "no date"."""
+    result = np.full(len(seconds), None, dtype=object)
+    present = ~np.isnan(seconds) & (seconds != 0)
+    result[present] = seconds[present].astype('int64').astype('datetime64[s]').astype('datetime64[D]').tolist()
+    return result
+
+
+def convert_infos(infos: Sequence[dict], mapping: CompiledMapping = MAPPING) -> Dict[str, np.ndarray]:
+    """Convert a batch of Yahoo info dicts into one column per FundamentalData field.
+
+    Numbers of all keys are parsed into one matrix and rounded in a single pass; every column is an
+    object array holding model-ready values with None where missing. Derived fields are rounded to
+    the decimal places of their column and integer fields are truncated, like Django would when
+    saving them.
+    """
+    count = len(infos)
+    columns = {}
+    for field, key in mapping.text:
+        columns[field] = np.empty(count, dtype=object)
+        columns[field][:] = [info.get(key) for info in infos]
+
+    raw = number_matrix(infos, mapping.number_keys)
+    raw_by_key = {key: raw[:, position] for position, key in enumerate(mapping.number_keys)}
+    rounded = np.round(raw, DECIMAL_PLACES)
+    # number_keys starts with the mapped number keys, in mapping order
+    for position, (field, _) in enumerate(mapping.number):
+        columns[field] = to_objects(rounded[:, position], field in mapping.integer_fields)
+    for field, compute, keys, decimal_places in mapping.derived:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.round(compute(*(raw_by_key[key] for key in keys)), decimal_places)
+        values[~np.isfinite(values)] = np.nan
+        columns[field] = to_objects(values, field in mapping.integer_fields)
+
+    seconds = number_matrix(infos, [key for _, key in mapping.timestamp])
+    for position, (field, _) in enumerate(mapping.timestamp):
+        columns[field] = to_dates(seconds[:, position])
+    return columns
+
+
+def derived_expression(derived: DerivedField):
+    """The derived field as a database expression over its stored operands, computed in floating point."""
+    return derived.compute(*(Cast(field, FloatField()) for field in derived.fields))
+
+
+def recompute_derived(fields: Sequence[str] = RECOMPUTABLE_FIELDS, queryset=None) -> int:
+    """Recompute derived `fields` from the stored operands with a single set-based UPDATE; returns the rows updated."""
+    by_field = {derived.field: derived for derived in DERIVED_FIELDS}
+    unknown = [field for field in fields if field not in RECOMPUTABLE_FIELDS]
+    if unknown:
+        raise ValueError(f'Cannot recompute {", ".join(unknown)} from stored fields')
+    queryset = FundamentalData.objects.all() if queryset is None else queryset
+    # The rows' content changes, so readers keyed on last_updated (screener, search) reload
+    return queryset.update(**{field: derived_expression(by_field[field]) for field in fields}, last_updated=Now())
+
+
+def content_hashes(columns: Dict[str, np.ndarray], fields: Sequence[str]) -> List[str]:
+    """Fingerprint of each converted record over `fields`, to tell whether a refresh changed anything.
+
+    Values are hashed after conversion, so noise below the stored precision does not count as a change.
+    The field names seed the hash: changing the mapping changes every fingerprint.
+    """
+    seed = hashlib.blake2b(','.join(fields).encode(), digest_size=16)
+    hashes = []
+    for row in zip(*(columns[field] for field in fields)):
+        digest = seed.copy()
+        digest.update(repr(row).encode())
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def build_fundamentals(batch: Iterable[Tuple[str, dict]], stock_ids: Dict[str, int],
+                       mapping: CompiledMapping = MAPPING) -> List[FundamentalData]:
+    """Unsaved FundamentalData objects for (ticker, info) pairs, linked through the preloaded ticker -> id map
+    and carrying the content hash of their converted values."""
+    batch = list(batch)
+    if not batch:
+        return []
+    columns = convert_infos([info for _, info in batch], mapping)
+    columns['content_hash'] = content_hashes(columns, mapping.fields)
+    columns['active_stocks_alpha_vantage_id'] = [stock_ids[ticker] for ticker, _ in batch]
+    # Positional values skip Model.__init__'s keyword handling, which dominates for ~90 fields
+    missing = [None] * len(batch)
+    values = [columns.get(attname, missing) for attname in mapping.attnames]
+    return [FundamentalData(*row) for row in zip(*values)]
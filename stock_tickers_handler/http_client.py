@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from stock_tickers_handler.downloader import TokenBucket
+
+T = TypeVar('T')
+
+YAHOO_HOST = 'query2.finance.yahoo.com'
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/57.0.2987.98 Safari/537.36'
+
+# Responses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AdaptiveThrottle:
+    """Request rate for one host that adapts to the server: additive increase while requests
+    succeed, multiplicative decrease on every HTTP 429."""
+
+    def __init__(self, rate: float = 2.0, min_rate: float = 0.2, max_rate: float = 10.0, increase: float = 0.1,
+                 decrease: float = 0.5, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.bucket = TokenBucket(rate, capacity=1, clock=clock, sleep=sleep)
+        self.lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self):
+        self.bucket.acquire()
+
+    def on_success(self):
+        with self.lock:
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + self.increase)
+
+    def on_throttled(self):
+        with self.lock:
+            self.bucket.rate = max(self.min_rate, self.bucket.rate * self.decrease)
+
+
+class HttpMetrics:
+    """Thread-safe request counters shared by every caller of a client."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.started: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def record(self, status: Optional[int], failed: bool):
+        with self.lock:
+            if self.started is None:
+                self.started = self.clock()
+            self.requests += 1
+            self.throttled += status == 429
+            self.failures += failed
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def requests_per_second(self) -> float:
+        elapsed = self.clock() - self.started if self.started is not None else 0
+        return self.requests / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f'{self.requests} requests ({self.requests_per_second():.2f}/s), {self.retries} retries, '
+                f'{self.throttled} throttled (HTTP 429), {self.failures} failed')
+
+
+def status_of(error: Exception) -> Optional[int]:
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def is_retryable(status: Optional[int], error: Optional[Exception]) -> bool:
+    if status in RETRY_STATUSES:
+        return True
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class HttpClient:
+    """One pooled requests.Session shared by every command, with per-host limits.
+
+    Each host gets an AdaptiveThrottle and at most `max_per_host` requests in flight. Retryable
+    failures (429, 5xx, connection errors, timeouts) are retried with exponential backoff and full
+    jitter, honouring Retry-After; the sleeping worker holds no connection slot meanwhile.
+    """
+
+    def __init__(self, max_per_host: int = 4, max_retries: int = 4, backoff_base: float = 1.0, backoff_cap: float = 60.0,
+                 timeout: float = 30.0, throttle_factory: Callable[[], AdaptiveThrottle] = AdaptiveThrottle,
+                 session: Optional[requests.Session] = None, sleep: Callable[[float], None] = time.sleep,
+                 jitter: Callable[[float, float], float] = random.uniform, metrics: Optional[HttpMetrics] = None):
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.throttle_factory = throttle_factory
+        self.sleep = sleep
+        self.jitter = jitter
+        self.metrics = metrics or HttpMetrics()
+        self.session = session or self.make_session(max_per_host)
+        self.throttles: Dict[str, AdaptiveThrottle] = {}
+        self.slots: Dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_session(max_per_host: int) -> requests.Session:
+        session = requests.Session()
+        # Keep a connection per concurrent request alive so TCP/TLS handshakes are reused
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max_per_host)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Language': 'en-US,en;q=0.8',
+        })
+        return session
+
+    def host_state(self, host: str):
+        with self.lock:
+            if host not in self.throttles:
+                self.throttles[host] = self.throttle_factory()
+                self.slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.throttles[host], self.slots[host]
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None:
+            try:
+                return min(self.backoff_cap, float(retry_after))
+            except ValueError:
+                pass
+        return self.jitter(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call(self, host: str, request: Callable[[], T]) -> T:
+        """Run `request` (one logical request to `host`, e.g. a yfinance call) under the host's limits, retrying transient failures.
+
+        A response with a retryable status is returned as is once the retries are used up; an exception is re-raised.
+        """
+        throttle, slots = self.host_state(host)
+        attempt = 0
+        while True:
+            throttle.acquire()
+            result, error = None, None
+            with slots:
+                try:
+                    result = request()
+                    status = getattr(result, 'status_code', None)
+                except Exception as e:
+                    error, status = e, status_of(e)
+            retryable = is_retryable(status, error)
+            self.metrics.record(status, error is not None or retryable)
+            if status == 429:
+                throttle.on_throttled()
+            elif error is None and not retryable:
+                throttle.on_success()
+
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return result
+            response = result if result is not None else getattr(error, 'response', None)
+            retry_after = response.headers.get('Retry-After') if response is not None and hasattr(response, 'headers') else None
+            self.metrics.record_retry()
+            self.sleep(self.backoff(attempt, retry_after))
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.call(urlsplit(url).netloc, lambda: self.session.get(url, **kwargs))
+
+
+# Shared by fetch_info, load_info and load_tickers
+http_client = HttpClient()
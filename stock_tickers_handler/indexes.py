@@ -0,0 +1,143 @@
+from datetime import timedelta
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import yfinance as yf
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from stock_tickers_handler.cache import StaleWhileRevalidateCache
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData
+
+# Indices and commodities shown on the indexes page, by display name
+INDEX_TICKERS = {
+    'S&P 500': '^GSPC',
+    'NASDAQ': '^IXIC',
+    'Dow Jones': '^DJI',
+    'DAX': '^GDAXI',
+    'FTSE 100': '^FTSE',
+    'CAC 40': '^FCHI',
+    'Hang Seng': '^HSI',
+    'Nikkei 225': '^N225',
+    'Gold': 'GC=F',
+    'Silver': 'SI=F',
+    'Palladium': 'PA=F',
+    'Platinum': 'PL=F',
+    'Crude Oil': 'CL=F',
+    'Natural Gas': 'NG=F',
+}
+
+HISTORY_DAYS = 365 * 2
+
+# Stored history comes from fetch_historicals; the network only tops up the sessions since the last run
+TOP_UP_DAYS = 7
+
+# A 15 minute TTL keeps the latest session reasonably current
+CACHE_TTL = 15 * 60
+CACHE_STALE_TTL = 6 * 60 * 60
+
+
+class IndexSeries(NamedTuple):
+    """Close history of one symbol as compact arrays instead of Python lists."""
+    dates: np.ndarray
+    closes: np.ndarray
+
+    @property
+    def current_price(self) -> float:
+        return float(self.closes[-1])
+
+    @property
+    def day_change(self) -> float:
+        return float((self.closes[-1] - self.closes[-2]) / self.closes[-2] * 100)
+
+
+def register_index_symbols(tickers: Dict[str, str] = INDEX_TICKERS) -> int:
+    """Add the index and commodity symbols to the ticker universe so fetch_historicals stores their bars.
+
+    They are registered under INDEX_ASSET_TYPES, which keeps them out of the fundamentals refresh,
+    search, autocomplete and the screener. Returns the number of symbols that were not registered yet.
+    """
+    existing = set(ActiveStocksAlphaVantage.objects.filter(yahoo_ticker__in=tickers.values()).values_list('yahoo_ticker', flat=True))
+    ActiveStocksAlphaVantage.objects.bulk_create([
+        ActiveStocksAlphaVantage(
+            ticker=symbol, name=name, exchange='INDEX',
+            assetType='Commodity' if symbol.endswith('=F') else 'Index',
+            # Yahoo has no fundamentals for them
+            status='Active', yahoo_ticker=symbol, is_yahoo_available=False,
+        )
+        for name, symbol in tickers.items() if symbol not in existing
+    ], ignore_conflicts=True)
+    return len(set(tickers.values()) - existing)
+
+
+def load_stored_history(tickers: Dict[str, str] = INDEX_TICKERS, days: int = HISTORY_DAYS) -> Dict[str, IndexSeries]:
+    """Close history of every symbol from HistoricalData, in a single query."""
+    start_date = timezone.now().date() - timedelta(days=days)
+    rows = list(
+        HistoricalData.objects.filter(active_stocks_alpha_vantage__yahoo_ticker__in=list(tickers.values()), date__gte=start_date)
+        .order_by('active_stocks_alpha_vantage__yahoo_ticker', 'date')
+        .values_list(F('active_stocks_alpha_vantage__yahoo_ticker'), 'date', Cast('close', FloatField()))
+    )
+    if not rows:
+        return {}
+    symbols, dates, closes = (np.array(column) for column in zip(*rows))
+    dates = dates.astype('datetime64[D]')
+    # Rows are grouped by symbol, so each symbol is one contiguous slice
+    starts = [0, *(np.flatnonzero(symbols[1:] != symbols[:-1]) + 1)]
+    ends = [*starts[1:], len(rows)]
+    bounds = {symbols[start]: (start, end) for start, end in zip(starts, ends)}
+    series = {}
+    for name, symbol in tickers.items():
+        if symbol in bounds:
+            start, end = bounds[symbol]
+            series[name] = IndexSeries(dates[start:end], closes[start:end])
+    return series
+
+
+def merge_series(stored: Optional[IndexSeries], latest: Optional[IndexSeries]) -> Optional[IndexSeries]:
+    """Append the sessions from `latest` that are newer than the last stored one."""
+    if latest is None:
+        return stored
+    if stored is None:
+        return latest
+    newer = latest.dates > stored.dates[-1]
+    return IndexSeries(np.concatenate([stored.dates, latest.dates[newer]]), np.concatenate([stored.closes, latest.closes[newer]]))
+
+
+def download_index_history(tickers: Dict[str, str] = INDEX_TICKERS, days: int = TOP_UP_DAYS) -> Dict[str, IndexSeries]:
+    """Download close history for every symbol in one multi-symbol request."""
+    end_date = timezone.now()
+    data = yf.download(
+        list(tickers.values()), start=end_date - timedelta(days=days), end=end_date,
+        group_by='ticker', auto_adjust=False, progress=False,
+    )
+    series = {}
+    for name, symbol in tickers.items():
+        if data.empty or symbol not in data.columns.get_level_values(0):
+            continue
+        closes = data[symbol]['Close'].dropna()
+        if closes.empty:
+            continue
+        series[name] = IndexSeries(closes.index.values.astype('datetime64[D]'), closes.to_numpy(dtype='float64'))
+    return series
+
+
+latest_quotes_cache = StaleWhileRevalidateCache(download_index_history, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL)
+
+
+def get_index_history(tickers: Dict[str, str] = INDEX_TICKERS) -> Dict[str, IndexSeries]:
+    """Close history for the indexes page: stored bars topped up with the latest sessions.
+
+    The top-up is only ever read from the cache and refreshed in the background, so page latency
+    does not depend on how quickly Yahoo answers.
+    """
+    stored = load_stored_history(tickers)
+    latest = latest_quotes_cache.peek() or {}
+    series = {}
+    for name in tickers:
+        merged = merge_series(stored.get(name), latest.get(name))
+        # A single close has no day change to show
+        if merged is not None and len(merged.closes) >= 2:
+            series[name] = merged
+    return series
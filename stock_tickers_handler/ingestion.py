@@ -0,0 +1,246 @@
+import io
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData, TickerWatermark
+
+# Columns of a single-ticker yfinance frame that map onto HistoricalData prices
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close']
+
+# Rows per INSERT statement; 5000 rows x 8 params stays below the 65535 bind parameter limit
+INSERT_BATCH_SIZE = 5000
+
+# Columns streamed through COPY, in staging table order
+COPY_COLUMNS = 'active_stocks_alpha_vantage_id, date, open, high, low, close, adj_close, volume'
+
+Row = Tuple[date, float, float, float, float, float, int]
+
+# (first date, last date, row count) of the rows inserted for one stock
+DateRange = Tuple[date, date, int]
+
+
+@dataclass
+class IngestStats:
+    """Counts of rows written and skipped by an ingestion call."""
+    inserted: int = 0
+    skipped: int = 0
+
+    def __iadd__(self, other: 'IngestStats') -> 'IngestStats':
+        self.inserted += other.inserted
+        self.skipped += other.skipped
+        return self
+
+
+def frame_to_rows(frame) -> List[Row]:
+    """Convert a single-ticker yfinance frame into (date, open, high, low, close, adj_close, volume) rows."""
+    frame = frame.dropna(axis=0, how='all')
+    if 'Adj Close' not in frame.columns:
+        frame = frame.assign(**{'Adj Close': frame['Close']})
+    frame = frame.dropna(subset=PRICE_COLUMNS)
+    if frame.empty:
+        return []
+
+    dates = frame.index.date
+    prices = frame[PRICE_COLUMNS].to_numpy(dtype='float64').round(5)
+    volume = frame['Volume'].fillna(0).to_numpy(dtype='int64')
+    return list(zip(dates, *prices.T.tolist(), volume.tolist()))
+
+
+def get_ticker_ids(tickers: Iterable[str]) -> Dict[str, int]:
+    """Map yahoo tickers to ActiveStocksAlphaVantage ids with a single query."""
+    return dict(
+        ActiveStocksAlphaVantage.objects.filter(yahoo_ticker__in=list(tickers))
+        .values_list('yahoo_ticker', 'id')
+    )
+
+
+def update_watermarks(inserted: Dict[int, DateRange], attempted: Iterable[int]):
+    """Advance the watermarks of stocks that were just fetched; call inside the insert transaction."""
+    stock_ids = set(attempted) | set(inserted)
+    if not stock_ids:
+        return
+    now = timezone.now()
+    existing = {
+        watermark.active_stocks_alpha_vantage_id: watermark
+        for watermark in TickerWatermark.objects.filter(active_stocks_alpha_vantage_id__in=stock_ids)
+    }
+    watermarks = []
+    for stock_id in stock_ids:
+        watermark = existing.get(stock_id) or TickerWatermark(active_stocks_alpha_vantage_id=stock_id)
+        if stock_id in inserted:
+            first_date, last_date, count = inserted[stock_id]
+            watermark.first_date = min(watermark.first_date, first_date) if watermark.first_date else first_date
+            watermark.last_date = max(watermark.last_date, last_date) if watermark.last_date else last_date
+            watermark.row_count += count
+        watermark.last_fetch_attempt = now
+        watermarks.append(watermark)
+    TickerWatermark.objects.bulk_create(
+        watermarks,
+        update_conflicts=True,
+        unique_fields=['active_stocks_alpha_vantage'],
+        update_fields=['first_date', 'last_date', 'row_count', 'last_fetch_attempt'],
+    )
+
+
+def rebuild_watermarks(stock_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute watermarks from the stored bars, for all stocks or only `stock_ids`."""
+    bars = HistoricalData.objects.all()
+    watermarks = TickerWatermark.objects.all()
+    if stock_ids is not None:
+        stock_ids = list(stock_ids)
+        bars = bars.filter(active_stocks_alpha_vantage_id__in=stock_ids)
+        watermarks = watermarks.filter(active_stocks_alpha_vantage_id__in=stock_ids)
+
+    ranges = bars.values('active_stocks_alpha_vantage_id').annotate(
+        first_date=Min('date'), last_date=Max('date'), row_count=Count('id')
+    )
+    rebuilt = [TickerWatermark(**entry) for entry in ranges]
+    with transaction.atomic():
+        # Stocks whose bars were all deleted keep their fetch history but lose their range
+        watermarks.exclude(
+            active_stocks_alpha_vantage_id__in=[watermark.active_stocks_alpha_vantage_id for watermark in rebuilt]
+        ).update(first_date=None, last_date=None, row_count=0)
+        TickerWatermark.objects.bulk_create(
+            rebuilt,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['active_stocks_alpha_vantage'],
+            update_fields=['first_date', 'last_date', 'row_count'],
+        )
+    return len(rebuilt)
+
+
+def stored_dates(stock_ids: Iterable[int], min_date: date) -> set:
+    """(stock id, date) pairs already stored from `min_date` on."""
+    return set(
+        HistoricalData.objects.filter(active_stocks_alpha_vantage_id__in=list(stock_ids), date__gte=min_date)
+        .values_list('active_stocks_alpha_vantage_id', 'date')
+    )
+
+
+def insert_rows(cursor, values: List[tuple], inserted: Dict[int, DateRange]):
+    """INSERT (stock id, *Row) tuples with ON CONFLICT DO NOTHING and add the rows actually written to `inserted`."""
+    table = HistoricalData._meta.db_table
+    placeholders = '(%s, %s, %s, %s, %s, %s, %s, %s)'
+    # Split further where the backend limits bind parameters per statement (SQLite)
+    step = max(1, connection.ops.bulk_batch_size(COPY_COLUMNS.split(', '), values))
+    for offset in range(0, len(values), step):
+        chunk = values[offset:offset + step]
+        cursor.execute(
+            f'INSERT INTO {table} ({COPY_COLUMNS}) VALUES {", ".join([placeholders] * len(chunk))} '
+            'ON CONFLICT (active_stocks_alpha_vantage_id, date) DO NOTHING '
+            'RETURNING active_stocks_alpha_vantage_id, date',
+            [value for row in chunk for value in row],
+        )
+        for stock_id, row_date in cursor.fetchall():
+            if isinstance(row_date, str):  # SQLite returns raw text
+                row_date = date.fromisoformat(row_date)
+            first_date, last_date, count = inserted.get(stock_id, (row_date, row_date, 0))
+            inserted[stock_id] = (min(first_date, row_date), max(last_date, row_date), count + 1)
+
+
+def save_historical_rows(rows_by_stock: Dict[int, List[Row]], batch_size: int = INSERT_BATCH_SIZE) -> IngestStats:
+    """Insert rows for many stocks at once, skipping dates that are already stored."""
+    stats = IngestStats()
+    attempted = list(rows_by_stock)
+    rows_by_stock = {stock_id: rows for stock_id, rows in rows_by_stock.items() if rows}
+    if not rows_by_stock:
+        with transaction.atomic():
+            update_watermarks({}, attempted)
+        return stats
+
+    # One set-based lookup replaces a per-row exists() query
+    min_date = min(row[0] for rows in rows_by_stock.values() for row in rows)
+    existing = stored_dates(rows_by_stock, min_date)
+
+    inserted = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Rows are inserted one batch at a time to keep memory flat on wide backfills
+        values = []
+        for stock_id, rows in rows_by_stock.items():
+            for row in rows:
+                if (stock_id, row[0]) in existing:
+                    continue
+                values.append((stock_id, *row))
+                if len(values) >= batch_size:
+                    insert_rows(cursor, values, inserted)
+                    values = []
+        insert_rows(cursor, values, inserted)
+        # RETURNING reports only this statement's rows, so rows another writer stored first count as skipped
+        stats.inserted = sum(count for _, _, count in inserted.values())
+        stats.skipped = sum(len(rows) for rows in rows_by_stock.values()) - stats.inserted
+        update_watermarks(inserted, attempted)
+    return stats
+
+
+def copy_historical_rows(rows_by_stock: Dict[int, List[Row]]) -> IngestStats:
+    """Stream rows through COPY into a temporary staging table and merge them with ON CONFLICT DO NOTHING.
+
+    Falls back to save_historical_rows on databases other than PostgreSQL (e.g. SQLite in tests).
+    """
+    if connection.vendor != 'postgresql':
+        return save_historical_rows(rows_by_stock)
+
+    total = sum(len(rows) for rows in rows_by_stock.values())
+    if not total:
+        with transaction.atomic():
+            update_watermarks({}, rows_by_stock)
+        return IngestStats()
+
+    table = HistoricalData._meta.db_table
+    staging = f'{table}_staging'
+    buffer = io.StringIO()
+    for stock_id, rows in rows_by_stock.items():
+        for row in rows:
+            buffer.write(f'{stock_id}\t{row[0].isoformat()}\t{row[1]!r}\t{row[2]!r}\t{row[3]!r}\t{row[4]!r}\t{row[5]!r}\t{row[6]}\n')
+    buffer.seek(0)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Private to this transaction, so concurrent loaders never wait on each other's staging rows;
+        # LIKE would also copy the NOT NULL id column, which COPY does not fill
+        cursor.execute(f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {COPY_COLUMNS} FROM {table} WITH NO DATA')
+        copy_sql = f'COPY {staging} ({COPY_COLUMNS}) FROM STDIN'
+        if hasattr(cursor.cursor, 'copy'):  # psycopg 3
+            with cursor.cursor.copy(copy_sql) as copy:
+                while chunk := buffer.read(1 << 20):
+                    copy.write(chunk)
+        else:  # psycopg2
+            cursor.cursor.copy_expert(copy_sql, buffer)
+        cursor.execute(
+            f'WITH inserted AS ('
+            f'INSERT INTO {table} ({COPY_COLUMNS}) SELECT {COPY_COLUMNS} FROM {staging} '
+            'ON CONFLICT (active_stocks_alpha_vantage_id, date) DO NOTHING '
+            'RETURNING active_stocks_alpha_vantage_id, date) '
+            'SELECT active_stocks_alpha_vantage_id, MIN(date), MAX(date), COUNT(*) FROM inserted '
+            'GROUP BY active_stocks_alpha_vantage_id'
+        )
+        inserted = {stock_id: (first_date, last_date, count) for stock_id, first_date, last_date, count in cursor.fetchall()}
+        update_watermarks(inserted, rows_by_stock)
+
+    inserted_count = sum(count for _, _, count in inserted.values())
+    return IngestStats(inserted=inserted_count, skipped=total - inserted_count)
+
+
+def save_historical_frames(frames: Dict[str, object], ticker_ids: Optional[Dict[str, int]] = None, use_copy: bool = False,
+                           attempted: Iterable[str] = ()) -> IngestStats:
+    """Convert and store yfinance frames keyed by yahoo ticker in a single upsert.
+
+    Tickers listed in `attempted` without a frame (no data returned) still get their fetch attempt recorded.
+    """
+    attempted = [ticker for ticker in attempted if ticker not in frames]
+    if ticker_ids is None:
+        ticker_ids = get_ticker_ids(list(frames) + attempted)
+
+    rows_by_stock = {ticker_ids[ticker]: [] for ticker in attempted if ticker in ticker_ids}
+    for ticker, frame in frames.items():
+        if ticker not in ticker_ids:
+            continue
+        rows_by_stock[ticker_ids[ticker]] = frame_to_rows(frame)
+
+    if use_copy:
+        return copy_historical_rows(rows_by_stock)
+    return save_historical_rows(rows_by_stock)
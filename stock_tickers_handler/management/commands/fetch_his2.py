@@ -1,31 +1,30 @@
 from django.core.management.base import BaseCommand
-from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, TickerWatermark
 import yfinance as yf
 from datetime import datetime, timedelta
-from django.db.models import Max
+from django.db.models import F
+from stock_tickers_handler.ingestion import save_historical_frames
+from stock_tickers_handler.memory import format_mb, peak_rss_bytes
+from stock_tickers_handler.trading_calendar import last_closed_session
 
 class Command(BaseCommand):
     help = 'Load tickers historical chart data for active US stocks from Yahoo Finance into the database'
     
     def handle(self, *args, **kwargs):
-        today = datetime.now().date()
-        last_trading_day = today - timedelta(days=1)
-        
-        # Adjust for weekends
-        if today.weekday() == 0:  # Monday
-            last_trading_day = today - timedelta(days=3)
-        elif today.weekday() == 6:  # Sunday
-            last_trading_day = today - timedelta(days=2)
+        # Last session with a final daily bar, accounting for weekends and NYSE holidays
+        last_trading_day = last_closed_session()
 
         # Fetching available tickers from the ActiveStocksAlphaVantage model that are marked as available
         tickers_active_from_alpha_vantage = set(ActiveStocksAlphaVantage.objects.filter(is_hist_available=True).values_list('yahoo_ticker', flat=True))
 
-        # Get date dictionary for last data
+        # Get date dictionary for last data from the per-ticker watermarks
         last_date_dict = {}
-        max_dates = HistoricalData.objects.values('active_stocks_alpha_vantage__yahoo_ticker').annotate(max_date=Max('date'))
+        max_dates = TickerWatermark.objects.filter(last_date__isnull=False).values(
+            'active_stocks_alpha_vantage__yahoo_ticker', max_date=F('last_date')
+        )
 
         # Get outdated tickers
-        tickers_outdated = max_dates.filter(max_date__lt=last_trading_day)
+        tickers_outdated = max_dates.filter(last_date__lt=last_trading_day)
 
         # Make dictionary for dates to be updated
         for data in tickers_outdated:
@@ -77,17 +76,33 @@ class Command(BaseCommand):
         if tickers_with_no_data:
             self.stdout.write(self.style.WARNING(f"Tickers with no data since {date}: {', '.join(tickers_with_no_data)}"))
         
+        self.stdout.write(self.style.SUCCESS(f"Peak memory: {format_mb(peak_rss_bytes())}"))
         self.stdout.write(self.style.SUCCESS("==========================="))
 
     def fetch_data(self, tickers_to_fetch, starts_date="2010-01-01", end=None, batch_size=20):
         if end is None:
             end = datetime.now().date()
             
-        historical_data_list = []
         no_data_count = 0
         fetched_count = 0
         updated_tickers = []
         
+        # Download in chunks of batch_size so only one chunk of frames is held in memory at a time
+        tickers_to_fetch = list(tickers_to_fetch)
+        for chunk_start in range(0, len(tickers_to_fetch), batch_size):
+            chunk = tickers_to_fetch[chunk_start:chunk_start + batch_size]
+            no_data, fetched, updated = self.fetch_chunk(chunk, starts_date, end)
+            no_data_count += no_data
+            fetched_count += fetched
+            updated_tickers.extend(updated)
+
+        return no_data_count, fetched_count, updated_tickers
+
+    def fetch_chunk(self, tickers_to_fetch, starts_date, end):
+        no_data_count = 0
+        fetched_count = 0
+        updated_tickers = []
+
         try:
             print("Starting downloading data from", starts_date, "to", end)
             data = yf.download(tickers_to_fetch, interval='1d', start=starts_date, end=end, group_by='ticker', progress=False, actions=None)
@@ -98,6 +113,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"Failed to download data for tickers {tickers_to_fetch}: {e}"))
             return no_data_count, fetched_count, updated_tickers
 
+        frames = {}
         for ticker in tickers_to_fetch:
             if ticker not in data.columns:
                 if starts_date == "2010-01-01":
@@ -117,36 +133,11 @@ class Command(BaseCommand):
             
             fetched_count += 1
             updated_tickers.append(ticker)
-            stock_instance = ActiveStocksAlphaVantage.objects.get(yahoo_ticker=ticker)
-            for date, row in ticker_data.iterrows():
-                date_obj = date.date()
-                
-                # Check if the record already exists
-                if HistoricalData.objects.filter(
-                    active_stocks_alpha_vantage=stock_instance,
-                    date=date_obj
-                ).exists():
-                    self.stdout.write(self.style.WARNING(f"Data for {ticker} on {date_obj} already exists. Skipping..."))
-                    continue
-
-                historical_data_list.append(HistoricalData(
-                    active_stocks_alpha_vantage=stock_instance,
-                    date=date_obj,
-                    open=row['Open'],
-                    high=row['High'],
-                    low=row['Low'],
-                    close=row['Close'],
-                    adj_close=row.get('Adj Close'),
-                    volume=row['Volume']
-                ))
-
-                # Insert in batches
-                if len(historical_data_list) >= batch_size:
-                    HistoricalData.objects.bulk_create(historical_data_list, batch_size=batch_size)
-                    historical_data_list.clear()
-
-        # Insert remaining data if any
-        if historical_data_list:
-            HistoricalData.objects.bulk_create(historical_data_list)
+            frames[ticker] = ticker_data
+        del data
+
+        # Convert all frames and insert them in one conflict-aware upsert
+        stats = save_historical_frames(frames, attempted=tickers_to_fetch)
+        self.stdout.write(self.style.SUCCESS(f"Rows inserted: {stats.inserted}, skipped (already stored): {stats.skipped}"))
 
         return no_data_count, fetched_count, updated_tickers
@@ -1,58 +1,133 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
 from django.core.management.base import BaseCommand
-from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData
-import yfinance as yf
-from datetime import datetime, timedelta
-from django.db.models import Max
-from typing import List, Tuple, Dict
+from django.db import connections
+from django.utils import timezone
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FetchBatch, FetchRun, TickerWatermark
+from datetime import date, datetime, timedelta
+from django.db.models import Count, Q, Sum
+from typing import List, NamedTuple, Optional, Tuple, Dict
+from stock_tickers_handler.downloader import BatchDownloader
+from stock_tickers_handler.ingestion import IngestStats, save_historical_frames
+from stock_tickers_handler.memory import current_rss_bytes, format_mb, peak_rss_bytes
+from stock_tickers_handler.performance import refresh_snapshots
+from stock_tickers_handler.price_metrics import refresh_price_fundamentals
+from stock_tickers_handler.rolling import advance_windows
+from stock_tickers_handler.planner import plan_sharded_batches, shard_of
+from stock_tickers_handler.trading_calendar import SETTLE_DELAY, last_closed_session, session_close
 
-class Command(BaseCommand):
-    help = 'Load historical chart data for active US stocks from Yahoo Finance into the database'
-    DEFAULT_START_DATE = '2010-01-01'
-    BATCH_SIZE = 20
+# Options a shard worker process needs to rebuild the command's configuration
+WORKER_OPTIONS = ('loader', 'batch_size', 'concurrency', 'rate', 'max_memory_mb', 'workers')
 
-    def handle(self, *args, **kwargs):
-        today = datetime.now().date()
-        last_trading_day = self.get_last_trading_day(today)
-        
-        active_tickers = self.get_active_tickers()
-        self.stdout.write(self.style.SUCCESS(f"Number of active tickers: {len(active_tickers)}"))
 
-        last_date_dict, outdated_tickers, uptodate_tickers = self.get_outdated_tickers(last_trading_day)
-<<<<<<< HEAD
+class ShardResult(NamedTuple):
+    updated: List[str]
+    failed: List[str]
+    inserted: int
+    skipped: int
 
-        self.stdout.write(self.style.SUCCESS(f"Number of outdated tickers: {len(outdated_tickers)}"))
-        self.stdout.write(self.style.SUCCESS(f"Number of uptodate tickers: {len(uptodate_tickers)}"))
 
+def init_worker():
+    """Process pool initializer; a no-op under fork, sets Django up under spawn."""
+    django.setup()
 
-        tickers_no_data = list(active_tickers - set(uptodate_tickers) - set(outdated_tickers))
 
-        print(f"Number of no data tickers : {len(tickers_no_data)}")
-      
-=======
-        tickers_no_data = list(active_tickers - set(uptodate_tickers) - set(outdated_tickers))
-       
->>>>>>> 6ff47315113731980de5a873b72508ac24095afd
-        self.stdout.write(self.style.SUCCESS(f"Tickers with no data: {len(tickers_no_data)}"))
-        self.stdout.write(self.style.SUCCESS(f"Number of uptodate tickers (acutal): {len(uptodate_tickers)}"))
+def run_shard(run_id: int, shard: int, shards: int, options: Dict[str, object]) -> ShardResult:
+    """Execute one shard of a run in a worker process, on that process's own database connection."""
+    command = Command()
+    command.configure(options)
+    try:
+        updated, failed = command.execute_run(FetchRun.objects.get(pk=run_id), shard=shard, shards=shards)
+    finally:
+        connections.close_all()
+    return ShardResult(updated, failed, command.stats.inserted, command.stats.skipped)
 
-        self.stdout.write(self.style.SUCCESS(f"Number of outdated tickers: {len(outdated_tickers)}"))
-        
 
-        
+class Command(BaseCommand):
+    help = 'Load historical chart data for active US stocks from Yahoo Finance into the database'
+    DEFAULT_START_DATE = '2010-01-01'
+    BATCH_SIZE = 20
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loader', choices=['bulk', 'copy'], default='copy',
+            help="Write path for daily bars: 'copy' streams through COPY on PostgreSQL, 'bulk' uses bulk_create"
+        )
+        parser.add_argument('--batch-size', type=int, default=self.BATCH_SIZE, help='Tickers per download batch')
+        parser.add_argument('--concurrency', type=int, default=4, help='Batches downloading at the same time')
+        parser.add_argument('--rate', type=float, default=5.0, help='Maximum Yahoo requests per second (0 disables the limit)')
+        parser.add_argument(
+            '--max-memory-mb', type=int, default=None,
+            help='Hold off starting new downloads while the process uses more memory than this'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes to split the tickers across; each converts and writes its own shard'
+        )
+        parser.add_argument('--resume', action='store_true', help='Continue the last unfinished run from its first unfinished batch')
+        parser.add_argument('--list-runs', action='store_true', help='Show recent runs from the journal and exit')
+
+    def handle(self, *args, **kwargs):
+        if kwargs.get('list_runs'):
+            self.list_runs()
+            return
+
+        self.configure(kwargs)
+
+        run = self.get_resumable_run() if kwargs.get('resume') else None
+        if run is not None:
+            pending = run.batches.exclude(status=FetchBatch.STATUS_DONE).count()
+            self.stdout.write(self.style.SUCCESS(f"Resuming run #{run.pk}: {pending} of {run.batches.count()} batches left"))
+        else:
+            if kwargs.get('resume'):
+                self.stdout.write(self.style.WARNING("No unfinished run to resume, planning a new one"))
+            run = self.plan_run()
+            if run is None:
+                self.stdout.write(self.style.SUCCESS("Nothing to fetch: no new session has closed since the last update"))
+                return
 
-        total_updated, total_failed = self.update_tickers(last_date_dict)
+        if self.workers > 1:
+            total_updated, total_failed = self.execute_sharded(run, kwargs)
+        else:
+            total_updated, total_failed = self.execute_run(run)
+        self.finish_run(run)
+        if total_updated:
+            # Only the tickers that received bars need their trailing returns recomputed
+            refreshed = refresh_snapshots(total_updated)
+            self.stdout.write(self.style.SUCCESS(f"Performance snapshots refreshed: {refreshed}"))
+            # Tracked rolling windows only move forward by the sessions that just arrived
+            advanced = advance_windows(total_updated)
+            self.stdout.write(self.style.SUCCESS(f"Rolling window stats added: {advanced}"))
+            # Price-derived fundamentals follow the new bars without asking Yahoo
+            priced = refresh_price_fundamentals(total_updated)
+            self.stdout.write(self.style.SUCCESS(f"Price-derived fundamentals refreshed: {priced}"))
         self.stdout.write(self.style.SUCCESS(f"Total tickers updated: {len(total_updated)}"))
         self.stdout.write(self.style.SUCCESS(f"Total tickers not updated: {len(total_failed)}"))
+        self.stdout.write(self.style.SUCCESS(f"Rows inserted: {self.stats.inserted}"))
+        self.stdout.write(self.style.SUCCESS(f"Rows skipped (already stored): {self.stats.skipped}"))
+        self.stdout.write(self.style.SUCCESS(f"Peak memory: {format_mb(peak_rss_bytes())}"))
 
-        self.update_tickers_without_data(tickers_no_data, self.DEFAULT_START_DATE)
+    def configure(self, options: Dict[str, object]):
+        """Set up the write path, downloader and counters from the command options."""
+        self.use_copy = options.get('loader', 'copy') == 'copy'
+        self.batch_size = options.get('batch_size', self.BATCH_SIZE)
+        self.workers = max(1, options.get('workers') or 1)
+        max_memory_mb = options.get('max_memory_mb')
+        if max_memory_mb and current_rss_bytes() is None:
+            self.stdout.write(self.style.WARNING("Memory use cannot be measured on this platform, ignoring --max-memory-mb"))
+            max_memory_mb = None
+        self.downloader = BatchDownloader(
+            concurrency=options.get('concurrency', 4),
+            # The request budget is shared by all worker processes
+            rate=options.get('rate', 5.0) / self.workers,
+            memory_limit=max_memory_mb * 1024 * 1024 if max_memory_mb else None,
+        )
+        self.stats = IngestStats()
 
-    def get_last_trading_day(self, today: datetime.date) -> datetime.date:
-        """Calculate the last trading day, accounting for weekends."""
-        if today.weekday() == 0:  # Monday
-            return today - timedelta(days=3)
-        elif today.weekday() == 6:  # Sunday
-            return today - timedelta(days=2)
-        return today - timedelta(days=1)
+    def get_last_trading_day(self, now: datetime) -> date:
+        """The last NYSE session whose daily bar is final, accounting for weekends and exchange holidays."""
+        return last_closed_session(now)
 
     def get_active_tickers(self) -> set:
         """Fetch tickers available for historical data."""
@@ -61,88 +136,181 @@ class Command(BaseCommand):
             .values_list('yahoo_ticker', flat=True)
         )
 
-    def get_outdated_tickers(self, last_trading_day: datetime.date) -> Tuple[Dict[datetime.date, List[str]], List[str], List[str]]:
-        """Identify tickers with outdated data."""
-        max_dates = HistoricalData.objects.filter(
-            active_stocks_alpha_vantage__is_hist_available=True
-        ).values('active_stocks_alpha_vantage__yahoo_ticker').annotate(max_date=Max('date'))
+    def get_outdated_tickers(self, last_trading_day: date) -> Tuple[Dict[date, List[str]], List[str], List[str]]:
+        """Identify tickers with outdated data from the per-ticker watermarks.
+
+        Tickers already tried after the last session closed count as up to date, so a rerun
+        does no network work until a new session closes.
+        """
+        closed_at = session_close(last_trading_day) + SETTLE_DELAY
+        watermarks = TickerWatermark.objects.filter(
+            active_stocks_alpha_vantage__is_hist_available=True,
+        ).values_list('active_stocks_alpha_vantage__yahoo_ticker', 'last_date', 'last_fetch_attempt')
 
         outdated_tickers = []
         uptodate_tickers = []
         last_date_dict = {}
 
-        for entry in max_dates:
-            ticker = entry['active_stocks_alpha_vantage__yahoo_ticker']
-            max_date = entry['max_date']
-            if max_date < last_trading_day:
+        for ticker, max_date, last_fetch_attempt in watermarks:
+            if last_fetch_attempt is not None and last_fetch_attempt >= closed_at:
+                uptodate_tickers.append(ticker)
+            elif max_date is None:
+                continue  # Never returned data; planned together with the tickers without data
+            elif max_date < last_trading_day:
                 last_date_dict.setdefault(max_date, []).append(ticker)
                 outdated_tickers.append(ticker)
             else:
                 uptodate_tickers.append(ticker)
         return last_date_dict, outdated_tickers, uptodate_tickers
 
-    def update_tickers(self, last_date_dict: Dict[datetime.date, List[str]]) -> Tuple[List[str], List[str]]:
-        """Fetch and update data for outdated tickers."""
-        total_updated = []
-        total_failed = []
+    def plan_run(self) -> Optional[FetchRun]:
+        """Work out which batches need downloading and record them in a new run journal."""
+        last_trading_day = self.get_last_trading_day(timezone.now())
+        self.stdout.write(self.style.SUCCESS(f"Last closed session: {last_trading_day}"))
+
+        active_tickers = self.get_active_tickers()
+        self.stdout.write(self.style.SUCCESS(f"Number of active tickers: {len(active_tickers)}"))
+
+        last_date_dict, outdated_tickers, uptodate_tickers = self.get_outdated_tickers(last_trading_day)
+        tickers_no_data = list(active_tickers - set(uptodate_tickers) - set(outdated_tickers))
+
+        self.stdout.write(self.style.SUCCESS(f"Tickers with no data: {len(tickers_no_data)}"))
+        self.stdout.write(self.style.SUCCESS(f"Number of uptodate tickers (acutal): {len(uptodate_tickers)}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Number of outdated tickers: {len(outdated_tickers)}"))
+
+        start_dates = {
+            ticker: last_data_date + timedelta(days=1)
+            for last_data_date, tickers in last_date_dict.items()
+            for ticker in tickers
+        }
+        start_dates.update({ticker: date.fromisoformat(self.DEFAULT_START_DATE) for ticker in tickers_no_data})
+        plan = plan_sharded_batches(start_dates, last_trading_day, self.batch_size, self.workers)
+        if not plan.batches:
+            return None
 
-        for last_data_date, tickers in last_date_dict.items():
-            self.stdout.write(self.style.SUCCESS(f"Fetching data for {len(tickers)} tickers from {last_data_date}"))
-            updated = self.fetch_data(tickers, start_date=last_data_date + timedelta(days=1))
-            total_updated.extend(updated)
+        for batch in plan.batches:
+            self.stdout.write(f"Planned {len(batch.tickers)} tickers from {batch.start_date} (~{batch.estimated_rows} rows)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Plan: {len(plan.batches)} batches, {plan.tickers} Yahoo requests, ~{plan.estimated_rows} rows estimated"
+        ))
 
-        return total_updated, total_failed
+        # Stop downloads after the last closed session so a partial bar of today is never stored
+        run = FetchRun.objects.create(command='fetch_historicals', end_date=last_trading_day + timedelta(days=1))
+        FetchBatch.objects.bulk_create([
+            FetchBatch(
+                run=run, batch_num=batch_num, tickers=batch.tickers, start_date=batch.start_date,
+                start_dates={ticker: start_date.isoformat() for ticker, start_date in batch.start_dates.items()},
+            )
+            for batch_num, batch in enumerate(plan.batches, start=1)
+        ])
+        return run
 
-    def update_tickers_without_data(self, tickers: List[str], start_date: str):
-        """Fetch and update data for tickers without any historical data."""
-        if tickers:
-            self.stdout.write(self.style.SUCCESS(f"Fetching data for {len(tickers)} tickers starting from {start_date}"))
-            updated = self.fetch_data(tickers, start_date=start_date)
-            self.stdout.write(self.style.SUCCESS(f"Tickers updated: {len(updated)}"))
+    def get_resumable_run(self) -> Optional[FetchRun]:
+        """Return the most recent run that did not finish."""
+        return FetchRun.objects.filter(command='fetch_historicals').exclude(status=FetchRun.STATUS_FINISHED).first()
 
-    def fetch_data(self, tickers: List[str], start_date: str) -> List[str]:
-        """Fetch and save historical data in batches."""
+    def execute_sharded(self, run: FetchRun, options: Dict[str, object]) -> Tuple[List[str], List[str]]:
+        """Run every shard of a run in its own process and aggregate the results."""
+        options = {key: options[key] for key in WORKER_OPTIONS if key in options}
         tickers_updated = []
-        batches = [tickers[i:i + self.BATCH_SIZE] for i in range(0, len(tickers), self.BATCH_SIZE)]
-        self.stdout.write(f"Processing {len(batches)} batches")
+        tickers_failed = []
+        # Forked workers must not share the parent's open connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+            futures = [executor.submit(run_shard, run.pk, shard, self.workers, options) for shard in range(self.workers)]
+            for future in as_completed(futures):
+                result = future.result()
+                tickers_updated.extend(result.updated)
+                tickers_failed.extend(result.failed)
+                self.stats += IngestStats(inserted=result.inserted, skipped=result.skipped)
+        return tickers_updated, tickers_failed
 
-        for batch_num, batch in enumerate(batches, start=1):
-            self.stdout.write(f"Downloading batch {batch_num}/{len(batches)}: {batch}")
-            data = yf.download(batch, interval='1d', start=start_date, group_by='ticker', progress=False, actions=False)
+    def execute_run(self, run: FetchRun, shard: int = 0, shards: int = 1) -> Tuple[List[str], List[str]]:
+        """Download and save every unfinished batch of a run, journaling each batch as it completes.
 
-            if data.empty:
-                self.stdout.write(self.style.WARNING(f"No data returned for batch {batch_num}."))
+        With several shards only the batches whose first ticker falls in `shard` are processed;
+        batches never share tickers, so shards cannot insert the same rows.
+        """
+        tickers_updated = []
+        tickers_failed = []
+        pending = [
+            batch for batch in run.batches.exclude(status=FetchBatch.STATUS_DONE).order_by('batch_num')
+            if shard_of(batch.tickers[0], shards) == shard
+        ]
+        self.stdout.write(f"Processing {len(pending)} batches")
+
+        # Journals written before per-ticker start dates fall back to the batch start date
+        jobs = [{ticker: batch.start_dates.get(ticker, batch.start_date) for ticker in batch.tickers} for batch in pending]
+        end_date = run.end_date or self.get_last_trading_day(timezone.now()) + timedelta(days=1)
+        for position, tickers, data, error, elapsed in self.downloader.run(jobs, end_date=end_date):
+            batch = pending[position - 1]
+            batch.download_seconds = elapsed
+            self.stdout.write(f"Downloaded batch {batch.batch_num}/{len(pending)}: {tickers}")
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f"Error downloading batch {batch.batch_num}: {error}"))
+                self.finish_batch(batch, FetchBatch.STATUS_FAILED, error=str(error))
+                tickers_failed.extend(tickers)
                 continue
 
-            for ticker in batch:
-                try:
-                    if ticker not in data or data[ticker].dropna().empty:
-                        self.stdout.write(self.style.WARNING(f"No data found for ticker {ticker}"))
-                        continue
-
-                    self.save_historical_data(ticker, data[ticker])
-                    tickers_updated.append(ticker)
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Error processing ticker {ticker}: {e}"))
-
-        return tickers_updated
-
-    def save_historical_data(self, ticker: str, data):
-        """Save historical data for a given ticker."""
-        stock = ActiveStocksAlphaVantage.objects.get(yahoo_ticker=ticker)
-        rows = data.dropna(axis=0, how='all')
-        historical_entries = [
-            HistoricalData(
-                active_stocks_alpha_vantage=stock,
-                date=index.date(),
-                open=row['Open'],
-                high=row['High'],
-                low=row['Low'],
-                close=row['Close'],
-                adj_close=row.get('Adj Close'),
-                volume=row['Volume']
+            frames = {}
+            for ticker in tickers:
+                frame = data.pop(ticker, None)
+                if frame is None or frame.dropna().empty:
+                    self.stdout.write(self.style.WARNING(f"No data found for ticker {ticker}"))
+                    tickers_failed.append(ticker)
+                    continue
+                frames[ticker] = frame
+            del data
+
+            started = time.perf_counter()
+            try:
+                stats = self.save_historical_data(frames, attempted=tickers)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Error saving batch {batch.batch_num}: {e}"))
+                self.finish_batch(batch, FetchBatch.STATUS_FAILED, error=str(e))
+                tickers_failed.extend(frames)
+                continue
+            tickers_updated.extend(frames)
+            # Release the batch's frames before the next one is taken off the queue
+            del frames
+            batch.rows_written = stats.inserted
+            batch.rows_skipped = stats.skipped
+            batch.write_seconds = time.perf_counter() - started
+            self.finish_batch(batch, FetchBatch.STATUS_DONE)
+        return tickers_updated, tickers_failed
+
+    def finish_run(self, run: FetchRun):
+        """Mark a run finished, or failed if any of its batches failed."""
+        failed = run.batches.filter(status=FetchBatch.STATUS_FAILED).exists()
+        run.status = FetchRun.STATUS_FAILED if failed else FetchRun.STATUS_FINISHED
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at'])
+
+    def finish_batch(self, batch: FetchBatch, status: str, error: Optional[str] = None):
+        """Record the outcome of a batch in the run journal."""
+        batch.status = status
+        batch.error = error
+        batch.finished_at = timezone.now()
+        batch.save()
+
+    def save_historical_data(self, frames: Dict[str, object], attempted: List[str] = ()) -> IngestStats:
+        """Save historical data for a batch of tickers with a single bulk upsert."""
+        stats = save_historical_frames(frames, use_copy=self.use_copy, attempted=attempted)
+        self.stats += stats
+        self.stdout.write(f"Rows inserted: {stats.inserted}, skipped (already stored): {stats.skipped}")
+        return stats
+
+    def list_runs(self, limit: int = 10):
+        """Print the most recent runs with their batch progress."""
+        runs = FetchRun.objects.filter(command='fetch_historicals').annotate(
+            batches_total=Count('batches'),
+            batches_done=Count('batches', filter=Q(batches__status=FetchBatch.STATUS_DONE)),
+            rows_written=Sum('batches__rows_written'),
+        )[:limit]
+        for run in runs:
+            finished = f"{run.finished_at:%Y-%m-%d %H:%M}" if run.finished_at else '-'
+            self.stdout.write(
+                f"#{run.pk} {run.status}: started {run.started_at:%Y-%m-%d %H:%M}, finished {finished}, "
+                f"batches {run.batches_done}/{run.batches_total}, rows written {run.rows_written or 0}"
             )
-            for index, row in rows.iterrows()
-            if not HistoricalData.objects.filter(active_stocks_alpha_vantage=stock, date=index.date()).exists()
-        ]
-        HistoricalData.objects.bulk_create(historical_entries, batch_size=self.BATCH_SIZE)
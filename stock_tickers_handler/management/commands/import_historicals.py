@@ -0,0 +1,59 @@
+import time
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from stock_tickers_handler.ingestion import IngestStats, copy_historical_rows, get_ticker_ids, save_historical_rows
+
+# Expected CSV header; prices are stored as-is, volume may be empty
+CSV_COLUMNS = ['ticker', 'date', 'open', 'high', 'low', 'close', 'adj_close', 'volume']
+
+
+class Command(BaseCommand):
+    help = 'Import daily bars from CSV files (ticker,date,open,high,low,close,adj_close,volume) into HistoricalData'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV files to import')
+        parser.add_argument('--chunk-size', type=int, default=200_000, help='Rows read and written per chunk')
+        parser.add_argument(
+            '--loader', choices=['bulk', 'copy'], default='copy',
+            help="Write path: 'copy' streams through COPY on PostgreSQL, 'bulk' uses bulk_create"
+        )
+
+    def handle(self, *args, **kwargs):
+        loader = copy_historical_rows if kwargs['loader'] == 'copy' else save_historical_rows
+        stats = IngestStats()
+        unknown_tickers = set()
+        started = time.perf_counter()
+
+        for path in kwargs['paths']:
+            try:
+                reader = pd.read_csv(path, usecols=CSV_COLUMNS, parse_dates=['date'], chunksize=kwargs['chunk_size'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+
+            for chunk in reader:
+                chunk = chunk.dropna(subset=['open', 'high', 'low', 'close'])
+                chunk['adj_close'] = chunk['adj_close'].fillna(chunk['close'])
+                chunk['volume'] = chunk['volume'].fillna(0).astype('int64')
+
+                ticker_ids = get_ticker_ids(chunk['ticker'].unique())
+                unknown_tickers.update(set(chunk['ticker'].unique()) - set(ticker_ids))
+
+                rows_by_stock = {}
+                for ticker, group in chunk.groupby('ticker', sort=False):
+                    if ticker not in ticker_ids:
+                        continue
+                    prices = group[['open', 'high', 'low', 'close', 'adj_close']].to_numpy(dtype='float64').round(5)
+                    rows_by_stock[ticker_ids[ticker]] = list(zip(
+                        group['date'].dt.date, *prices.T.tolist(), group['volume'].tolist()
+                    ))
+
+                stats += loader(rows_by_stock)
+                self.stdout.write(f"{path}: {stats.inserted} rows inserted, {stats.skipped} skipped so far")
+
+        elapsed = time.perf_counter() - started
+        total = stats.inserted + stats.skipped
+        self.stdout.write(self.style.SUCCESS(f"Rows inserted: {stats.inserted}"))
+        self.stdout.write(self.style.SUCCESS(f"Rows skipped (already stored): {stats.skipped}"))
+        self.stdout.write(self.style.SUCCESS(f"Throughput: {total / elapsed if elapsed else 0:,.0f} rows/s in {elapsed:.1f}s"))
+        if unknown_tickers:
+            self.stdout.write(self.style.WARNING(f"Unknown tickers skipped: {', '.join(sorted(unknown_tickers))}"))
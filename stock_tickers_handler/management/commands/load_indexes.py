@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from stock_tickers_handler.indexes import INDEX_TICKERS, register_index_symbols
+
+class Command(BaseCommand):
+    help = 'Register the index and commodity symbols of the indexes page so fetch_historicals stores their history'
+
+    def handle(self, *args, **kwargs):
+        added = register_index_symbols()
+        self.stdout.write(self.style.SUCCESS(
+            f'Registered {added} new index and commodity symbols ({len(INDEX_TICKERS)} in total); '
+            'run fetch_historicals to load their history'
+        ))
@@ -1,7 +1,8 @@
-import requests
 import csv
 from django.core.management.base import BaseCommand
 from stock_tickers_handler.models import ActiveStocksAlphaVantage
+from stock_tickers_handler.autocomplete import autocomplete
+from stock_tickers_handler.http_client import http_client
 from datetime import datetime
 from io import StringIO
 
@@ -17,7 +18,7 @@ class Command(BaseCommand):
         url = f'https://www.alphavantage.co/query?function=LISTING_STATUS&apikey={api_key}'
         skipped_rows = 0
         # Fetch data from the API
-        response = requests.get(url)
+        response = http_client.get(url)
 
         # Check if the request was successful
         if response.status_code == 200:
@@ -73,10 +74,13 @@ class Command(BaseCommand):
             # Insert all records into the database in bulk
             if records:
                 ActiveStocksAlphaVantage.objects.bulk_create(records)
+                # Rebuild the autocomplete index of this process on its next lookup
+                autocomplete.invalidate()
                 self.stdout.write(self.style.SUCCESS(f'Successfully loaded {len(records)} records from AlphaVantage API from into the database. Skipped {skipped_rows} rows with missing basic data'))
             else:
                 self.stdout.write(self.style.WARNING('No valid records found to load into the database'))
         else:
             # Log an error if the API request fails
             self.stdout.write(self.style.ERROR(f'Failed to fetch data from API: {response.status_code}'))
+        self.stdout.write(f'HTTP: {http_client.metrics.summary()}')
         
\ No newline at end of file
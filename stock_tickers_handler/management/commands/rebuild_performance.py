@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from stock_tickers_handler.performance import refresh_snapshots
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed performance snapshots (trailing returns per ticker) from the stored historical bars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Yahoo tickers to rebuild (default: all tickers with stored bars)')
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        rebuilt = refresh_snapshots(kwargs['tickers'] or None)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt performance snapshots for {rebuilt} tickers in {elapsed:.1f}s'))
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from stock_tickers_handler.price_metrics import refresh_price_fundamentals
+from stock_tickers_handler.screener import screener_snapshot
+
+class Command(BaseCommand):
+    help = 'Recompute the price-derived fundamentals (52 week range, moving averages, average volumes) from the stored historical bars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Yahoo tickers to rebuild (default: all tickers with fundamentals)')
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        rebuilt = refresh_price_fundamentals(kwargs['tickers'] or None)
+        screener_snapshot.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt price-derived fundamentals for {rebuilt} tickers in {elapsed:.1f}s'))
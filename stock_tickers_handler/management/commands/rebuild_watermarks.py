@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from stock_tickers_handler.ingestion import get_ticker_ids, rebuild_watermarks
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-ticker watermarks (first/last date, row count) from the stored historical bars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Yahoo tickers to repair (default: all)')
+
+    def handle(self, *args, **kwargs):
+        stock_ids = None
+        if kwargs['tickers']:
+            ticker_ids = get_ticker_ids(kwargs['tickers'])
+            missing = set(kwargs['tickers']) - set(ticker_ids)
+            if missing:
+                self.stdout.write(self.style.WARNING(f"Unknown tickers ignored: {', '.join(sorted(missing))}"))
+            stock_ids = ticker_ids.values()
+
+        rebuilt = rebuild_watermarks(stock_ids)
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt watermarks for {rebuilt} tickers'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, RollingWindow
+from stock_tickers_handler.rolling import DEFAULT_BENCHMARK, DEFAULT_WINDOW, track_window
+
+class Command(BaseCommand):
+    help = 'Start (or with --stop, end) tracking rolling correlation, covariance and beta of tickers against a benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='+', help='Yahoo tickers to track')
+        parser.add_argument('--benchmark', default=DEFAULT_BENCHMARK, help=f'Benchmark ticker (default: {DEFAULT_BENCHMARK})')
+        parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help=f'Window length in sessions (default: {DEFAULT_WINDOW})')
+        parser.add_argument('--stop', action='store_true', help='Stop tracking the windows and delete their stats')
+
+    def handle(self, *args, **kwargs):
+        tickers = [ticker.upper() for ticker in kwargs['tickers']]
+        benchmark = kwargs['benchmark'].upper()
+        window = kwargs['window']
+
+        if kwargs['stop']:
+            deleted, _ = RollingWindow.objects.filter(
+                active_stocks_alpha_vantage__yahoo_ticker__in=tickers, benchmark__yahoo_ticker=benchmark, window=window
+            ).delete()
+            self.stdout.write(self.style.SUCCESS(f'Stopped tracking {len(tickers)} tickers against {benchmark} ({deleted} rows deleted)'))
+            return
+
+        for ticker in tickers:
+            try:
+                state = track_window(ticker, benchmark, window)
+            except (ActiveStocksAlphaVantage.DoesNotExist, ValueError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f'Tracking {ticker} against {benchmark} over {window} sessions: {state.stats.count()} stats up to {state.last_date}'
+            ))
@@ -1,11 +1,22 @@
+import time
 from django.core.management.base import BaseCommand
-from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+from stock_tickers_handler.fundamentals import RECOMPUTABLE_FIELDS, recompute_derived
+from stock_tickers_handler.screener import screener_snapshot
 
 class Command(BaseCommand):
-    help = 'Update stock percentage calculations'
+    help = 'Recompute derived fundamentals (upside, position in the 52 week range) from the stored fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fields', nargs='+', choices=RECOMPUTABLE_FIELDS, default=list(RECOMPUTABLE_FIELDS),
+            help='Derived fields to recompute (default: all of them)'
+        )
 
     def handle(self, *args, **kwargs):
-        stocks = FundamentalData.objects.all()
-        for stock in stocks:
-            stock.save()  # To update the percentages as they are computed in the save method
-        self.stdout.write(self.style.SUCCESS('Successfully updated stock percentages.'))
\ No newline at end of file
+        started = time.perf_counter()
+        # One set-based UPDATE instead of loading and saving every row
+        updated = recompute_derived(kwargs['fields'])
+        screener_snapshot.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {', '.join(kwargs['fields'])} for {updated} rows in {time.perf_counter() - started:.2f}s."
+        ))
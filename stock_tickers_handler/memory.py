@@ -0,0 +1,47 @@
+import os
+import sys
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process right now (falls back to the peak where /proc is unavailable).
+
+    None when the platform offers no way to measure it.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Highest resident set size this process has reached, None when it cannot be measured."""
+    if resource is None:
+        if psutil is not None:
+            # peak_wset on Windows; other platforms without `resource` only report the current size
+            info = psutil.Process().memory_info()
+            return getattr(info, 'peak_wset', info.rss)
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_mb(size: Optional[int]) -> str:
+    if size is None:
+        return "unknown"
+    return f"{size / (1024 * 1024):.1f} MB"
@@ -0,0 +1,52 @@
+# Generated by Django 5.1 on 2026-10-18 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Fetch Run',
+                'verbose_name_plural': 'Fetch Runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FetchBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_num', models.PositiveIntegerField()),
+                ('tickers', models.JSONField()),
+                ('start_date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('rows_written', models.IntegerField(default=0)),
+                ('rows_skipped', models.IntegerField(default=0)),
+                ('download_seconds', models.FloatField(blank=True, null=True)),
+                ('write_seconds', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='stock_tickers_handler.fetchrun')),
+            ],
+            options={
+                'verbose_name': 'Fetch Batch',
+                'verbose_name_plural': 'Fetch Batches',
+                'ordering': ['run', 'batch_num'],
+                'constraints': [models.UniqueConstraint(fields=('run', 'batch_num'), name='unique_run_batch')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-18 06:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def build_watermarks(apps, schema_editor):
+    """Seed watermarks from the bars already stored so the first planning run does not refetch them."""
+    HistoricalData = apps.get_model('stock_tickers_handler', 'HistoricalData')
+    TickerWatermark = apps.get_model('stock_tickers_handler', 'TickerWatermark')
+    ranges = HistoricalData.objects.values('active_stocks_alpha_vantage_id').annotate(
+        first_date=Min('date'), last_date=Max('date'), row_count=Count('id')
+    )
+    TickerWatermark.objects.bulk_create([TickerWatermark(**entry) for entry in ranges], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0002_fetchrun_fetchbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TickerWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_date', models.DateField(blank=True, null=True)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('row_count', models.IntegerField(default=0)),
+                ('last_fetch_attempt', models.DateTimeField(blank=True, null=True)),
+                ('active_stocks_alpha_vantage', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='watermark', to='stock_tickers_handler.activestocksalphavantage')),
+            ],
+            options={
+                'verbose_name': 'Ticker Watermark',
+                'verbose_name_plural': 'Ticker Watermarks',
+            },
+        ),
+        migrations.RunPython(build_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 06:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0003_tickerwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('last_close', models.FloatField(blank=True, null=True)),
+                ('return_1w', models.FloatField(blank=True, null=True)),
+                ('return_1m', models.FloatField(blank=True, null=True)),
+                ('return_3m', models.FloatField(blank=True, null=True)),
+                ('return_1y', models.FloatField(blank=True, null=True)),
+                ('return_2y', models.FloatField(blank=True, null=True)),
+                ('return_5y', models.FloatField(blank=True, null=True)),
+                ('return_ytd', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('active_stocks_alpha_vantage', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='performance', to='stock_tickers_handler.activestocksalphavantage')),
+            ],
+            options={
+                'verbose_name': 'Performance Snapshot',
+                'verbose_name_plural': 'Performance Snapshots',
+            },
+        ),
+    ]
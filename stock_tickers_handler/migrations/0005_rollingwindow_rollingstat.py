@@ -0,0 +1,55 @@
+# Generated by Django 5.1 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0004_performancesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollingWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveIntegerField()),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('last_close', models.FloatField(blank=True, null=True)),
+                ('last_benchmark_close', models.FloatField(blank=True, null=True)),
+                ('returns', models.JSONField(default=list)),
+                ('active_stocks_alpha_vantage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rolling_windows', to='stock_tickers_handler.activestocksalphavantage')),
+                ('benchmark', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='benchmark_rolling_windows', to='stock_tickers_handler.activestocksalphavantage')),
+            ],
+            options={
+                'verbose_name': 'Rolling Window',
+                'verbose_name_plural': 'Rolling Windows',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollingStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('correlation', models.FloatField(blank=True, null=True)),
+                ('covariance', models.FloatField(blank=True, null=True)),
+                ('beta', models.FloatField(blank=True, null=True)),
+                ('rolling_window', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='stock_tickers_handler.rollingwindow')),
+            ],
+            options={
+                'verbose_name': 'Rolling Stat',
+                'verbose_name_plural': 'Rolling Stats',
+                'ordering': ['rolling_window', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='rollingwindow',
+            constraint=models.UniqueConstraint(fields=('active_stocks_alpha_vantage', 'benchmark', 'window'), name='unique_rolling_window'),
+        ),
+        migrations.AddConstraint(
+            model_name='rollingstat',
+            constraint=models.UniqueConstraint(fields=('rolling_window', 'date'), name='unique_rolling_window_date'),
+        ),
+    ]
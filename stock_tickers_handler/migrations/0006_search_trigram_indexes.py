@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 07:02
+
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """GIN trigram indexes for ranked ticker/name search; other databases use the in-process index instead."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS fundamental_long_name_trgm '
+        'ON stock_tickers_handler_fundamentaldata USING gin (long_name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS active_stocks_yahoo_ticker_trgm '
+        'ON stock_tickers_handler_activestocksalphavantage USING gin (yahoo_ticker gin_trgm_ops)'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS fundamental_long_name_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS active_stocks_yahoo_ticker_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0005_rollingwindow_rollingstat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
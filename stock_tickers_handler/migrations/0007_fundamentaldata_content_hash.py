@@ -0,0 +1,31 @@
+# Generated by Django 5.1 on 2026-10-18 07:15
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_checked(apps, schema_editor):
+    """Rows fetched before this migration were last checked when they were last written."""
+    FundamentalData = apps.get_model('stock_tickers_handler', 'FundamentalData')
+    FundamentalData.objects.update(last_checked=F('last_updated'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0006_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundamentaldata',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='fundamentaldata',
+            name='last_checked',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_checked, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-18 07:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0007_fundamentaldata_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundamentaldata',
+            name='earnings_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RefreshState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('error_rate', models.FloatField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_attempt', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.DateTimeField(blank=True, null=True)),
+                ('active_stocks_alpha_vantage', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='refresh_state', to='stock_tickers_handler.activestocksalphavantage')),
+            ],
+            options={
+                'verbose_name': 'Refresh State',
+                'verbose_name_plural': 'Refresh States',
+            },
+        ),
+    ]
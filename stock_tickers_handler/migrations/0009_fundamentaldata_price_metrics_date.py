@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0008_refreshstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundamentaldata',
+            name='price_metrics_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0009_fundamentaldata_price_metrics_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchbatch',
+            name='start_dates',
+            field=models.JSONField(default=dict),
+        ),
+    ]
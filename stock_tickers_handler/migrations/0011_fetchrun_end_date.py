@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_tickers_handler', '0010_fetchbatch_start_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
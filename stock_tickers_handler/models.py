@@ -2,6 +2,9 @@ from decimal import Decimal
 from django.db import models
 from django.db.models import UniqueConstraint
 class ActiveStocksAlphaVantage(models.Model):
+    # Index and commodity symbols registered for their bars (see indexes.py); not listed securities
+    INDEX_ASSET_TYPES = ('Index', 'Commodity')
+
     ticker = models.CharField(max_length=50, unique=True)  # ticker musi być unikalny
     name = models.CharField(max_length=250)
     exchange = models.CharField(max_length=50)
@@ -86,6 +89,7 @@ class FundamentalData(models.Model):
     last_fiscal_year_end = models.DateField(blank=True, null=True)
     next_fiscal_year_end = models.DateField(blank=True, null=True)
     most_recent_quarter = models.DateField(blank=True, null=True)
+    earnings_date = models.DateField(blank=True, null=True)
     earnings_quarterly_growth = models.DecimalField(max_digits=12, decimal_places=5, blank=True, null=True)
     net_income_to_common = models.BigIntegerField(blank=True, null=True)
     trailing_eps = models.DecimalField(max_digits=12, decimal_places=5, blank=True, null=True)
@@ -139,6 +143,12 @@ class FundamentalData(models.Model):
     overall_risk = models.SmallIntegerField(blank=True, null=True)
     
     last_updated = models.DateTimeField(auto_now=True)
+    # Fingerprint of the normalized Yahoo record, written only when it changes
+    content_hash = models.CharField(max_length=32, blank=True, null=True)
+    # When fetch_info last refreshed the ticker, whether or not its content changed
+    last_checked = models.DateTimeField(blank=True, null=True)
+    # Session the price fields were last computed for from the stored bars, see price_metrics
+    price_metrics_date = models.DateField(blank=True, null=True)
 
 
 class HistoricalData(models.Model):
@@ -157,4 +167,159 @@ class HistoricalData(models.Model):
         verbose_name_plural = "Historical Data"
         constraints = [
             UniqueConstraint(fields=['active_stocks_alpha_vantage', 'date'], name='unique_ticker_date')
-        ]
\ No newline at end of file
+        ]
+
+class TickerWatermark(models.Model):
+    active_stocks_alpha_vantage = models.OneToOneField('ActiveStocksAlphaVantage', on_delete=models.CASCADE, related_name='watermark')
+    first_date = models.DateField(blank=True, null=True)
+    last_date = models.DateField(blank=True, null=True)
+    row_count = models.IntegerField(default=0)
+    last_fetch_attempt = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.active_stocks_alpha_vantage_id} - {self.first_date} to {self.last_date} ({self.row_count} rows)"
+
+    class Meta:
+        verbose_name = "Ticker Watermark"
+        verbose_name_plural = "Ticker Watermarks"
+
+
+class RefreshState(models.Model):
+    """How fetch_info's recent attempts at a ticker went, for the refresh scheduler."""
+    active_stocks_alpha_vantage = models.OneToOneField('ActiveStocksAlphaVantage', on_delete=models.CASCADE, related_name='refresh_state')
+    # Exponentially weighted share of failed attempts, 0 when every recent attempt succeeded
+    error_rate = models.FloatField(default=0)
+    attempts = models.IntegerField(default=0)
+    last_attempt = models.DateTimeField(blank=True, null=True)
+    last_error = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.active_stocks_alpha_vantage_id} - error rate {self.error_rate:.2f} over {self.attempts} attempts"
+
+    class Meta:
+        verbose_name = "Refresh State"
+        verbose_name_plural = "Refresh States"
+
+
+class PerformanceSnapshot(models.Model):
+    active_stocks_alpha_vantage = models.OneToOneField('ActiveStocksAlphaVantage', on_delete=models.CASCADE, related_name='performance')
+    as_of = models.DateField()
+    last_close = models.FloatField(blank=True, null=True)
+    return_1w = models.FloatField(blank=True, null=True)
+    return_1m = models.FloatField(blank=True, null=True)
+    return_3m = models.FloatField(blank=True, null=True)
+    return_1y = models.FloatField(blank=True, null=True)
+    return_2y = models.FloatField(blank=True, null=True)
+    return_5y = models.FloatField(blank=True, null=True)
+    return_ytd = models.FloatField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.active_stocks_alpha_vantage_id} - {self.as_of}"
+
+    class Meta:
+        verbose_name = "Performance Snapshot"
+        verbose_name_plural = "Performance Snapshots"
+
+
+class RollingWindow(models.Model):
+    """The last `window` daily return pairs of a ticker against a benchmark, from which the running sums are rebuilt."""
+    active_stocks_alpha_vantage = models.ForeignKey('ActiveStocksAlphaVantage', on_delete=models.CASCADE, related_name='rolling_windows')
+    benchmark = models.ForeignKey('ActiveStocksAlphaVantage', on_delete=models.CASCADE, related_name='benchmark_rolling_windows')
+    window = models.PositiveIntegerField()
+    last_date = models.DateField(blank=True, null=True)
+    last_close = models.FloatField(blank=True, null=True)
+    last_benchmark_close = models.FloatField(blank=True, null=True)
+    returns = models.JSONField(default=list)  # [stock return, benchmark return] pairs currently in the window
+
+    def __str__(self):
+        return f"{self.active_stocks_alpha_vantage_id} vs {self.benchmark_id} ({self.window} sessions)"
+
+    class Meta:
+        verbose_name = "Rolling Window"
+        verbose_name_plural = "Rolling Windows"
+        constraints = [
+            UniqueConstraint(fields=['active_stocks_alpha_vantage', 'benchmark', 'window'], name='unique_rolling_window')
+        ]
+
+
+class RollingStat(models.Model):
+    rolling_window = models.ForeignKey('RollingWindow', on_delete=models.CASCADE, related_name='stats')
+    date = models.DateField()
+    correlation = models.FloatField(blank=True, null=True)
+    covariance = models.FloatField(blank=True, null=True)
+    beta = models.FloatField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.rolling_window_id} - {self.date}"
+
+    class Meta:
+        verbose_name = "Rolling Stat"
+        verbose_name_plural = "Rolling Stats"
+        ordering = ['rolling_window', 'date']
+        constraints = [
+            UniqueConstraint(fields=['rolling_window', 'date'], name='unique_rolling_window_date')
+        ]
+
+
+class FetchRun(models.Model):
+    STATUS_RUNNING = 'running'
+    STATUS_FINISHED = 'finished'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FINISHED, 'Finished'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    command = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Exclusive download bound fixed at planning time, so a resumed run stops at the same session
+    end_date = models.DateField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.command} #{self.pk} - {self.status}"
+
+    class Meta:
+        verbose_name = "Fetch Run"
+        verbose_name_plural = "Fetch Runs"
+        ordering = ['-started_at']
+
+
+class FetchBatch(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    run = models.ForeignKey('FetchRun', on_delete=models.CASCADE, related_name='batches')
+    batch_num = models.PositiveIntegerField()
+    tickers = models.JSONField()
+    # Earliest of the per-ticker start dates
+    start_date = models.DateField()
+    # Ticker -> ISO date each ticker downloads from
+    start_dates = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows_written = models.IntegerField(default=0)
+    rows_skipped = models.IntegerField(default=0)
+    download_seconds = models.FloatField(blank=True, null=True)
+    write_seconds = models.FloatField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Run #{self.run_id} batch {self.batch_num} - {self.status}"
+
+    class Meta:
+        verbose_name = "Fetch Batch"
+        verbose_name_plural = "Fetch Batches"
+        ordering = ['run', 'batch_num']
+        constraints = [
+            UniqueConstraint(fields=['run', 'batch_num'], name='unique_run_batch')
+        ]
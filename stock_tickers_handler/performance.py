@@ -0,0 +1,162 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData, PerformanceSnapshot, TickerWatermark
+
+# Calendar-day lookbacks shown on the sectors page
+PERIODS = {
+    '5_years': 1825,
+    '2_years': 730,
+    '1_year': 365,
+    '3_months': 90,
+    '1_month': 30,
+    '1_week': 7,
+}
+
+# Snapshot columns and their calendar-day lookbacks; return_ytd is added per as_of date
+SNAPSHOT_PERIODS = {
+    'return_1w': 7,
+    'return_1m': 30,
+    'return_3m': 90,
+    'return_1y': 365,
+    'return_2y': 730,
+    'return_5y': 1825,
+}
+
+# Tickers loaded per query when rebuilding snapshots, which bounds the price matrix to ~chunk x 1300 floats
+SNAPSHOT_CHUNK_SIZE = 500
+
+
+class PriceMatrix(NamedTuple):
+    """Adjusted closes aligned on a shared date axis: one row per date, one column per ticker, NaN where a ticker has no bar."""
+    dates: np.ndarray
+    tickers: List[str]
+    closes: np.ndarray
+
+
+def load_adjusted_closes(tickers: Iterable[str], start_date: date, end_date: Optional[date] = None) -> PriceMatrix:
+    """Load adjusted closes for all `tickers` from `start_date` in a single query."""
+    tickers = list(tickers)
+    queryset = HistoricalData.objects.filter(active_stocks_alpha_vantage__yahoo_ticker__in=tickers, date__gte=start_date)
+    if end_date is not None:
+        queryset = queryset.filter(date__lte=end_date)
+    # Casting in SQL skips building a Decimal per row
+    rows = list(queryset.values_list(
+        F('active_stocks_alpha_vantage__yahoo_ticker'), 'date', Cast('adj_close', FloatField())
+    ))
+    if not rows:
+        return PriceMatrix(np.array([], dtype='datetime64[D]'), tickers, np.empty((0, len(tickers))))
+
+    row_tickers, row_dates, row_closes = zip(*rows)
+    dates, date_index = np.unique(np.array(row_dates, dtype='datetime64[D]'), return_inverse=True)
+    column = {ticker: position for position, ticker in enumerate(tickers)}
+    closes = np.full((len(dates), len(tickers)), np.nan)
+    closes[date_index, [column[ticker] for ticker in row_tickers]] = row_closes
+    return PriceMatrix(dates, tickers, closes)
+
+
+def fill_backward(values: np.ndarray) -> np.ndarray:
+    """Replace each NaN with the next valid value further down its column."""
+    rows = np.arange(len(values))[:, None]
+    next_valid = np.where(np.isnan(values), len(values), rows)
+    next_valid = np.minimum.accumulate(next_valid[::-1], axis=0)[::-1]
+    padded = np.vstack([values, np.full((1, values.shape[1]), np.nan)])
+    return np.take_along_axis(padded, next_valid, axis=0)
+
+
+def last_valid_closes(closes: np.ndarray) -> np.ndarray:
+    """The last non-NaN close of every column (NaN for columns without any)."""
+    if not len(closes):
+        return np.full(closes.shape[1], np.nan)
+    last_valid = np.where(np.isnan(closes), -1, np.arange(len(closes))[:, None]).max(axis=0)
+    return np.where(last_valid >= 0, closes[last_valid, np.arange(closes.shape[1])], np.nan)
+
+
+def lookback_returns(matrix: PriceMatrix, periods: Dict[str, int], as_of: Optional[date] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """Percent change from the first to the last close inside each lookback window, for every ticker at once.
+
+    A window of `days` covers bars on or after `as_of - days`; tickers without a bar in the window get None.
+    """
+    as_of = as_of or date.today()
+    if not len(matrix.dates):
+        return {period: {ticker: None for ticker in matrix.tickers} for period in periods}
+
+    first_closes = fill_backward(matrix.closes)
+    last_closes = last_valid_closes(matrix.closes)
+
+    cutoffs = np.array([as_of - timedelta(days=days) for days in periods.values()], dtype='datetime64[D]')
+    starts = np.searchsorted(matrix.dates, cutoffs)
+    # One extra NaN row covers windows that start after the last stored date
+    padded = np.vstack([first_closes, np.full((1, len(matrix.tickers)), np.nan)])
+    start_closes = padded[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = np.round((last_closes - start_closes) / start_closes * 100, 2)
+
+    return {
+        period: {
+            ticker: None if np.isnan(change) else float(change)
+            for ticker, change in zip(matrix.tickers, changes[position])
+        }
+        for position, period in enumerate(periods)
+    }
+
+
+def get_performance(tickers: Iterable[str], periods: Dict[str, int] = PERIODS,
+                    as_of: Optional[date] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """Lookback returns for any set of tickers and periods, from one query and one vectorized pass."""
+    as_of = as_of or date.today()
+    matrix = load_adjusted_closes(tickers, as_of - timedelta(days=max(periods.values())), as_of)
+    return lookback_returns(matrix, periods, as_of)
+
+
+def snapshot_periods(as_of: date) -> Dict[str, int]:
+    periods = dict(SNAPSHOT_PERIODS)
+    periods['return_ytd'] = (as_of - date(as_of.year, 1, 1)).days
+    return periods
+
+
+def refresh_snapshots(tickers: Optional[Iterable[str]] = None, as_of: Optional[date] = None) -> int:
+    """Recompute and upsert performance snapshots for `tickers` (default: every ticker with stored bars).
+
+    Returns the number of snapshots written.
+    """
+    as_of = as_of or date.today()
+    if tickers is None:
+        ticker_ids = dict(
+            TickerWatermark.objects.filter(last_date__isnull=False)
+            .values_list('active_stocks_alpha_vantage__yahoo_ticker', 'active_stocks_alpha_vantage_id')
+        )
+    else:
+        ticker_ids = dict(
+            ActiveStocksAlphaVantage.objects.filter(yahoo_ticker__in=list(tickers)).values_list('yahoo_ticker', 'id')
+        )
+    periods = snapshot_periods(as_of)
+    start_date = as_of - timedelta(days=max(periods.values()))
+
+    ordered = sorted(ticker_ids)
+    refreshed = 0
+    for chunk_start in range(0, len(ordered), SNAPSHOT_CHUNK_SIZE):
+        matrix = load_adjusted_closes(ordered[chunk_start:chunk_start + SNAPSHOT_CHUNK_SIZE], start_date, as_of)
+        returns = lookback_returns(matrix, periods, as_of)
+        last_closes = last_valid_closes(matrix.closes)
+        snapshots = [
+            PerformanceSnapshot(
+                active_stocks_alpha_vantage_id=ticker_ids[ticker],
+                as_of=as_of,
+                last_close=None if np.isnan(last_close) else float(last_close),
+                **{field: returns[field][ticker] for field in periods},
+            )
+            for ticker, last_close in zip(matrix.tickers, last_closes)
+        ]
+        PerformanceSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['active_stocks_alpha_vantage'],
+            update_fields=['as_of', 'last_close', *periods, 'updated_at'],
+        )
+        refreshed += len(snapshots)
+    return refreshed
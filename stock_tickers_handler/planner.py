@@ -0,0 +1,67 @@
+import zlib
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, List, NamedTuple
+
+from stock_tickers_handler.trading_calendar import trading_days
+
+
+class PlannedBatch(NamedTuple):
+    tickers: List[str]
+    start_dates: Dict[str, date]  # each ticker downloads from its own start date
+    estimated_rows: int
+
+    @property
+    def start_date(self) -> date:
+        return min(self.start_dates.values())
+
+
+class Plan(NamedTuple):
+    batches: List[PlannedBatch]
+
+    @property
+    def tickers(self) -> int:
+        return sum(len(batch.tickers) for batch in self.batches)
+
+    @property
+    def estimated_rows(self) -> int:
+        return sum(batch.estimated_rows for batch in self.batches)
+
+
+def plan_batches(start_dates: Dict[str, date], end_date: date, batch_size: int) -> Plan:
+    """Split tickers with different start dates into download batches of `batch_size`.
+
+    Every ticker is a request of its own and downloads only from its own start date, so no stored
+    session is fetched again. Tickers are ordered by start date, which keeps the long backfills
+    together and the batches of a daily update evenly sized.
+    """
+    if not start_dates:
+        return Plan([])
+
+    ordered = sorted(start_dates.items(), key=lambda item: (item[1], item[0]))
+    sessions = trading_days(ordered[0][1], end_date)
+
+    def sessions_from(day: date) -> int:
+        return len(sessions) - bisect_left(sessions, day)
+
+    batches = []
+    for batch_start in range(0, len(ordered), batch_size):
+        batch = dict(ordered[batch_start:batch_start + batch_size])
+        batches.append(PlannedBatch(list(batch), batch, sum(sessions_from(day) for day in batch.values())))
+    return Plan(batches)
+
+
+def shard_of(ticker: str, shards: int) -> int:
+    """Stable shard number for a ticker; crc32 (unlike hash()) is the same in every process and run."""
+    return zlib.crc32(ticker.encode()) % shards
+
+
+def plan_sharded_batches(start_dates: Dict[str, date], end_date: date, batch_size: int, shards: int) -> Plan:
+    """Plan each shard of the ticker universe separately, so every batch belongs to exactly one shard."""
+    by_shard = {}
+    for ticker, start_date in start_dates.items():
+        by_shard.setdefault(shard_of(ticker, shards), {})[ticker] = start_date
+    batches = []
+    for shard in sorted(by_shard):
+        batches.extend(plan_batches(by_shard[shard], end_date, batch_size).batches)
+    return Plan(batches)
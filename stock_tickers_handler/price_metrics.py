@@ -0,0 +1,207 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from django.db import models
+from django.db.models import BigIntegerField, Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from stock_tickers_handler.fundamentals import recompute_derived
+from stock_tickers_handler.models import FundamentalData, HistoricalData
+from stock_tickers_handler.performance import PriceMatrix, lookback_returns
+
+# FundamentalData fields computed from the stored daily bars instead of fetched from Yahoo
+PRICE_FIELDS = (
+    'previous_close', 'price_52_week_low', 'price_52_week_high', 'price_50_day_moving_average',
+    'price_200_day_moving_average', 'percent_52_week_change', 'average_volume', 'average_volume_10_days',
+)
+
+# Fields Yahoo computes from the current price and stored fundamentals, recomputed with the local close
+PRICE_RATIO_FIELDS = ('market_cap', 'enterprise_value', 'trailing_pe', 'forward_pe', 'price_to_book', 'dividend_yield')
+
+# Sessions averaged like Yahoo does: averageVolume covers three months
+MOVING_AVERAGE_SESSIONS = {'price_50_day_moving_average': 50, 'price_200_day_moving_average': 200}
+AVERAGE_VOLUME_SESSIONS = {'average_volume': 63, 'average_volume_10_days': 10}
+YEAR_DAYS = 365
+
+# Tickers loaded per query, which bounds the five bar matrices to ~chunk x 260 floats each
+CHUNK_SIZE = 500
+
+
+class BarMatrix(NamedTuple):
+    """Daily bars of many tickers on a shared date axis: one row per date, one column per ticker, NaN where a ticker has no bar."""
+    dates: np.ndarray
+    tickers: List[str]
+    close: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    adj_close: np.ndarray
+    volume: np.ndarray
+
+
+def load_bars(tickers: Iterable[str], start_date: date, end_date: date) -> BarMatrix:
+    """Load the bars of all `tickers` between the two dates in a single query."""
+    tickers = list(tickers)
+    rows = list(
+        HistoricalData.objects.filter(
+            active_stocks_alpha_vantage__yahoo_ticker__in=tickers, date__gte=start_date, date__lte=end_date
+        ).values_list(
+            F('active_stocks_alpha_vantage__yahoo_ticker'), 'date',
+            *(Cast(field, FloatField()) for field in ('close', 'high', 'low', 'adj_close', 'volume')),
+        )
+    )
+    if not rows:
+        empty = np.empty((0, len(tickers)))
+        return BarMatrix(np.array([], dtype='datetime64[D]'), tickers, empty, empty, empty, empty, empty)
+
+    row_tickers, row_dates, *values = zip(*rows)
+    dates, date_index = np.unique(np.array(row_dates, dtype='datetime64[D]'), return_inverse=True)
+    column = {ticker: position for position, ticker in enumerate(tickers)}
+    columns = [column[ticker] for ticker in row_tickers]
+    matrices = []
+    for value in values:
+        matrix = np.full((len(dates), len(tickers)), np.nan)
+        matrix[date_index, columns] = np.array(value, dtype='float64')
+        matrices.append(matrix)
+    return BarMatrix(dates, tickers, *matrices)
+
+
+def sessions_from_end(present: np.ndarray) -> np.ndarray:
+    """For every cell, how many of its column's bars lie at or below it (1 for the latest bar); 0 where there is no bar."""
+    return np.where(present, np.cumsum(present[::-1], axis=0)[::-1], 0)
+
+
+def mean_of_last(values: np.ndarray, sessions: int) -> np.ndarray:
+    """Per column, the mean of the last `sessions` bars (fewer for young tickers); NaN without any."""
+    present = ~np.isnan(values)
+    window = present & (sessions_from_end(present) <= sessions)
+    counts = window.sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        return np.where(counts > 0, np.where(window, values, 0).sum(axis=0) / counts, np.nan)
+
+
+def latest(values: np.ndarray) -> np.ndarray:
+    return mean_of_last(values, 1)
+
+
+def last_bar_dates(bars: BarMatrix) -> List[Optional[date]]:
+    """Date of every ticker's latest bar, None for tickers without any."""
+    present = ~np.isnan(bars.close)
+    last = np.where(present, np.arange(len(bars.dates))[:, None], -1).max(axis=0, initial=-1)
+    return [bars.dates[position].item() if position >= 0 else None for position in last]
+
+
+def price_metrics(bars: BarMatrix, as_of: date) -> Dict[str, np.ndarray]:
+    """Every PRICE_FIELDS metric for every ticker at once, as float columns with NaN where a ticker lacks the bars."""
+    year = bars.dates >= np.datetime64(as_of - timedelta(days=YEAR_DAYS))
+    low, high = bars.low[year], bars.high[year]
+    has_year = (~np.isnan(low)).any(axis=0)
+    metrics = {
+        'previous_close': latest(bars.close),
+        'price_52_week_low': np.where(has_year, np.fmin.reduce(low, axis=0, initial=np.inf), np.nan),
+        'price_52_week_high': np.where(has_year, np.fmax.reduce(high, axis=0, initial=-np.inf), np.nan),
+    }
+    for field, sessions in MOVING_AVERAGE_SESSIONS.items():
+        metrics[field] = mean_of_last(bars.close, sessions)
+    for field, sessions in AVERAGE_VOLUME_SESSIONS.items():
+        metrics[field] = mean_of_last(bars.volume, sessions)
+    # Split- and dividend-adjusted, like Yahoo's 52WeekChange
+    change = lookback_returns(PriceMatrix(bars.dates, bars.tickers, bars.adj_close), {'percent_52_week_change': YEAR_DAYS}, as_of)
+    metrics['percent_52_week_change'] = np.array(
+        [np.nan if value is None else value for value in change['percent_52_week_change'].values()], dtype='float64'
+    )
+    return metrics
+
+
+def to_value(value: float, integer: bool):
+    if np.isnan(value):
+        return None
+    return int(value) if integer else round(float(value), 5)
+
+
+def stored(field: str):
+    return Cast(field, FloatField())
+
+
+def price_over(field: str, ratio_field: str, close):
+    """close / `field` where it is positive; empty where it is not, as Yahoo leaves it; the fetched ratio where it is missing."""
+    return Case(
+        When(**{f'{field}__gt': 0}, then=close / stored(field)),
+        When(**{f'{field}__lte': 0}, then=Value(None)),
+        default=stored(ratio_field),
+        output_field=FloatField(),
+    )
+
+
+def price_ratios() -> Dict[str, object]:
+    """Database expressions for PRICE_RATIO_FIELDS over the stored previous close, for one UPDATE.
+
+    Every expression reads the values from before the update, which is what lets the enterprise
+    value move by exactly the change in market cap (debt and cash do not follow the price).
+    """
+    close = stored('previous_close')
+    market_cap = stored('shares_outstanding') * close
+    return {
+        'market_cap': Case(
+            When(shares_outstanding__gt=0, then=Cast(market_cap, BigIntegerField())), default=F('market_cap'),
+        ),
+        'enterprise_value': Case(
+            When(shares_outstanding__gt=0, enterprise_value__isnull=False, market_cap__isnull=False,
+                 then=Cast(stored('enterprise_value') + market_cap - stored('market_cap'), BigIntegerField())),
+            default=F('enterprise_value'),
+        ),
+        'trailing_pe': price_over('trailing_eps', 'trailing_pe', close),
+        'forward_pe': price_over('forward_eps', 'forward_pe', close),
+        'price_to_book': price_over('book_value', 'price_to_book', close),
+        'dividend_yield': Case(
+            When(dividend_rate__isnull=False, previous_close__gt=0, then=stored('dividend_rate') / close),
+            default=stored('dividend_yield'),
+            output_field=FloatField(),
+        ),
+    }
+
+
+def refresh_price_fundamentals(tickers: Optional[Iterable[str]] = None, as_of: Optional[date] = None) -> int:
+    """Recompute PRICE_FIELDS of the stored fundamentals of `tickers` (default: all) from their bars.
+
+    Writes only tickers that have fundamentals and bars in the last year, stamps them with the date
+    of their latest bar in `price_metrics_date`, then recomputes PRICE_RATIO_FIELDS and the derived
+    fields that read these prices. Returns the number of rows written.
+    """
+    as_of = as_of or date.today()
+    queryset = FundamentalData.objects.all()
+    if tickers is not None:
+        queryset = queryset.filter(active_stocks_alpha_vantage__yahoo_ticker__in=list(tickers))
+    ticker_ids = dict(queryset.values_list('active_stocks_alpha_vantage__yahoo_ticker', 'active_stocks_alpha_vantage_id'))
+    integer_fields = {field for field in PRICE_FIELDS if isinstance(FundamentalData._meta.get_field(field), models.IntegerField)}
+    # 200 sessions take about 290 calendar days, the 52 week range a full year
+    start_date = as_of - timedelta(days=YEAR_DAYS + 7)
+
+    ordered = sorted(ticker_ids)
+    written = 0
+    for chunk_start in range(0, len(ordered), CHUNK_SIZE):
+        bars = load_bars(ordered[chunk_start:chunk_start + CHUNK_SIZE], start_date, as_of)
+        metrics = price_metrics(bars, as_of)
+        records = [
+            FundamentalData(
+                active_stocks_alpha_vantage_id=ticker_ids[ticker],
+                price_metrics_date=last_date,
+                **{field: to_value(metrics[field][position], field in integer_fields) for field in PRICE_FIELDS},
+            )
+            for position, (ticker, last_date) in enumerate(zip(bars.tickers, last_bar_dates(bars)))
+            # Without a bar in the last year there is no 52 week range to speak of
+            if not np.isnan(metrics['price_52_week_high'][position])
+        ]
+        FundamentalData.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=['active_stocks_alpha_vantage'],
+            update_fields=[*PRICE_FIELDS, 'price_metrics_date', 'last_updated'],
+        )
+        written_rows = FundamentalData.objects.filter(
+            active_stocks_alpha_vantage_id__in=[record.active_stocks_alpha_vantage_id for record in records]
+        )
+        written_rows.update(**price_ratios())
+        recompute_derived(queryset=written_rows)
+        written += len(records)
+    return written
@@ -0,0 +1,174 @@
+import math
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from django.utils import timezone
+
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, RefreshState
+
+# A ticker checked this long ago is "due"; staleness keeps growing past it, up to MAX_STALENESS
+STALE_AFTER_DAYS = 30
+MAX_STALENESS = 3.0
+# Tickers whose price fields and price ratios (market cap, P/E, yield, ...) are kept up to date from
+# the stored bars (see price_metrics) only need Yahoo for the rest: earnings, book value, dividends and
+# targets, which change far less often (and earnings dates boost the score anyway)
+LOCAL_PRICES_STALE_AFTER_DAYS = 90
+LOCAL_PRICES_MAX_AGE = timedelta(days=5)
+# Checked more recently than this, a ticker is only refreshed around an earnings or ex-dividend date
+MIN_REFRESH_AGE = timedelta(days=1)
+# Earnings and ex-dividend dates this close ahead (or just passed, and not yet seen) boost the score
+EVENT_DAYS_AHEAD = 7
+EVENT_DAYS_AFTER = 3
+EVENT_BOOST = 1.0
+# Share of the score an always-failing ticker loses
+ERROR_PENALTY = 0.8
+# Weight of each decade of market cap and average volume in the importance of a ticker
+MARKET_CAP_WEIGHT = 0.15
+VOLUME_WEIGHT = 0.1
+# Share of the error rate the latest attempt replaces
+ERROR_RATE_DECAY = 0.3
+
+
+class RefreshCandidate(NamedTuple):
+    ticker: str
+    stock_id: int
+    market_cap: Optional[float] = None
+    average_volume: Optional[float] = None
+    last_checked: Optional[datetime] = None
+    error_rate: float = 0.0
+    earnings_date: Optional[date] = None
+    ex_dividend_date: Optional[date] = None
+    price_metrics_date: Optional[date] = None
+
+
+class RefreshDecision(NamedTuple):
+    candidate: RefreshCandidate
+    score: float
+    importance: float
+    staleness: float
+    event: Optional[str]  # e.g. 'earnings 2024-07-25', None without a nearby event
+    error_factor: float
+    local_prices: bool = False
+    selected: bool = False
+
+    def explain(self) -> str:
+        age = 'never checked' if self.candidate.last_checked is None else f'checked {self.candidate.last_checked:%Y-%m-%d}'
+        event = f', {self.event}' if self.event else ''
+        event += ', prices from local bars' if self.local_prices else ''
+        verdict = 'refresh' if self.selected else 'skip'
+        return (f'{self.candidate.ticker}: {verdict}, score {self.score:.2f} = importance {self.importance:.2f}'
+                f' x (staleness {self.staleness:.2f}{" + event" if self.event else ""})'
+                f' x errors {self.error_factor:.2f} ({age}{event})')
+
+
+class RefreshPlan(NamedTuple):
+    decisions: List[RefreshDecision]  # every candidate, highest score first
+    budget: int
+
+    @property
+    def selected(self) -> List[RefreshDecision]:
+        return [decision for decision in self.decisions if decision.selected]
+
+    @property
+    def tickers(self) -> List[str]:
+        return [decision.candidate.ticker for decision in self.selected]
+
+
+class RefreshScheduler:
+    """Ranks tickers by how much refreshing their fundamentals is worth and spends a request budget on the best.
+
+    score = importance x (staleness + event boost) x error factor, where importance grows with the
+    log of market cap and average volume, staleness is the age of the last check in units of
+    STALE_AFTER_DAYS (LOCAL_PRICES_STALE_AFTER_DAYS while the price fields come from recent local
+    bars), events are nearby earnings and ex-dividend dates, and tickers that keep failing lose up
+    to ERROR_PENALTY of their score.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = timezone.now):
+        self.clock = clock
+
+    def importance(self, candidate: RefreshCandidate) -> float:
+        return (1.0 + MARKET_CAP_WEIGHT * math.log10(1 + max(candidate.market_cap or 0, 0))
+                + VOLUME_WEIGHT * math.log10(1 + max(candidate.average_volume or 0, 0)))
+
+    def local_prices(self, candidate: RefreshCandidate, now: datetime) -> bool:
+        return candidate.price_metrics_date is not None and now.date() - candidate.price_metrics_date <= LOCAL_PRICES_MAX_AGE
+
+    def staleness(self, candidate: RefreshCandidate, now: datetime) -> float:
+        if candidate.last_checked is None:
+            return MAX_STALENESS
+        age = now - candidate.last_checked
+        if age < MIN_REFRESH_AGE:
+            return 0.0
+        stale_after = LOCAL_PRICES_STALE_AFTER_DAYS if self.local_prices(candidate, now) else STALE_AFTER_DAYS
+        return min(age / timedelta(days=stale_after), MAX_STALENESS)
+
+    def event(self, candidate: RefreshCandidate, now: datetime) -> Optional[str]:
+        today = now.date()
+        for name, day in (('earnings', candidate.earnings_date), ('ex-dividend', candidate.ex_dividend_date)):
+            if day is None:
+                continue
+            upcoming = today <= day <= today + timedelta(days=EVENT_DAYS_AHEAD)
+            # After the event, until a check has seen it
+            unseen = (today - timedelta(days=EVENT_DAYS_AFTER) <= day < today
+                      and (candidate.last_checked is None or candidate.last_checked.date() <= day))
+            if upcoming or unseen:
+                return f'{name} {day:%Y-%m-%d}'
+        return None
+
+    def decide(self, candidate: RefreshCandidate, now: datetime) -> RefreshDecision:
+        importance = self.importance(candidate)
+        staleness = self.staleness(candidate, now)
+        event = self.event(candidate, now)
+        error_factor = 1.0 - ERROR_PENALTY * min(max(candidate.error_rate, 0.0), 1.0)
+        score = importance * (staleness + (EVENT_BOOST if event else 0.0)) * error_factor
+        return RefreshDecision(candidate, score, importance, staleness, event, error_factor, self.local_prices(candidate, now))
+
+    def plan(self, candidates: Iterable[RefreshCandidate], budget: int) -> RefreshPlan:
+        """Decisions for every candidate; the `budget` highest scores above zero are selected, ties go to the ticker first in order."""
+        now = self.clock()
+        decisions = sorted((self.decide(candidate, now) for candidate in candidates),
+                           key=lambda decision: (-decision.score, decision.candidate.ticker))
+        decisions = [
+            decision._replace(selected=position < budget and decision.score > 0)
+            for position, decision in enumerate(decisions)
+        ]
+        return RefreshPlan(decisions, budget)
+
+
+def load_candidates() -> List[RefreshCandidate]:
+    """Every stock available on Yahoo with what the scheduler needs, from a single query."""
+    rows = ActiveStocksAlphaVantage.objects.filter(is_yahoo_available=True).exclude(
+        assetType__in=ActiveStocksAlphaVantage.INDEX_ASSET_TYPES
+    ).values_list(
+        'yahoo_ticker', 'id', 'fundamental_data__market_cap', 'fundamental_data__average_volume',
+        'fundamental_data__last_checked', 'refresh_state__error_rate',
+        'fundamental_data__earnings_date', 'fundamental_data__ex_dividend_date', 'fundamental_data__price_metrics_date',
+    )
+    return [
+        RefreshCandidate(ticker, stock_id, market_cap, average_volume, last_checked, error_rate or 0.0, *dates)
+        for ticker, stock_id, market_cap, average_volume, last_checked, error_rate, *dates in rows
+    ]
+
+
+def record_attempts(outcomes: Dict[int, bool], now: Optional[datetime] = None):
+    """Fold the outcome (True for success) of this run's attempt at each stock id into its error rate."""
+    if not outcomes:
+        return
+    now = now or timezone.now()
+    states = {state.active_stocks_alpha_vantage_id: state for state in RefreshState.objects.filter(active_stocks_alpha_vantage_id__in=outcomes)}
+    updated = []
+    for stock_id, succeeded in outcomes.items():
+        state = states.get(stock_id) or RefreshState(active_stocks_alpha_vantage_id=stock_id)
+        state.error_rate = (1 - ERROR_RATE_DECAY) * state.error_rate + ERROR_RATE_DECAY * (0.0 if succeeded else 1.0)
+        state.attempts += 1
+        state.last_attempt = now
+        if not succeeded:
+            state.last_error = now
+        updated.append(state)
+    RefreshState.objects.bulk_create(
+        updated,
+        update_conflicts=True,
+        unique_fields=['active_stocks_alpha_vantage'],
+        update_fields=['error_rate', 'attempts', 'last_attempt', 'last_error'],
+    )
@@ -0,0 +1,158 @@
+import math
+from collections import deque
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, RollingStat, RollingWindow
+from stock_tickers_handler.performance import load_adjusted_closes
+
+DEFAULT_BENCHMARK = 'SPY'
+DEFAULT_WINDOW = 60
+MAX_WINDOW = 1000
+
+# Used when a window has never been advanced: its series starts at the first stored common bar
+EARLIEST_DATE = date(1900, 1, 1)
+
+
+class RollingSums:
+    """Running sums over the last `window` (x, y) pairs; adding a pair costs O(1) however long the window is.
+
+    Subtracting the pairs that leave the window accumulates rounding error, so the sums are recomputed
+    exactly from the pairs when they are loaded and after every `window` pushes, which keeps the
+    amortized cost of a push O(1).
+    """
+
+    def __init__(self, window: int, pairs: Iterable[Tuple[float, float]] = ()):
+        self.window = window
+        self.pairs = deque(tuple(pair) for pair in pairs)
+        self.pushes = 0
+        self.resum()
+
+    def resum(self):
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_yy = self.sum_xy = 0.0
+        for x, y in self.pairs:
+            self._add(x, y, 1)
+
+    def _add(self, x: float, y: float, sign: int):
+        self.sum_x += sign * x
+        self.sum_y += sign * y
+        self.sum_xx += sign * x * x
+        self.sum_yy += sign * y * y
+        self.sum_xy += sign * x * y
+
+    def push(self, x: float, y: float):
+        self.pairs.append((x, y))
+        self._add(x, y, 1)
+        if len(self.pairs) > self.window:
+            self._add(*self.pairs.popleft(), -1)
+        self.pushes += 1
+        if self.pushes % self.window == 0:
+            self.resum()
+
+    @property
+    def full(self) -> bool:
+        return len(self.pairs) == self.window
+
+    def stats(self) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """Correlation, sample covariance and beta (of x on y) of the pairs in the window."""
+        n = len(self.pairs)
+        if n < 2:
+            return None, None, None
+        covariance = (self.sum_xy - self.sum_x * self.sum_y / n) / (n - 1)
+        var_x = (self.sum_xx - self.sum_x ** 2 / n) / (n - 1)
+        var_y = (self.sum_yy - self.sum_y ** 2 / n) / (n - 1)
+        correlation = covariance / math.sqrt(var_x * var_y) if var_x > 0 and var_y > 0 else None
+        beta = covariance / var_y if var_y > 0 else None
+        return correlation, covariance, beta
+
+
+def advance_window(state: RollingWindow, dates: np.ndarray, closes: np.ndarray, benchmark_closes: np.ndarray) -> List[RollingStat]:
+    """Feed the bars after `state.last_date` into the window and return one stat per full window.
+
+    Only dates where both the ticker and the benchmark have a bar are used; state is updated in place.
+    """
+    sums = RollingSums(state.window, state.returns)
+    last_date = np.datetime64(state.last_date or EARLIEST_DATE, 'D')
+    common = (dates > last_date) & ~np.isnan(closes) & ~np.isnan(benchmark_closes)
+
+    stats = []
+    last_close, last_benchmark_close = state.last_close, state.last_benchmark_close
+    for day, close, benchmark_close in zip(dates[common], closes[common], benchmark_closes[common]):
+        close, benchmark_close = float(close), float(benchmark_close)
+        if last_close is not None:
+            sums.push(close / last_close - 1, benchmark_close / last_benchmark_close - 1)
+            if sums.full:
+                correlation, covariance, beta = sums.stats()
+                stats.append(RollingStat(rolling_window=state, date=day.item(), correlation=correlation,
+                                         covariance=covariance, beta=beta))
+        last_close, last_benchmark_close = close, benchmark_close
+        state.last_date = day.item()
+
+    state.last_close, state.last_benchmark_close = last_close, last_benchmark_close
+    state.returns = [list(pair) for pair in sums.pairs]
+    return stats
+
+
+def advance_windows(tickers: Optional[Iterable[str]] = None, as_of: Optional[date] = None) -> int:
+    """Advance every tracked window (or those involving `tickers`) by the bars stored since it last ran.
+
+    Prices for all windows come from one query starting at the oldest window's last date.
+    Returns the number of stats written.
+    """
+    windows = RollingWindow.objects.select_related('active_stocks_alpha_vantage', 'benchmark')
+    if tickers is not None:
+        tickers = list(tickers)
+        windows = windows.filter(
+            Q(active_stocks_alpha_vantage__yahoo_ticker__in=tickers) | Q(benchmark__yahoo_ticker__in=tickers)
+        )
+    windows = list(windows)
+    if not windows:
+        return 0
+
+    start_date = min(window.last_date or EARLIEST_DATE for window in windows)
+    symbols = {window.active_stocks_alpha_vantage.yahoo_ticker for window in windows}
+    symbols |= {window.benchmark.yahoo_ticker for window in windows}
+    matrix = load_adjusted_closes(sorted(symbols), start_date, as_of)
+    column = {ticker: position for position, ticker in enumerate(matrix.tickers)}
+
+    stats = []
+    for window in windows:
+        stats.extend(advance_window(
+            window, matrix.dates,
+            matrix.closes[:, column[window.active_stocks_alpha_vantage.yahoo_ticker]],
+            matrix.closes[:, column[window.benchmark.yahoo_ticker]],
+        ))
+    with transaction.atomic():
+        RollingStat.objects.bulk_create(stats, batch_size=5000, ignore_conflicts=True)
+        RollingWindow.objects.bulk_update(
+            windows, ['last_date', 'last_close', 'last_benchmark_close', 'returns'], batch_size=500
+        )
+    return len(stats)
+
+
+def find_window(ticker: str, benchmark: str = DEFAULT_BENCHMARK, window: int = DEFAULT_WINDOW) -> Optional[RollingWindow]:
+    """The tracked window of `ticker` against `benchmark`, None when it is not tracked."""
+    return RollingWindow.objects.filter(
+        active_stocks_alpha_vantage__yahoo_ticker=ticker, benchmark__yahoo_ticker=benchmark, window=window
+    ).first()
+
+
+def track_window(ticker: str, benchmark: str = DEFAULT_BENCHMARK, window: int = DEFAULT_WINDOW) -> RollingWindow:
+    """Get or start tracking a rolling window; a new one is backfilled from the stored history."""
+    if not 2 <= window <= MAX_WINDOW:
+        raise ValueError(f'window must be between 2 and {MAX_WINDOW} sessions')
+    stocks = {stock.yahoo_ticker: stock for stock in ActiveStocksAlphaVantage.objects.filter(yahoo_ticker__in=[ticker, benchmark])}
+    missing = {ticker, benchmark} - set(stocks)
+    if missing:
+        raise ActiveStocksAlphaVantage.DoesNotExist(f"Unknown tickers: {', '.join(sorted(missing))}")
+    state, created = RollingWindow.objects.get_or_create(
+        active_stocks_alpha_vantage=stocks[ticker], benchmark=stocks[benchmark], window=window
+    )
+    if created:
+        advance_windows([ticker])
+        state.refresh_from_db()
+    return state
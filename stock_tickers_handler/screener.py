@@ -0,0 +1,172 @@
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+from django.db import models
+from django.db.models import Count, F, FloatField, Max
+from django.db.models.functions import Cast
+
+from stock_tickers_handler.cache import VersionedCache
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+
+# Every numeric FundamentalData column can be screened and sorted on
+NUMERIC_FIELDS = tuple(
+    field.name for field in FundamentalData._meta.concrete_fields
+    if isinstance(field, (models.DecimalField, models.IntegerField)) and not field.primary_key
+)
+CATEGORY_FIELDS = ('sector', 'industry', 'exchange', 'quote_type')
+
+OPERATORS = {
+    'gt': np.greater,
+    'gte': np.greater_equal,
+    'lt': np.less,
+    'lte': np.less_equal,
+}
+
+SCREEN_LIMIT = 50
+MAX_SCREEN_LIMIT = 500
+
+# fetch_info invalidates the snapshot of its own process; web processes pick its writes up within this interval
+VERSION_CHECK_INTERVAL = 30
+
+
+class Criterion(NamedTuple):
+    field: str
+    op: str  # one of OPERATORS, or 'in' for category fields
+    value: object
+
+
+class Screen(NamedTuple):
+    criteria: List[Criterion]
+    order_by: Optional[str] = None
+    descending: bool = False
+    limit: int = SCREEN_LIMIT
+
+
+class ScreenResult(NamedTuple):
+    total: int
+    rows: List[dict]
+
+
+class ScreenerSnapshot:
+    """Column-oriented copy of FundamentalData: one float64 array per metric (NaN where missing)
+    and one integer code array per category, all aligned on the ticker-sorted rows."""
+
+    def __init__(self, tickers: Sequence[str], names: Sequence[str], numeric: Mapping[str, np.ndarray],
+                 categories: Mapping[str, Sequence[Optional[str]]]):
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.numeric = {field: np.asarray(values, dtype='float64') for field, values in numeric.items()}
+        self.labels: Dict[str, np.ndarray] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        for field, values in categories.items():
+            present = [value or '' for value in values]
+            self.labels[field], codes = np.unique(np.asarray(present, dtype=object), return_inverse=True)
+            self.codes[field] = codes.astype('int32')
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def category_mask(self, field: str, values: Sequence[str]) -> np.ndarray:
+        wanted = [code for code, label in enumerate(self.labels[field]) if label in values]
+        return np.isin(self.codes[field], wanted)
+
+    def category(self, field: str, position: int) -> Optional[str]:
+        return self.labels[field][self.codes[field][position]] or None
+
+    def screen(self, screen: Screen) -> ScreenResult:
+        """Rows passing every criterion, sorted on `order_by` if given (rows missing it are left out).
+
+        Only the top `limit` rows are ever sorted: np.argpartition selects them in linear time first.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for criterion in screen.criteria:
+            if criterion.op == 'in':
+                mask &= self.category_mask(criterion.field, criterion.value)
+            else:
+                # Comparisons with NaN are False, so missing values never pass a numeric criterion
+                mask &= OPERATORS[criterion.op](self.numeric[criterion.field], criterion.value)
+        if screen.order_by is not None:
+            # Rows without a sort key are neither listed nor counted in the total
+            mask &= ~np.isnan(self.numeric[screen.order_by])
+        positions = np.flatnonzero(mask)
+        total = len(positions)
+
+        if screen.order_by is not None:
+            keys = self.numeric[screen.order_by][positions]
+            if screen.descending:
+                keys = -keys
+            if len(keys) > screen.limit:
+                top = np.argpartition(keys, screen.limit - 1)[:screen.limit]
+                positions, keys = positions[top], keys[top]
+            # Positions follow ticker order, which breaks ties
+            order = np.lexsort((positions, keys))
+            positions = positions[order]
+        else:
+            positions = positions[:screen.limit]
+
+        fields = list(dict.fromkeys(
+            [criterion.field for criterion in screen.criteria] + ([screen.order_by] if screen.order_by else [])
+        ))
+        rows = []
+        for position in positions:
+            row = {'ticker': self.tickers[position], 'long_name': self.names[position], 'sector': self.category('sector', position)}
+            for field in fields:
+                if field in self.codes:
+                    row[field] = self.category(field, position)
+                else:
+                    value = self.numeric[field][position]
+                    row[field] = None if np.isnan(value) else float(value)
+            rows.append(row)
+        return ScreenResult(total, rows)
+
+
+def parse_screen(params: Mapping[str, str]) -> Screen:
+    """Screen from query parameters such as `trailing_pe__lt=15&sector=Technology,Energy&order=-market_cap&limit=20`.
+
+    Raises ValueError for unknown fields or operators and for values that are not numbers.
+    """
+    criteria = []
+    order_by, descending, limit = None, False, SCREEN_LIMIT
+    for key, value in params.items():
+        if key == 'order':
+            order_by, descending = value.lstrip('-'), value.startswith('-')
+            if order_by not in NUMERIC_FIELDS:
+                raise ValueError(f'Cannot order by {order_by}')
+        elif key == 'limit':
+            limit = min(max(1, int(value)), MAX_SCREEN_LIMIT)
+        elif key in CATEGORY_FIELDS:
+            criteria.append(Criterion(key, 'in', [label.strip() for label in value.split(',')]))
+        else:
+            field, _, op = key.rpartition('__')
+            if field not in NUMERIC_FIELDS or op not in OPERATORS:
+                raise ValueError(f'Unknown filter {key}')
+            criteria.append(Criterion(field, op, float(value)))
+    return Screen(criteria, order_by, descending, limit)
+
+
+def load_snapshot() -> ScreenerSnapshot:
+    """Snapshot of every FundamentalData row from a single query; numbers are cast to floats by the database."""
+    rows = list(
+        FundamentalData.objects.exclude(active_stocks_alpha_vantage__assetType__in=ActiveStocksAlphaVantage.INDEX_ASSET_TYPES)
+        .order_by('active_stocks_alpha_vantage__yahoo_ticker').values_list(
+            F('active_stocks_alpha_vantage__yahoo_ticker'), 'long_name', *CATEGORY_FIELDS,
+            *(Cast(field, FloatField()) for field in NUMERIC_FIELDS),
+        )
+    )
+    columns = list(zip(*rows)) if rows else [()] * (2 + len(CATEGORY_FIELDS) + len(NUMERIC_FIELDS))
+    categories = dict(zip(CATEGORY_FIELDS, columns[2:2 + len(CATEGORY_FIELDS)]))
+    # None becomes NaN in a float64 array
+    numeric = {field: np.array(column, dtype='float64') for field, column in zip(NUMERIC_FIELDS, columns[2 + len(CATEGORY_FIELDS):])}
+    return ScreenerSnapshot(columns[0], columns[1], numeric, categories)
+
+
+def snapshot_version() -> tuple:
+    """Changes whenever fundamentals are added, removed or rewritten."""
+    return tuple(FundamentalData.objects.aggregate(count=Count('id'), updated=Max('last_updated')).values())
+
+
+screener_snapshot = VersionedCache(load_snapshot, snapshot_version, VERSION_CHECK_INTERVAL)
+
+
+def run_screen(screen: Screen) -> ScreenResult:
+    return screener_snapshot.get().screen(screen)
@@ -0,0 +1,213 @@
+import re
+from bisect import bisect_right
+from collections import Counter
+from itertools import islice
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Case, CharField, Count, F, FloatField, Func, IntegerField, Lookup, Max, Q, Value, When
+from django.db.models.functions import Cast
+
+from stock_tickers_handler.cache import VersionedCache
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+
+SEARCH_LIMIT = 50
+
+# pg_trgm's default threshold for the <% (word similarity) operator
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+# Rank tiers: exact ticker, ticker prefix, fuzzy name match
+EXACT, PREFIX, FUZZY = 0, 1, 2
+
+# Word similarity is kept to three decimals so rank keys are exact integers
+SCORE_SCALE = 1000
+
+PAGE_SIZE = 25
+
+# Seconds between checks whether the fundamentals changed under the in-process index
+VERSION_CHECK_INTERVAL = 60
+
+# The columns the search results listing shows; long_business_summary and the ~90 other columns stay in the database
+LISTING_FIELDS = (
+    'id', 'ticker', 'long_name', 'market_cap', 'previous_close', 'trailing_pe', 'dividend_yield',
+    'profit_margins', 'return_on_equity', 'debt_to_equity', 'price_52_week_high', 'price_52_week_low',
+)
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+@CharField.register_lookup
+class TrigramWordMatch(Lookup):
+    """`value <%% field` from pg_trgm, which a GIN gin_trgm_ops index on the field can answer (PostgreSQL only)."""
+    lookup_name = 'trigram_word_match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{rhs} <%% {lhs}', (*rhs_params, *lhs_params)
+
+
+class TrigramWordSimilarity(Func):
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+class SearchPage(NamedTuple):
+    results: List[dict]
+    next_cursor: Optional[str]
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Trigrams of `text` the way pg_trgm builds them: lowercased words padded with two spaces in front and one behind."""
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class RankKey(NamedTuple):
+    """Sort key of a search result; unique per result since tickers are, so it doubles as a page cursor."""
+    tier: int
+    score: int  # negated, scaled word similarity for fuzzy matches, 0 otherwise
+    ticker: str
+
+    def encode(self) -> str:
+        return f'{self.tier}:{self.score}:{self.ticker}'
+
+    @classmethod
+    def decode(cls, cursor: str) -> Optional['RankKey']:
+        try:
+            tier, score, ticker = cursor.split(':', 2)
+            return cls(int(tier), int(score), ticker)
+        except ValueError:
+            return None
+
+
+class SearchIndex:
+    """In-process equivalent of the PostgreSQL trigram search, used on other databases (SQLite in tests)."""
+
+    def __init__(self, entries: Iterable[Tuple[int, str, str]]):
+        self.by_ticker: Dict[str, int] = {}
+        self.postings: Dict[str, List[int]] = {}
+        self.tickers: Dict[int, str] = {}
+        for entry_id, ticker, name in entries:
+            ticker = ticker.upper()
+            self.by_ticker[ticker] = entry_id
+            self.tickers[entry_id] = ticker
+            for gram in trigrams(name or ''):
+                self.postings.setdefault(gram, []).append(entry_id)
+        self.sorted_tickers = sorted(self.by_ticker)
+
+    def ranked(self, query: str, after: Optional[RankKey] = None) -> Iterator[Tuple[RankKey, int]]:
+        """(key, id) of matching entries in rank order, starting after the `after` key.
+
+        Exact ticker first, then ticker prefixes, then names by trigram word similarity.
+        """
+        ticker = query.strip().upper()
+        if not ticker:
+            return
+        after = after or RankKey(-1, 0, '')
+        if ticker in self.by_ticker and RankKey(EXACT, 0, ticker) > after:
+            yield RankKey(EXACT, 0, ticker), self.by_ticker[ticker]
+
+        # Ticker prefixes are contiguous in sorted_tickers, starting right after the exact ticker
+        position = bisect_right(self.sorted_tickers, max(ticker, after.ticker) if after.tier == PREFIX else ticker)
+        while position < len(self.sorted_tickers) and after.tier <= PREFIX:
+            candidate = self.sorted_tickers[position]
+            if not candidate.startswith(ticker):
+                break
+            yield RankKey(PREFIX, 0, candidate), self.by_ticker[candidate]
+            position += 1
+
+        # Share of the query's trigrams found in the name, close to pg_trgm's word_similarity
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for entry_id, common in shared.items():
+            candidate = self.tickers[entry_id]
+            score = common / len(query_grams)
+            if score >= WORD_SIMILARITY_THRESHOLD and not candidate.startswith(ticker):
+                scored.append((RankKey(FUZZY, -round(score * SCORE_SCALE), candidate), entry_id))
+        scored.sort()
+        yield from scored[bisect_right(scored, (after, float('inf'))):]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT, after: Optional[RankKey] = None) -> List[int]:
+        """Ids of the first `limit` matching entries in rank order."""
+        return [entry_id for _, entry_id in islice(self.ranked(query, after), limit)]
+
+
+def stock_fundamentals():
+    """Fundamentals of listed stocks, without the index and commodity symbols."""
+    return FundamentalData.objects.exclude(active_stocks_alpha_vantage__assetType__in=ActiveStocksAlphaVantage.INDEX_ASSET_TYPES)
+
+
+def load_search_index() -> SearchIndex:
+    return SearchIndex(stock_fundamentals().values_list('id', 'active_stocks_alpha_vantage__yahoo_ticker', 'long_name').iterator())
+
+
+def index_version() -> tuple:
+    """Changes whenever fundamentals are added, removed or updated."""
+    return tuple(FundamentalData.objects.aggregate(count=Count('id'), updated=Max('last_updated')).values())
+
+
+# The in-process index used where trigram indexes are unavailable (SQLite)
+search_index = VersionedCache(load_search_index, index_version, VERSION_CHECK_INTERVAL)
+
+
+def postgres_results(query: str, after: Optional[RankKey], limit: int) -> List[dict]:
+    """One ranked, projected page from a query the trigram GIN indexes on ticker and long name can serve."""
+    ticker = query.strip().upper()
+    results = stock_fundamentals().annotate(
+        ticker=F('active_stocks_alpha_vantage__yahoo_ticker'),
+    ).filter(
+        Q(ticker__startswith=ticker) | Q(long_name__trigram_word_match=query)
+    ).annotate(
+        tier=Case(
+            When(ticker=ticker, then=Value(EXACT)),
+            When(ticker__startswith=ticker, then=Value(PREFIX)),
+            default=Value(FUZZY),
+            output_field=IntegerField(),
+        ),
+        # Scaled and cast (which rounds) to an integer so the page cursor compares exactly
+        score=Case(
+            When(ticker__startswith=ticker, then=Value(0)),
+            default=Cast(TrigramWordSimilarity(Value(query), 'long_name') * -SCORE_SCALE, IntegerField()),
+            output_field=IntegerField(),
+        ),
+    )
+    if after is not None:
+        results = results.filter(
+            Q(tier__gt=after.tier)
+            | Q(tier=after.tier, score__gt=after.score)
+            | Q(tier=after.tier, score=after.score, ticker__gt=after.ticker)
+        )
+    return list(results.order_by('tier', 'score', 'ticker').values(*LISTING_FIELDS, 'tier', 'score')[:limit])
+
+
+def search_page(query: str, cursor: Optional[str] = None, page_size: int = PAGE_SIZE) -> SearchPage:
+    """One page of ranked search results, holding only the columns the results listing shows.
+
+    Pages are keyset-paginated: `cursor` is the `next_cursor` of the previous page. One row more
+    than the page is fetched to tell whether another page follows, so no COUNT(*) is ever run.
+    """
+    after = RankKey.decode(cursor) if cursor else None
+    if not query.strip():
+        return SearchPage([], None)
+    if connection.vendor == 'postgresql':
+        rows = postgres_results(query, after, page_size + 1)
+        keys = [RankKey(row.pop('tier'), row.pop('score'), row['ticker']) for row in rows]
+    else:
+        ranked = list(islice(search_index.get().ranked(query, after), page_size + 1))
+        found = {
+            row['id']: row
+            for row in FundamentalData.objects.filter(id__in=[entry_id for _, entry_id in ranked])
+            .annotate(ticker=F('active_stocks_alpha_vantage__yahoo_ticker')).values(*LISTING_FIELDS)
+        }
+        keys = [key for key, entry_id in ranked if entry_id in found]
+        rows = [found[entry_id] for _, entry_id in ranked if entry_id in found]
+    if len(rows) > page_size:
+        return SearchPage(rows[:page_size], keys[page_size - 1].encode())
+    return SearchPage(rows, None)
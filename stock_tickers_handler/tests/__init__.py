@@ -0,0 +1,5 @@
+import os
+from unittest import skipUnless
+
+# Wall-clock limits depend on the machine running the suite, so timing benchmarks only run on request
+benchmark = skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1 to run the timing benchmarks')
@@ -0,0 +1,130 @@
+import random
+import string
+import time
+import tracemalloc
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from stock_tickers_handler.autocomplete import AutocompleteIndex, AutocompleteService, autocomplete
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+from stock_tickers_handler.tests import benchmark
+
+
+def add_stock(ticker, name, long_name=None):
+    stock = ActiveStocksAlphaVantage.objects.create(
+        ticker=ticker, name=name, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+    )
+    if long_name:
+        FundamentalData.objects.create(active_stocks_alpha_vantage=stock, long_name=long_name)
+    return stock
+
+
+def synthetic_entries(count, seed=0):
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(3000)]
+    suffixes = ['Inc.', 'Corp.', 'Holdings Inc.', 'Trust', 'ETF']
+    entries = []
+    for position in range(count):
+        ticker = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 4))) + str(position)
+        name = ' '.join(rng.choices(words, k=2)) + ' ' + rng.choice(suffixes)
+        entries.append((ticker, name, name + ' Class A'))
+    return entries
+
+
+class AutocompleteIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = AutocompleteIndex([
+            ('AAPL', 'Apple Inc', 'Apple Inc.'),
+            ('AAP', 'Advance Auto Parts Inc', None),
+            ('APLE', 'Apple Hospitality REIT Inc', 'Apple Hospitality REIT, Inc.'),
+            ('MSFT', 'Microsoft Corporation', 'Microsoft Corporation'),
+        ])
+
+    def test_ticker_prefixes_before_name_words(self):
+        self.assertEqual([result['ticker'] for result in self.index.complete('ap')], ['APLE', 'AAPL'])
+        self.assertEqual([result['ticker'] for result in self.index.complete('AAP')], ['AAP', 'AAPL'])
+        self.assertEqual([result['ticker'] for result in self.index.complete('hosp')], ['APLE'])
+
+    def test_long_name_is_shown_when_known(self):
+        self.assertEqual(self.index.complete('msft'), [{'ticker': 'MSFT', 'name': 'Microsoft Corporation'}])
+        self.assertEqual(self.index.complete('advance'), [{'ticker': 'AAP', 'name': 'Advance Auto Parts Inc'}])
+
+    def test_limit_and_empty_query(self):
+        self.assertEqual(len(self.index.complete('a', limit=2)), 2)
+        self.assertEqual(self.index.complete(' '), [])
+        self.assertEqual(self.index.complete('zzz'), [])
+
+    def test_memory_per_10k_symbols(self):
+        entries = synthetic_entries(10000)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            index = AutocompleteIndex(entries)
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(index), 10000)
+        self.assertLess(used, 6 * 1024 * 1024)
+
+    @benchmark
+    def test_lookups_take_microseconds(self):
+        index = AutocompleteIndex(synthetic_entries(10000))
+        rng = random.Random(1)
+        queries = [rng.choice(string.ascii_uppercase) + rng.choice(string.ascii_lowercase) for _ in range(1000)]
+        started = time.perf_counter()
+        for query in queries:
+            index.complete(query)
+        self.assertLess((time.perf_counter() - started) / len(queries), 0.0005)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class AutocompleteServiceTest(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.service = AutocompleteService(check_interval=60, clock=self.clock)
+        add_stock('AAPL', 'Apple Inc', 'Apple Inc.')
+
+    def test_lookups_between_checks_skip_the_database(self):
+        self.service.complete('aa')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.service.complete('apple')[0]['ticker'], 'AAPL')
+
+    def test_rebuilds_after_tickers_change(self):
+        self.service.complete('aa')
+        add_stock('MSFT', 'Microsoft Corporation')
+        self.assertEqual(self.service.complete('ms'), [])
+
+        self.clock.now = 61
+        self.assertEqual(self.service.complete('ms'), [{'ticker': 'MSFT', 'name': 'Microsoft Corporation'}])
+
+    def test_invalidate_forces_a_version_check(self):
+        self.service.complete('aa')
+        add_stock('MSFT', 'Microsoft Corporation')
+        self.service.invalidate()
+        self.assertEqual(len(self.service.complete('ms')), 1)
+
+    def test_unchanged_tables_keep_the_index(self):
+        index = self.service.index()
+        self.clock.now = 61
+        self.assertIs(self.service.index(), index)
+
+
+class AutocompleteViewTest(TestCase):
+
+    def setUp(self):
+        autocomplete.invalidate()
+
+    def test_json_results(self):
+        add_stock('AAPL', 'Apple Inc', 'Apple Inc.')
+        add_stock('AAP', 'Advance Auto Parts Inc')
+        response = self.client.get(reverse('autocomplete'), {'query': 'aap', 'limit': '1'})
+        self.assertEqual(response.json(), {'query': 'aap', 'results': [{'ticker': 'AAP', 'name': 'Advance Auto Parts Inc'}]})
@@ -0,0 +1,73 @@
+import threading
+import time
+from django.test import SimpleTestCase
+from stock_tickers_handler.cache import StaleWhileRevalidateCache
+from stock_tickers_handler.tests.test_downloader import FakeClock
+
+
+class StaleWhileRevalidateCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        return self.loads
+
+    def make_cache(self, loader=None):
+        return StaleWhileRevalidateCache(loader or self.loader, ttl=10, stale_ttl=100, clock=self.clock, background=False)
+
+    def test_fresh_value_is_served_from_cache(self):
+        cache = self.make_cache()
+        self.assertEqual(cache.get(), 1)
+        self.clock.sleep(9)
+        self.assertEqual(cache.get(), 1)
+        self.assertEqual(self.loads, 1)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        cache = self.make_cache()
+        cache.get()
+        self.clock.sleep(50)
+        # The stale value comes back and a refresh runs behind it
+        self.assertEqual(cache.get(), 1)
+        self.assertEqual(cache.get(), 2)
+
+    def test_expired_value_waits_for_refresh(self):
+        cache = self.make_cache()
+        cache.get()
+        self.clock.sleep(200)
+        self.assertEqual(cache.get(), 2)
+
+    def test_failed_refresh_keeps_last_good_value(self):
+        cache = self.make_cache()
+        cache.get()
+        cache.loader = lambda: 1 / 0
+        self.clock.sleep(200)
+        self.assertEqual(cache.get(), 1)
+        self.assertIsInstance(cache.last_error, ZeroDivisionError)
+
+    def test_first_load_failure_is_raised(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.make_cache(lambda: 1 / 0).get()
+
+    def test_concurrent_callers_share_one_refresh(self):
+        release = threading.Event()
+
+        def slow_loader():
+            self.loads += 1
+            release.wait(5)
+            return 'value'
+
+        cache = StaleWhileRevalidateCache(slow_loader, ttl=10, stale_ttl=100)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(results, ['value'] * 8)
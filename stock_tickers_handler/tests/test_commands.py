@@ -1,13 +1,15 @@
 from django.core.management import call_command
 from django.test import TestCase
 import io
+import os
+import tempfile
 from datetime import datetime
 import pytest
 from unittest.mock import patch, MagicMock
 from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData
 
 class CommandTestCase(TestCase):
-    @patch('requests.get')
+    @patch('stock_tickers_handler.http_client.http_client.session.get')
     def test_load_tickers(self, mock_get):
         # Prepare mock response
         mock_response = io.StringIO(
@@ -60,4 +62,31 @@ class TestLoadTickersHistoricalData(TestCase):
         ]
         call_command('load_data')
         self.assertEqual(mock_bulk_create.call_count, 1)
-        self.assertEqual(len(mock_bulk_create.call_args[0][0]), 1)
\ No newline at end of file
+        self.assertEqual(len(mock_bulk_create.call_args[0][0]), 1)
+
+class ImportHistoricalsCommandTest(TestCase):
+
+    def test_import_csv_skips_existing_and_unknown_rows(self):
+        ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple Inc.', exchange='NASDAQ', assetType='Stock',
+            status='Active', yahoo_ticker='AAPL'
+        )
+        csv_content = (
+            'ticker,date,open,high,low,close,adj_close,volume\n'
+            'AAPL,2024-01-02,99,101,98,100,99.5,1000\n'
+            'AAPL,2024-01-03,100,102,99,101,,\n'
+            'MSFT,2024-01-02,370,372,368,371,371,2000\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write(csv_content)
+
+        out = io.StringIO()
+        call_command('import_historicals', csv_file.name, stdout=out)
+        call_command('import_historicals', csv_file.name, stdout=out)
+        os.unlink(csv_file.name)
+
+        self.assertEqual(HistoricalData.objects.count(), 2)
+        second_day = HistoricalData.objects.get(date='2024-01-03')
+        self.assertEqual(second_day.adj_close, second_day.close)
+        self.assertIn('Rows skipped (already stored): 2', out.getvalue())
+        self.assertIn('Unknown tickers skipped: MSFT', out.getvalue())
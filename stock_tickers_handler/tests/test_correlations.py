@@ -0,0 +1,126 @@
+import time
+from datetime import date
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from stock_tickers_handler.correlations import MAX_TICKERS, correlate, get_correlations, masked_correlation
+from stock_tickers_handler.ingestion import rebuild_watermarks
+from stock_tickers_handler.models import TickerWatermark
+from stock_tickers_handler.performance import PriceMatrix
+from stock_tickers_handler.tests import benchmark
+from stock_tickers_handler.tests.test_performance import add_bars
+
+
+def random_prices(sessions, tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.01, (sessions, tickers)) + rng.normal(0, 0.01, (sessions, 1))
+    return 100 * np.cumprod(1 + returns, axis=0)
+
+
+class CorrelationEngineTest(SimpleTestCase):
+
+    def test_matches_pandas_with_missing_data(self):
+        closes = random_prices(300, 6)
+        closes[:100, 1] = np.nan  # Listed later
+        closes[np.random.default_rng(1).random(closes.shape) < 0.05] = np.nan  # Scattered gaps
+        matrix = PriceMatrix(np.arange(300), [f'T{i}' for i in range(6)], closes)
+
+        result = correlate(matrix)
+
+        returns = pd.DataFrame(closes).pct_change(fill_method=None).iloc[1:]
+        np.testing.assert_allclose(result.pearson, returns.corr(min_periods=20).to_numpy(), atol=1e-10)
+        self.assertEqual(result.observations[0, 1], returns[[0, 1]].dropna().shape[0])
+
+    def test_spearman_ranks_each_pair_over_its_overlap(self):
+        closes = random_prices(200, 5)
+        closes[:80, 1] = np.nan  # Listed later
+        closes[:120, 3] = np.nan
+        closes[np.random.default_rng(2).random(closes.shape) < 0.03] = np.nan
+        matrix = PriceMatrix(np.arange(200), [f'T{i}' for i in range(5)], closes)
+
+        returns = pd.DataFrame(closes).pct_change(fill_method=None).iloc[1:]
+        np.testing.assert_allclose(correlate(matrix).spearman, returns.corr(method='spearman', min_periods=20).to_numpy(), atol=1e-10)
+
+    def test_too_few_overlapping_returns_give_nan(self):
+        values = np.array([[0.01, np.nan], [0.02, 0.01], [0.03, 0.02]])
+        corr, observations = masked_correlation(values, min_periods=3)
+        self.assertTrue(np.isnan(corr[0, 1]))
+        self.assertEqual(observations[0, 1], 2)
+
+    def test_late_listings_share_overlap_groups(self):
+        matrix = PriceMatrix(np.arange(400), [f'T{i}' for i in range(40)], random_prices(400, 40))
+        matrix.closes[:150, ::7] = np.nan
+
+        result = correlate(matrix, exact_spearman=True)
+
+        returns = pd.DataFrame(matrix.closes).pct_change(fill_method=None).iloc[1:]
+        np.testing.assert_allclose(result.spearman, returns.corr(method='spearman', min_periods=20).to_numpy(), atol=1e-10)
+
+    def test_column_ranks_are_exact_for_equal_coverage(self):
+        matrix = PriceMatrix(np.arange(300), [f'T{i}' for i in range(40)], random_prices(300, 40))
+        matrix.closes[:100] = np.nan
+
+        result = correlate(matrix)
+
+        returns = pd.DataFrame(matrix.closes).pct_change(fill_method=None).iloc[1:]
+        np.testing.assert_allclose(result.spearman, returns.corr(method='spearman', min_periods=20).to_numpy(), atol=1e-10)
+
+    @benchmark
+    def test_five_hundred_tickers_with_gaps_within_a_second(self):
+        rng = np.random.default_rng(2)
+        closes = random_prices(1260, 500)
+        for column, listed in enumerate(rng.integers(0, 1000, 500)):
+            closes[:listed if column % 3 == 0 else 0, column] = np.nan  # Staggered listings
+            closes[rng.integers(0, 1260, 3), column] = np.nan  # Missing bars
+        matrix = PriceMatrix(np.arange(1260), [f'T{i}' for i in range(500)], closes)
+
+        started = time.perf_counter()
+        correlate(matrix)
+        self.assertLess(time.perf_counter() - started, 1)
+
+
+class CorrelationCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        closes = random_prices(60, 2)
+        days = pd.bdate_range('2024-03-01', periods=60).date
+        add_bars('XLK', dict(zip(days, closes[:, 0].round(2))))
+        add_bars('XLE', dict(zip(days, closes[:, 1].round(2))))
+        rebuild_watermarks()
+
+    def test_results_are_cached_until_watermark_moves(self):
+        as_of = date(2024, 6, 1)
+        first = get_correlations(['XLK', 'XLE'], 365, as_of)
+        self.assertEqual(first.tickers, ['XLE', 'XLK'])
+
+        with patch('stock_tickers_handler.correlations.correlate', wraps=correlate) as mock_correlate:
+            get_correlations(['XLE', 'XLK'], 365, as_of)
+            # Bars for tickers outside the set leave the key alone
+            add_bars('SPY', {date(2024, 5, 31): 500})
+            rebuild_watermarks()
+            get_correlations(['XLE', 'XLK'], 365, as_of)
+            mock_correlate.assert_not_called()
+
+            TickerWatermark.objects.filter(active_stocks_alpha_vantage__yahoo_ticker='XLK').update(row_count=61)
+            get_correlations(['XLE', 'XLK'], 365, as_of)
+            mock_correlate.assert_called_once()
+
+    def test_correlations_view_lists_pairs(self):
+        response = self.client.get(reverse('correlations'), {'tickers': 'xlk,XLE', 'window': '3650', 'method': 'spearman'})
+        pairs = response.context['pairs']
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual((pairs[0]['ticker_1'], pairs[0]['ticker_2']), ('XLE', 'XLK'))
+        self.assertEqual(pairs[0]['observations'], 59)
+        self.assertEqual(response.context['method'], 'spearman')
+
+    def test_correlations_view_bounds_the_request(self):
+        tickers = ','.join(f'T{i}' for i in range(MAX_TICKERS + 1))
+        self.assertEqual(self.client.get(reverse('correlations'), {'tickers': tickers}).status_code, 400)
+
+        with patch('stock_tickers_handler.views.get_correlations', wraps=get_correlations) as mock_get:
+            self.client.get(reverse('correlations'), {'tickers': 'XLK,XLE', 'window': '100000'})
+        self.assertEqual(mock_get.call_args.args[1], 3650)
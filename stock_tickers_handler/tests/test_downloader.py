@@ -0,0 +1,207 @@
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from stock_tickers_handler import memory
+from stock_tickers_handler.downloader import BatchDownloader, TokenBucket
+from stock_tickers_handler.management.commands.fetch_historicals import Command as FetchHistoricalsCommand
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FetchBatch, HistoricalData
+from stock_tickers_handler.tests.test_ingestion import make_frame
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_limits_rate_after_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            bucket.acquire()
+        # Two tokens come from the initial burst, the other four at 2 per second
+        self.assertAlmostEqual(clock.now, 2.0)
+
+    def test_zero_rate_disables_limit(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=0, clock=clock, sleep=clock.sleep)
+        for _ in range(100):
+            bucket.acquire()
+        self.assertEqual(clock.now, 0.0)
+
+
+class BatchDownloaderTest(SimpleTestCase):
+
+    def test_batches_download_concurrently(self):
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_download(ticker, start_date, end_date=None):
+            with lock:
+                in_flight.append(ticker)
+                peak.append(len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.remove(ticker)
+            return make_frame()
+
+        downloader = BatchDownloader(download=slow_download, concurrency=4, rate=0)
+        jobs = [{f'T{i}': '2024-01-01'} for i in range(8)]
+        results = list(downloader.run(jobs))
+
+        self.assertEqual(sorted(result.batch_num for result in results), list(range(1, 9)))
+        self.assertEqual(max(peak), 4)
+
+    def test_errors_are_reported_per_batch(self):
+        def failing_download(ticker, start_date, end_date=None):
+            raise ValueError(f'boom {ticker}')
+
+        results = list(BatchDownloader(download=failing_download, rate=0).run([{'A': '2024-01-01'}, {'B': '2024-01-01'}]))
+        self.assertEqual(sorted(str(result.error) for result in results), ['boom A', 'boom B'])
+
+    def test_each_ticker_is_requested_from_its_own_start_date(self):
+        requested = []
+
+        def download(ticker, start_date, end_date=None):
+            requested.append((ticker, start_date))
+            return make_frame()
+
+        [result] = BatchDownloader(download=download, rate=0).run([{'A': '2024-01-02', 'B': '2010-01-01'}])
+        self.assertEqual(result.tickers, ['A', 'B'])
+        self.assertEqual(requested, [('A', '2024-01-02'), ('B', '2010-01-01')])
+
+    @patch('stock_tickers_handler.downloader.current_rss_bytes', return_value=2 ** 40)
+    def test_memory_limit_pauses_workers_without_deadlock(self, mock_rss):
+        started = []
+
+        def download(ticker, start_date, end_date=None):
+            started.append(ticker)
+            return make_frame()
+
+        downloader = BatchDownloader(download=download, concurrency=2, rate=0, queue_size=1, memory_limit=1)
+        results = downloader.run([{f'T{i}': '2024-01-01'} for i in range(4)])
+
+        first = next(results)
+        time.sleep(0.3)
+        # Over the limit with a batch waiting in the queue, no further download starts
+        self.assertLess(len(started), 4)
+        rest = list(results)
+        self.assertEqual(sorted([first.batch_num] + [result.batch_num for result in rest]), [1, 2, 3, 4])
+
+
+class MemoryTest(SimpleTestCase):
+
+    @patch.object(memory, 'psutil', None)
+    @patch.object(memory, 'resource', None)
+    @patch('builtins.open', side_effect=OSError)
+    def test_unmeasurable_memory_is_none(self, mock_open):
+        # As on Windows without psutil installed
+        self.assertIsNone(memory.current_rss_bytes())
+        self.assertEqual(memory.format_mb(memory.peak_rss_bytes()), 'unknown')
+
+    @patch('stock_tickers_handler.management.commands.fetch_historicals.current_rss_bytes', return_value=None)
+    def test_memory_limit_is_ignored_when_unmeasurable(self, mock_rss):
+        command = FetchHistoricalsCommand(stdout=io.StringIO())
+        command.configure({'max_memory_mb': 100})
+        self.assertIsNone(command.downloader.memory_limit)
+        self.assertIn('ignoring --max-memory-mb', command.stdout.getvalue())
+
+
+class InlineExecutor:
+    """Runs submitted shards in this process, where the test database is visible."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class FetchHistoricalsConcurrencyTest(TestCase):
+
+    @patch('yfinance.Ticker')
+    def test_fetch_historicals_with_stubbed_source(self, mock_ticker):
+        for ticker in ['AAPL', 'MSFT', 'NOPE']:
+            ActiveStocksAlphaVantage.objects.create(
+                ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+            )
+        empty = make_frame().iloc[0:0]
+        mock_ticker.side_effect = lambda ticker: MagicMock(
+            history=MagicMock(return_value=empty if ticker == 'NOPE' else make_frame(periods=4))
+        )
+
+        out = io.StringIO()
+        call_command('fetch_historicals', '--concurrency=2', '--batch-size=1', '--rate=0', '--loader=bulk', stdout=out)
+
+        self.assertEqual(HistoricalData.objects.count(), 8)
+        self.assertIn('No data found for ticker NOPE', out.getvalue())
+        self.assertIn('Rows inserted: 8', out.getvalue())
+        self.assertIn('Peak memory:', out.getvalue())
+
+    @patch('stock_tickers_handler.management.commands.fetch_historicals.ProcessPoolExecutor', InlineExecutor)
+    @patch('yfinance.Ticker')
+    def test_workers_split_tickers_across_shards(self, mock_ticker):
+        tickers = [f'T{i}' for i in range(12)]
+        for ticker in tickers:
+            ActiveStocksAlphaVantage.objects.create(
+                ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+            )
+        mock_ticker.return_value.history.return_value = make_frame(periods=4)
+
+        out = io.StringIO()
+        call_command('fetch_historicals', '--workers=3', '--batch-size=2', '--rate=0', '--loader=bulk', stdout=out)
+
+        # Every ticker downloaded exactly once, results aggregated into one summary
+        self.assertEqual(sorted(call.args[0] for call in mock_ticker.call_args_list), sorted(tickers))
+        self.assertEqual(HistoricalData.objects.count(), 48)
+        self.assertIn('Total tickers updated: 12', out.getvalue())
+        self.assertIn('Rows inserted: 48', out.getvalue())
+
+
+@skipUnless(multiprocessing.get_start_method() == 'fork', 'worker processes must inherit the test database settings')
+class FetchHistoricalsProcessesTest(TransactionTestCase):
+
+    @patch('yfinance.Ticker')
+    def test_shards_run_in_worker_processes(self, mock_ticker):
+        tickers = [f'T{i}' for i in range(12)]
+        for ticker in tickers:
+            ActiveStocksAlphaVantage.objects.create(
+                ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+            )
+        mock_ticker.return_value.history.return_value = make_frame(periods=4)
+
+        out = io.StringIO()
+        loader = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        call_command('fetch_historicals', '--workers=3', '--batch-size=2', '--rate=0', f'--loader={loader}', stdout=out)
+
+        # Counts come back from the worker processes, the parent downloaded nothing itself
+        mock_ticker.assert_not_called()
+        self.assertIn('Total tickers updated: 12', out.getvalue())
+        self.assertIn('Rows inserted: 48', out.getvalue())
+        # A forked in-memory SQLite database is a copy per process; any other database is shared
+        if not (connection.vendor == 'sqlite' and connection.is_in_memory_db()):
+            self.assertEqual(HistoricalData.objects.count(), 48)
+            self.assertFalse(FetchBatch.objects.exclude(status=FetchBatch.STATUS_DONE).exists())
@@ -0,0 +1,104 @@
+import io
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock, patch
+from django.core.management import call_command
+from django.db.models import Max
+from django.test import TestCase
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FetchBatch, FetchRun, HistoricalData
+from stock_tickers_handler.tests.test_ingestion import make_frame
+
+
+class FetchJournalTest(TestCase):
+
+    def setUp(self):
+        for ticker in ['AAPL', 'MSFT', 'GOOG']:
+            ActiveStocksAlphaVantage.objects.create(
+                ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+            )
+
+    def fetch(self, *args):
+        out = io.StringIO()
+        call_command('fetch_historicals', '--rate=0', '--loader=bulk', '--batch-size=1', *args, stdout=out)
+        return out.getvalue()
+
+    @patch('yfinance.Ticker')
+    def test_run_records_each_batch(self, mock_ticker):
+        mock_ticker.return_value.history.return_value = make_frame(periods=3)
+        self.fetch()
+
+        run = FetchRun.objects.get()
+        self.assertEqual(run.status, FetchRun.STATUS_FINISHED)
+        self.assertEqual(run.batches.count(), 3)
+        for batch in run.batches.all():
+            self.assertEqual(batch.status, FetchBatch.STATUS_DONE)
+            self.assertEqual(batch.rows_written, 3)
+            self.assertIsNotNone(batch.download_seconds)
+            self.assertIsNotNone(batch.finished_at)
+
+    @patch('yfinance.Ticker')
+    def test_resume_only_downloads_unfinished_batches(self, mock_ticker):
+        def ticker_factory(ticker):
+            history = MagicMock(side_effect=RuntimeError('connection reset')) if ticker == 'MSFT' else MagicMock(return_value=make_frame())
+            return MagicMock(history=history)
+
+        mock_ticker.side_effect = ticker_factory
+        self.fetch()
+        run = FetchRun.objects.get()
+        self.assertEqual(run.status, FetchRun.STATUS_FAILED)
+        self.assertEqual(run.batches.filter(status=FetchBatch.STATUS_FAILED).get().tickers, ['MSFT'])
+
+        mock_ticker.reset_mock(side_effect=True)
+        mock_ticker.return_value.history.return_value = make_frame()
+        output = self.fetch('--resume')
+
+        self.assertIn(f'Resuming run #{run.pk}: 1 of 3 batches left', output)
+        mock_ticker.assert_called_once_with('MSFT')
+        run.refresh_from_db()
+        self.assertEqual(run.status, FetchRun.STATUS_FINISHED)
+        self.assertEqual(FetchRun.objects.count(), 1)
+        self.assertEqual(HistoricalData.objects.count(), 9)
+
+    @patch('yfinance.Ticker')
+    def test_run_during_a_session_stops_at_the_last_closed_one(self, mock_ticker):
+        def ticker_factory(ticker):
+            history = MagicMock(side_effect=RuntimeError('connection reset')) if ticker == 'MSFT' else MagicMock(return_value=make_frame('2024-03-01', periods=5))
+            return MagicMock(history=history)
+
+        mock_ticker.side_effect = ticker_factory
+        # Wednesday 10:00 in New York: the Tuesday bar is final, Wednesday's is still moving
+        with patch('django.utils.timezone.now', return_value=datetime(2024, 3, 6, 15, tzinfo=timezone.utc)):
+            self.fetch()
+        run = FetchRun.objects.get()
+        self.assertEqual(run.end_date, date(2024, 3, 6))
+        self.assertEqual(HistoricalData.objects.aggregate(last=Max('date'))['last'], date(2024, 3, 5))
+
+        mock_ticker.reset_mock(side_effect=True)
+        mock_ticker.return_value.history.return_value = make_frame('2024-03-01', periods=5)
+        with patch('django.utils.timezone.now', return_value=datetime(2024, 3, 8, 15, tzinfo=timezone.utc)):
+            self.fetch('--resume')
+        self.assertEqual(mock_ticker.return_value.history.call_args.kwargs['end'], date(2024, 3, 6))
+        self.assertEqual(HistoricalData.objects.filter(active_stocks_alpha_vantage__ticker='MSFT').aggregate(last=Max('date'))['last'], date(2024, 3, 5))
+
+    def test_resume_without_unfinished_run_plans_new_one(self):
+        FetchRun.objects.create(command='fetch_historicals', status=FetchRun.STATUS_FINISHED)
+        FetchBatch.objects.create(run=FetchRun.objects.get(), batch_num=1, tickers=['AAPL'], start_date=date(2010, 1, 1), status=FetchBatch.STATUS_DONE)
+        with patch('yfinance.Ticker') as mock_ticker:
+            mock_ticker.return_value.history.return_value = make_frame()
+            output = self.fetch('--resume')
+        self.assertIn('No unfinished run to resume', output)
+        self.assertEqual(FetchRun.objects.count(), 2)
+
+        listing = self.fetch('--list-runs')
+        self.assertIn('batches 3/3, rows written 9', listing)
+
+    @patch('yfinance.Ticker')
+    def test_rerun_without_new_session_does_no_network_work(self, mock_ticker):
+        mock_ticker.return_value.history.return_value = make_frame()
+        self.fetch()
+        mock_ticker.reset_mock()
+
+        output = self.fetch()
+
+        mock_ticker.assert_not_called()
+        self.assertIn('Nothing to fetch', output)
+        self.assertEqual(FetchRun.objects.count(), 1)
@@ -0,0 +1,193 @@
+import io
+import random
+import time
+from datetime import date
+from django.test import SimpleTestCase, TestCase
+from decimal import Decimal
+from django.core.management import call_command
+from stock_tickers_handler.fundamentals import (
+    FIELD_MAPPINGS, MAPPING, NUMBER, TIMESTAMP, build_fundamentals, content_hashes, convert_infos, recompute_derived,
+)
+from stock_tickers_handler.management.commands.fetch_info import UPDATE_FIELDS, Command as FetchInfoCommand
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+from stock_tickers_handler.tests import benchmark
+
+APPLE_INFO = {
+    'longName': 'Apple Inc.',
+    'sector': 'Technology',
+    'previousClose': 180.123456,
+    'fiftyTwoWeekLow': 150.0,
+    'fiftyTwoWeekHigh': 200.0,
+    'targetMedianPrice': 198.0,
+    '52WeekChange': 0.123456789,
+    'trailingPE': 'Infinity',
+    'forwardPE': 'NaN',
+    'marketCap': 2_800_000_000_000.7,
+    'exDividendDate': 1700006400,
+    'lastSplitDate': 0,
+    'lastSplitFactor': '4:1',
+    'numberOfAnalystOpinions': 38,
+}
+
+
+def random_info(rng, position):
+    info = {f'unused{key}': rng.random() for key in range(60)}
+    for mapping in FIELD_MAPPINGS:
+        if mapping.converter == NUMBER:
+            info[mapping.key] = rng.choice([rng.uniform(-100, 100), None, 'Infinity'])
+        elif mapping.converter == TIMESTAMP:
+            info[mapping.key] = rng.choice([1_700_000_000 + rng.randint(0, 10 ** 7), None])
+        else:
+            info[mapping.key] = f'{mapping.key} {position}'
+    info['52WeekChange'] = rng.uniform(-1, 1)
+    return info
+
+
+class ConvertInfosTest(SimpleTestCase):
+
+    def test_values_are_rounded_cleaned_and_derived(self):
+        columns = convert_infos([APPLE_INFO, {'longName': 'Empty Co'}])
+        self.assertEqual(list(columns['long_name']), ['Apple Inc.', 'Empty Co'])
+        self.assertEqual(columns['previous_close'][0], 180.12346)
+        self.assertIsNone(columns['trailing_pe'][0])
+        self.assertIsNone(columns['forward_pe'][0])
+        self.assertEqual(columns['market_cap'][0], 2_800_000_000_000)
+        self.assertIsInstance(columns['number_of_analyst_opinions'][0], int)
+        self.assertEqual(columns['ex_dividend_date'][0], date(2023, 11, 15))
+        self.assertIsNone(columns['last_split_date'][0])
+        # Derived fields are rounded to the decimal places of their column
+        self.assertEqual(columns['percent_from_52_week_high_low'][0], 60.25)
+        self.assertEqual(columns['percent_52_week_change'][0], 12.34568)
+        self.assertEqual(columns['upside'][0], 9.92)
+        # A ticker with nothing but a name leaves every other field empty
+        self.assertTrue(all(column[1] is None for field, column in columns.items() if field != 'long_name'))
+
+    def test_flat_52_week_range_has_no_position(self):
+        info = dict(APPLE_INFO, fiftyTwoWeekHigh=150.0)
+        self.assertIsNone(convert_infos([info])['percent_from_52_week_high_low'][0])
+
+    def test_non_numeric_strings_are_dropped(self):
+        columns = convert_infos([dict(APPLE_INFO, beta='n/a'), dict(APPLE_INFO, beta=1.2)])
+        self.assertEqual(list(columns['beta']), [None, 1.2])
+
+    def test_mapping_is_compiled_against_the_model(self):
+        self.assertIn('market_cap', MAPPING.integer_fields)
+        self.assertNotIn('previous_close', MAPPING.integer_fields)
+        self.assertIn('52WeekChange', MAPPING.number_keys)
+
+    def test_content_hash_ignores_noise_below_stored_precision(self):
+        infos = [APPLE_INFO, dict(APPLE_INFO, previousClose=180.1234561), dict(APPLE_INFO, previousClose=180.13)]
+        hashes = content_hashes(convert_infos(infos), MAPPING.fields)
+        self.assertEqual(hashes[0], hashes[1])
+        self.assertNotEqual(hashes[0], hashes[2])
+        self.assertNotEqual(hashes[0], content_hashes(convert_infos(infos), MAPPING.fields[1:])[0])
+
+    def test_batch_transform_of_random_infos(self):
+        rng = random.Random(0)
+        batch = [(f'T{position}', random_info(rng, position)) for position in range(1000)]
+        objects = build_fundamentals(batch, {ticker: position for position, (ticker, _) in enumerate(batch, start=1)})
+        self.assertEqual([record.active_stocks_alpha_vantage_id for record in objects], list(range(1, 1001)))
+        self.assertEqual(objects[7].long_name, 'longName 7')
+
+    @benchmark
+    def test_batch_transform_microbenchmark(self):
+        rng = random.Random(0)
+        batch = [(f'T{position}', random_info(rng, position)) for position in range(1000)]
+        stock_ids = {ticker: position for position, (ticker, _) in enumerate(batch, start=1)}
+        build_fundamentals(batch, stock_ids)
+        started = time.perf_counter()
+        build_fundamentals(batch, stock_ids)
+        elapsed = time.perf_counter() - started
+        # About 50 ms here; building the objects one by one took about 220 ms
+        self.assertLess(elapsed, 0.5)
+
+
+class BuildFundamentalsTest(TestCase):
+
+    def test_objects_save_with_preloaded_ids(self):
+        stock = ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple', exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker='AAPL'
+        )
+        with self.assertNumQueries(1):
+            FundamentalData.objects.bulk_create(build_fundamentals([('AAPL', APPLE_INFO)], {'AAPL': stock.id}))
+        saved = FundamentalData.objects.get()
+        self.assertEqual(saved.active_stocks_alpha_vantage, stock)
+        self.assertEqual(str(saved.previous_close), '180.12346')
+        self.assertEqual(saved.last_split_factor, '4:1')
+        self.assertIsNotNone(saved.last_updated)
+        self.assertEqual(len(saved.content_hash), 32)
+
+
+class SaveBatchTest(TestCase):
+
+    def setUp(self):
+        self.stock = ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple', exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker='AAPL'
+        )
+        self.command = FetchInfoCommand(stdout=io.StringIO())
+        self.command.changed_count = self.command.unchanged_count = 0
+
+    def save(self, info):
+        self.command.save_batch([('AAPL', info)], {'AAPL': self.stock.id})
+        return FundamentalData.objects.get()
+
+    def test_unchanged_records_only_bump_last_checked(self):
+        first = self.save(APPLE_INFO)
+        second = self.save(dict(APPLE_INFO))
+        self.assertEqual(second.last_updated, first.last_updated)
+        self.assertGreater(second.last_checked, first.last_checked)
+        self.assertEqual((self.command.changed_count, self.command.unchanged_count), (1, 1))
+
+        third = self.save(dict(APPLE_INFO, previousClose=181.0))
+        self.assertGreater(third.last_updated, first.last_updated)
+        self.assertEqual(str(third.previous_close), '181.00000')
+        self.assertNotEqual(third.content_hash, first.content_hash)
+        self.assertEqual((self.command.changed_count, self.command.unchanged_count), (2, 1))
+        self.assertIn('1 changed, 0 unchanged', self.command.stdout.getvalue())
+
+    def test_every_hashed_field_is_written(self):
+        self.assertEqual(set(MAPPING.fields) - set(UPDATE_FIELDS), set())
+
+        self.save(APPLE_INFO)
+        info = dict(APPLE_INFO, longName='Apple Incorporated', sector='Consumer Electronics')
+        renamed = self.save(info)
+        self.assertEqual((renamed.long_name, renamed.sector), ('Apple Incorporated', 'Consumer Electronics'))
+        # The stored hash describes the stored row, so the same info is unchanged next time
+        self.assertEqual(renamed.content_hash, build_fundamentals([('AAPL', info)], {'AAPL': self.stock.id})[0].content_hash)
+        self.save(info)
+        self.assertEqual((self.command.changed_count, self.command.unchanged_count), (2, 1))
+
+
+class RecomputeDerivedTest(TestCase):
+
+    def add(self, ticker, **fields):
+        stock = ActiveStocksAlphaVantage.objects.create(
+            ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+        )
+        return FundamentalData.objects.create(active_stocks_alpha_vantage=stock, **fields)
+
+    def test_sql_matches_batch_conversion(self):
+        stored = build_fundamentals([('AAPL', APPLE_INFO)], {'AAPL': self.add('AAPL').active_stocks_alpha_vantage_id})[0]
+        FundamentalData.objects.bulk_create([stored], update_conflicts=True, unique_fields=['active_stocks_alpha_vantage'],
+                                            update_fields=['previous_close', 'price_52_week_low', 'price_52_week_high', 'target_median_price'])
+        with self.assertNumQueries(1):
+            self.assertEqual(recompute_derived(), 1)
+        row = FundamentalData.objects.get()
+        self.assertEqual(row.percent_from_52_week_high_low, Decimal('60.25'))
+        self.assertEqual(row.upside, Decimal('9.92'))
+
+    def test_missing_and_zero_operands_give_null(self):
+        flat = self.add('FLAT', previous_close=10, price_52_week_low=10, price_52_week_high=10, target_median_price=12,
+                        percent_from_52_week_high_low=Decimal('50'))
+        empty = self.add('NONE', previous_close=0, target_median_price=12, upside=Decimal('99'))
+        recompute_derived()
+        out = io.StringIO()
+        call_command('update_model', '--fields', 'upside', stdout=out)
+        flat.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(flat.upside, Decimal('20.00'))
+        self.assertIsNone(flat.percent_from_52_week_high_low)
+        self.assertIsNone(empty.upside)
+        self.assertIn('Recomputed upside for 2 rows', out.getvalue())
+        with self.assertRaises(ValueError):
+            recompute_derived(['percent_52_week_change'])
@@ -0,0 +1,137 @@
+import threading
+import time
+from unittest.mock import MagicMock
+import requests
+from django.test import SimpleTestCase
+from stock_tickers_handler.http_client import AdaptiveThrottle, HttpClient, HttpMetrics
+from stock_tickers_handler.tests.test_downloader import FakeClock
+
+
+def response(status, headers=None):
+    result = MagicMock(status_code=status)
+    result.headers = headers or {}
+    return result
+
+
+class ScriptedSession:
+    """Answers get() with the scripted responses (or raises scripted exceptions) in order."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class HttpClientTest(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sleeps = []
+
+    def make_client(self, session, **kwargs):
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.clock.sleep(seconds)
+        return HttpClient(
+            session=session, sleep=sleep, jitter=lambda low, high: high, metrics=HttpMetrics(self.clock),
+            throttle_factory=lambda: AdaptiveThrottle(rate=0), **kwargs
+        )
+
+    def test_retries_with_exponential_backoff(self):
+        session = ScriptedSession(response(503), requests.ConnectionError(), response(502), response(200))
+        client = self.make_client(session)
+        self.assertEqual(client.get('https://example.com/a').status_code, 200)
+        self.assertEqual(self.sleeps, [1, 2, 4])
+        self.assertEqual((client.metrics.requests, client.metrics.retries, client.metrics.failures), (4, 3, 3))
+
+    def test_retry_after_is_honoured(self):
+        client = self.make_client(ScriptedSession(response(429, {'Retry-After': '7'}), response(200)))
+        client.get('https://example.com/a')
+        self.assertEqual(self.sleeps, [7])
+        self.assertEqual(client.metrics.throttled, 1)
+
+    def test_gives_up_after_max_retries(self):
+        client = self.make_client(ScriptedSession(*(response(500) for _ in range(3))), max_retries=2)
+        self.assertEqual(client.get('https://example.com/a').status_code, 500)
+        session = ScriptedSession(*(requests.Timeout() for _ in range(3)))
+        with self.assertRaises(requests.Timeout):
+            self.make_client(session, max_retries=2).get('https://example.com/a')
+        self.assertEqual(len(session.urls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        error = requests.HTTPError(response=response(404))
+        client = self.make_client(ScriptedSession(error))
+        with self.assertRaises(requests.HTTPError):
+            client.call('example.com', lambda: client.session.get('https://example.com/missing'))
+        self.assertEqual(self.sleeps, [])
+
+    def test_full_jitter_stays_within_cap(self):
+        client = HttpClient(session=ScriptedSession(), backoff_base=1, backoff_cap=10)
+        for attempt in range(8):
+            self.assertLessEqual(client.backoff(attempt), 10)
+            self.assertGreaterEqual(client.backoff(attempt), 0)
+
+    def test_requests_in_flight_are_capped_per_host(self):
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+
+        def request():
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return response(200)
+
+        client = HttpClient(session=ScriptedSession(), max_per_host=2, throttle_factory=lambda: AdaptiveThrottle(rate=0))
+        threads = [threading.Thread(target=client.call, args=('example.com', request)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(client.metrics.requests, 8)
+
+
+class AdaptiveThrottleTest(SimpleTestCase):
+
+    def test_backs_off_on_429_and_speeds_up_on_success(self):
+        throttle = AdaptiveThrottle(rate=4, min_rate=0.5, max_rate=5, increase=0.5)
+        throttle.on_throttled()
+        throttle.on_throttled()
+        self.assertEqual(throttle.rate, 1)
+        for _ in range(3):
+            throttle.on_success()
+        self.assertEqual(throttle.rate, 2.5)
+        for _ in range(10):
+            throttle.on_throttled()
+        self.assertEqual(throttle.rate, 0.5)
+        for _ in range(20):
+            throttle.on_success()
+        self.assertEqual(throttle.rate, 5)
+
+    def test_rate_limits_requests(self):
+        clock = FakeClock()
+        throttle = AdaptiveThrottle(rate=2, clock=clock, sleep=clock.sleep)
+        for _ in range(5):
+            throttle.acquire()
+        self.assertAlmostEqual(clock.now, 2.0)
+
+
+class HttpMetricsTest(SimpleTestCase):
+
+    def test_requests_per_second(self):
+        clock = FakeClock()
+        metrics = HttpMetrics(clock)
+        for _ in range(10):
+            metrics.record(200, False)
+        clock.sleep(5)
+        self.assertEqual(metrics.requests_per_second(), 2)
+        self.assertEqual(metrics.summary(), '10 requests (2.00/s), 0 retries, 0 throttled (HTTP 429), 0 failed')
@@ -0,0 +1,99 @@
+import io
+from datetime import date, timedelta
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from stock_tickers_handler.autocomplete import load_entries
+from stock_tickers_handler.indexes import download_index_history, get_index_history, latest_quotes_cache
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData, HistoricalData
+from stock_tickers_handler.refresh import load_candidates
+from stock_tickers_handler.screener import load_snapshot
+from stock_tickers_handler.search import search_index, search_page
+from stock_tickers_handler.tests.test_ingestion import make_frame
+
+
+def multi_symbol_frame(symbols, start='2024-01-02', periods=3):
+    """Shape of yf.download(..., group_by='ticker') for several symbols."""
+    return pd.concat({symbol: make_frame(start, periods=periods) for symbol in symbols}, axis=1)
+
+
+@patch.object(latest_quotes_cache, 'background', False)
+class IndexHistoryTest(TestCase):
+
+    def setUp(self):
+        latest_quotes_cache.invalidate()
+
+    def store_closes(self, symbol, closes_by_date):
+        stock = ActiveStocksAlphaVantage.objects.get(yahoo_ticker=symbol)
+        HistoricalData.objects.bulk_create([
+            HistoricalData(active_stocks_alpha_vantage=stock, date=day, open=close, high=close, low=close,
+                           close=close, adj_close=close, volume=0)
+            for day, close in closes_by_date.items()
+        ])
+
+    @patch('yfinance.download')
+    def test_single_download_for_all_symbols(self, mock_download):
+        mock_download.return_value = multi_symbol_frame(['^GSPC', 'GC=F'])
+        series = download_index_history({'S&P 500': '^GSPC', 'Gold': 'GC=F', 'Missing': '^NOPE'})
+
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args.args[0], ['^GSPC', 'GC=F', '^NOPE'])
+        self.assertEqual(set(series), {'S&P 500', 'Gold'})
+        self.assertEqual(series['Gold'].closes.dtype, np.float64)
+        self.assertEqual(series['Gold'].current_price, 102.0)
+        self.assertAlmostEqual(series['Gold'].day_change, 100 / 101)
+
+    def test_load_indexes_registers_symbols_once(self):
+        call_command('load_indexes', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('load_indexes', stdout=out)
+        self.assertIn('Registered 0 new', out.getvalue())
+        self.assertEqual(ActiveStocksAlphaVantage.objects.get(yahoo_ticker='GC=F').assetType, 'Commodity')
+        self.assertEqual(ActiveStocksAlphaVantage.objects.filter(exchange='INDEX').count(), 14)
+
+    def test_index_symbols_stay_out_of_the_stock_universe(self):
+        call_command('load_indexes', stdout=io.StringIO())
+        stock = ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple', exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker='AAPL'
+        )
+        FundamentalData.objects.create(active_stocks_alpha_vantage=stock, long_name='Apple Inc.')
+        # As if fetch_info had reached an index before it was excluded
+        FundamentalData.objects.create(active_stocks_alpha_vantage=ActiveStocksAlphaVantage.objects.get(yahoo_ticker='^GSPC'),
+                                       long_name='S&P 500')
+
+        self.assertEqual([candidate.ticker for candidate in load_candidates()], ['AAPL'])
+        self.assertEqual([entry[0] for entry in load_entries()], ['AAPL'])
+        self.assertEqual(list(load_snapshot().tickers), ['AAPL'])
+        search_index.invalidate()
+        self.assertEqual([row['ticker'] for row in search_page('S&P 500').results], [])
+        self.assertEqual([row['ticker'] for row in search_page('AAPL').results], ['AAPL'])
+
+    @patch('yfinance.download')
+    def test_stored_history_is_topped_up_with_latest_sessions(self, mock_download):
+        call_command('load_indexes', stdout=io.StringIO())
+        last_stored = pd.bdate_range(date.today() - timedelta(days=5), periods=1)[0].date()
+        self.store_closes('^GSPC', {last_stored - timedelta(days=30): 90, last_stored: 95})
+        self.store_closes('^DJI', {last_stored - timedelta(days=30): 50, last_stored: 40})
+        # The download overlaps the stored session and adds two newer ones for ^GSPC only
+        mock_download.return_value = multi_symbol_frame(['^GSPC'], start=last_stored, periods=3)
+
+        series = get_index_history({'S&P 500': '^GSPC', 'Dow Jones': '^DJI'})
+
+        self.assertEqual(series['S&P 500'].closes.tolist(), [90.0, 95.0, 101.0, 102.0])
+        self.assertEqual(series['Dow Jones'].closes.tolist(), [50.0, 40.0])
+        self.assertEqual(series['Dow Jones'].day_change, -20.0)
+
+    @patch('yfinance.download', side_effect=ConnectionError('Yahoo is down'))
+    def test_indexes_view_reads_database_when_upstream_fails(self, mock_download):
+        call_command('load_indexes', stdout=io.StringIO())
+        today = date.today()
+        self.store_closes('^DJI', {today - timedelta(days=2): 100, today - timedelta(days=1): 110})
+
+        response = self.client.get(reverse('indexes'))
+
+        self.assertEqual(list(response.context['index_data']), ['Dow Jones'])
+        self.assertEqual(response.context['index_data']['Dow Jones']['prices'], [100.0, 110.0])
+        self.assertEqual(response.context['index_data']['Dow Jones']['dates'][-1], str(today - timedelta(days=1)))
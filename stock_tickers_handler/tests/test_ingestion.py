@@ -0,0 +1,123 @@
+import io
+from datetime import date
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from unittest.mock import patch
+from django.test import TestCase
+from stock_tickers_handler import ingestion
+from stock_tickers_handler.ingestion import frame_to_rows, get_ticker_ids, save_historical_frames, save_historical_rows
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData, TickerWatermark
+
+
+def make_frame(start='2024-01-02', periods=3, with_adj_close=True):
+    """Build a single-ticker frame shaped like yfinance's output."""
+    index = pd.bdate_range(start, periods=periods)
+    close = np.arange(100, 100 + periods, dtype='float64')
+    frame = pd.DataFrame({
+        'Open': close - 1,
+        'High': close + 1,
+        'Low': close - 2,
+        'Close': close,
+        'Volume': np.full(periods, 1000.0),
+    }, index=index)
+    if with_adj_close:
+        frame.insert(4, 'Adj Close', close * 0.99)
+    return frame
+
+
+class FrameToRowsTest(TestCase):
+
+    def test_converts_columns_and_drops_empty_rows(self):
+        frame = make_frame(periods=3)
+        frame.iloc[1] = np.nan
+        rows = frame_to_rows(frame)
+        self.assertEqual([row[0] for row in rows], [date(2024, 1, 2), date(2024, 1, 4)])
+        self.assertEqual(rows[0][1:], (99.0, 101.0, 98.0, 100.0, 99.0, 1000))
+
+    def test_missing_adj_close_falls_back_to_close(self):
+        rows = frame_to_rows(make_frame(periods=1, with_adj_close=False))
+        self.assertEqual(rows[0][5], rows[0][4])
+
+
+class SaveHistoricalFramesTest(TestCase):
+
+    def setUp(self):
+        self.stock = ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple Inc.', exchange='NASDAQ', assetType='Stock',
+            status='Active', yahoo_ticker='AAPL'
+        )
+
+    def test_inserts_new_rows_and_skips_existing_dates(self):
+        stats = save_historical_frames({'AAPL': make_frame(periods=3)})
+        self.assertEqual((stats.inserted, stats.skipped), (3, 0))
+
+        # Existing-date lookup, the insert and watermark upsert (with its savepoint) regardless of row count
+        with self.assertNumQueries(6):
+            stats = save_historical_frames({'AAPL': make_frame(periods=5)}, {'AAPL': self.stock.id})
+        self.assertEqual((stats.inserted, stats.skipped), (2, 3))
+        self.assertEqual(HistoricalData.objects.filter(active_stocks_alpha_vantage=self.stock).count(), 5)
+
+    def test_rows_are_inserted_in_bounded_chunks(self):
+        rows = frame_to_rows(make_frame(periods=5))
+        stock_id = get_ticker_ids(['AAPL'])['AAPL']
+        # Existing-date lookup, three INSERTs of at most two rows and the watermark upsert
+        with self.assertNumQueries(8):
+            stats = save_historical_rows({stock_id: rows}, batch_size=2)
+        self.assertEqual(stats.inserted, 5)
+        self.assertEqual(TickerWatermark.objects.get(active_stocks_alpha_vantage=self.stock).row_count, 5)
+
+    def test_rows_written_concurrently_are_not_counted_as_inserted(self):
+        rows = frame_to_rows(make_frame(periods=3))
+        real_stored_dates = ingestion.stored_dates
+
+        def another_writer_first(stock_ids, min_date):
+            stored = real_stored_dates(stock_ids, min_date)
+            # Another loader stores the first date after the existing-date lookup missed it
+            HistoricalData.objects.create(active_stocks_alpha_vantage=self.stock, date=rows[0][0], open=1, high=1,
+                                          low=1, close=1, adj_close=1, volume=0)
+            return stored
+
+        with patch.object(ingestion, 'stored_dates', side_effect=another_writer_first):
+            stats = save_historical_rows({self.stock.id: rows})
+        self.assertEqual((stats.inserted, stats.skipped), (2, 1))
+        self.assertEqual(TickerWatermark.objects.get(active_stocks_alpha_vantage=self.stock).row_count, 2)
+
+    def test_unknown_tickers_are_ignored(self):
+        stats = save_historical_frames({'MSFT': make_frame()})
+        self.assertEqual((stats.inserted, stats.skipped), (0, 0))
+        self.assertFalse(HistoricalData.objects.exists())
+
+
+class WatermarkTest(TestCase):
+
+    def setUp(self):
+        self.stock = ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple Inc.', exchange='NASDAQ', assetType='Stock',
+            status='Active', yahoo_ticker='AAPL'
+        )
+
+    def test_ingestion_advances_watermark(self):
+        save_historical_frames({'AAPL': make_frame('2024-01-02', periods=3)})
+        save_historical_frames({'AAPL': make_frame('2024-01-03', periods=5)})
+
+        watermark = TickerWatermark.objects.get(active_stocks_alpha_vantage=self.stock)
+        self.assertEqual((watermark.first_date, watermark.last_date), (date(2024, 1, 2), date(2024, 1, 9)))
+        self.assertEqual(watermark.row_count, 6)
+        self.assertIsNotNone(watermark.last_fetch_attempt)
+
+    def test_attempt_without_data_is_recorded(self):
+        save_historical_frames({}, attempted=['AAPL'])
+        watermark = TickerWatermark.objects.get(active_stocks_alpha_vantage=self.stock)
+        self.assertIsNone(watermark.last_date)
+        self.assertIsNotNone(watermark.last_fetch_attempt)
+
+    def test_rebuild_command_repairs_watermarks(self):
+        save_historical_frames({'AAPL': make_frame(periods=4)})
+        TickerWatermark.objects.update(last_date=date(2000, 1, 1), row_count=1)
+        HistoricalData.objects.filter(date=date(2024, 1, 5)).delete()
+
+        call_command('rebuild_watermarks', 'AAPL', stdout=io.StringIO())
+
+        watermark = TickerWatermark.objects.get(active_stocks_alpha_vantage=self.stock)
+        self.assertEqual((watermark.last_date, watermark.row_count), (date(2024, 1, 4), 3))
@@ -0,0 +1,86 @@
+import io
+import json
+from datetime import date
+from unittest.mock import patch
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from stock_tickers_handler.ingestion import rebuild_watermarks
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, HistoricalData, PerformanceSnapshot
+from stock_tickers_handler.performance import get_performance, load_adjusted_closes, refresh_snapshots
+from stock_tickers_handler.tests.test_ingestion import make_frame
+
+
+def add_bars(ticker, closes_by_date):
+    stock = ActiveStocksAlphaVantage.objects.create(
+        ticker=ticker, name=ticker, exchange='NYSE ARCA', assetType='ETF', status='Active', yahoo_ticker=ticker
+    )
+    HistoricalData.objects.bulk_create([
+        HistoricalData(active_stocks_alpha_vantage=stock, date=day, open=close, high=close, low=close,
+                       close=close, adj_close=close, volume=0)
+        for day, close in closes_by_date.items()
+    ])
+
+
+class PerformanceEngineTest(TestCase):
+
+    def setUp(self):
+        add_bars('XLK', {date(2024, 1, 2): 100, date(2024, 5, 1): 120, date(2024, 6, 3): 150})
+        # XLE has no bar on 2024-06-03, so its windows end on its own last close
+        add_bars('XLE', {date(2024, 1, 2): 50, date(2024, 5, 1): 40})
+
+    def test_aligns_tickers_on_shared_dates(self):
+        matrix = load_adjusted_closes(['XLK', 'XLE'], date(2024, 1, 1))
+        self.assertEqual(len(matrix.dates), 3)
+        self.assertTrue(np.isnan(matrix.closes[2, 1]))
+
+    def test_lookback_returns_for_all_periods_in_one_query(self):
+        with self.assertNumQueries(1):
+            performance = get_performance(['XLK', 'XLE', 'NONE'], {'1_year': 365, '1_month': 30, '1_week': 7}, as_of=date(2024, 6, 3))
+
+        self.assertEqual(performance['1_year'], {'XLK': 50.0, 'XLE': -20.0, 'NONE': None})
+        # The one-month window starts after XLE's last bar
+        self.assertEqual(performance['1_month'], {'XLK': 0.0, 'XLE': None, 'NONE': None})
+        self.assertEqual(performance['1_week']['XLK'], 0.0)
+
+
+class PerformanceSnapshotTest(TestCase):
+
+    def setUp(self):
+        add_bars('XLK', {date(2023, 12, 29): 90, date(2024, 1, 2): 100, date(2024, 5, 1): 120, date(2024, 6, 3): 150})
+        add_bars('XLE', {date(2024, 1, 2): 50, date(2024, 5, 1): 40})
+        rebuild_watermarks()
+
+    def test_refresh_stores_all_periods(self):
+        self.assertEqual(refresh_snapshots(as_of=date(2024, 6, 3)), 2)
+
+        snapshot = PerformanceSnapshot.objects.get(active_stocks_alpha_vantage__yahoo_ticker='XLK')
+        self.assertEqual(snapshot.last_close, 150.0)
+        self.assertEqual((snapshot.return_1y, snapshot.return_ytd, snapshot.return_1w), (66.67, 50.0, 0.0))
+        self.assertIsNone(PerformanceSnapshot.objects.get(active_stocks_alpha_vantage__yahoo_ticker='XLE').return_1m)
+
+    def test_sectors_view_reads_snapshots_in_one_query(self):
+        refresh_snapshots(as_of=date(2024, 6, 3))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('sectors'))
+        performance_data = json.loads(response.context['performance_data'])
+        self.assertEqual(performance_data['1_year'], {'Technology': 66.67, 'Energy': -20.0})
+        self.assertEqual(set(performance_data), {'5_years', '2_years', '1_year', '3_months', '1_month', '1_week'})
+
+    @patch('yfinance.Ticker')
+    def test_fetch_historicals_refreshes_touched_tickers_only(self, mock_ticker):
+        refresh_snapshots(as_of=date(2024, 6, 3))
+        ActiveStocksAlphaVantage.objects.filter(yahoo_ticker='XLE').update(is_hist_available=False)
+        mock_ticker.return_value.history.return_value = make_frame('2024-06-04', periods=3)
+
+        call_command('fetch_historicals', '--rate=0', '--loader=bulk', stdout=io.StringIO())
+
+        self.assertEqual(PerformanceSnapshot.objects.get(active_stocks_alpha_vantage__yahoo_ticker='XLK').as_of, date.today())
+        self.assertEqual(PerformanceSnapshot.objects.get(active_stocks_alpha_vantage__yahoo_ticker='XLE').as_of, date(2024, 6, 3))
+
+    def test_rebuild_command(self):
+        out = io.StringIO()
+        call_command('rebuild_performance', stdout=out)
+        self.assertIn('for 2 tickers', out.getvalue())
+        self.assertEqual(PerformanceSnapshot.objects.count(), 2)
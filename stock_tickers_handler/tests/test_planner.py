@@ -0,0 +1,39 @@
+from datetime import date
+from django.test import SimpleTestCase
+from stock_tickers_handler.planner import plan_batches, plan_sharded_batches, shard_of
+
+
+class PlanBatchesTest(SimpleTestCase):
+
+    def test_each_ticker_downloads_from_its_own_start_date(self):
+        start_dates = {
+            'E': date(2024, 6, 7), 'B': date(2024, 6, 4), 'A': date(2024, 6, 3),
+            'D': date(2024, 6, 6), 'C': date(2024, 6, 5),
+        }
+        plan = plan_batches(start_dates, end_date=date(2024, 6, 7), batch_size=3)
+
+        self.assertEqual([batch.tickers for batch in plan.batches], [['A', 'B', 'C'], ['D', 'E']])
+        self.assertEqual(plan.batches[0].start_dates, {'A': date(2024, 6, 3), 'B': date(2024, 6, 4), 'C': date(2024, 6, 5)})
+        self.assertEqual([batch.start_date for batch in plan.batches], [date(2024, 6, 3), date(2024, 6, 6)])
+        # Only the sessions each ticker is missing: 5 + 4 + 3 and 2 + 1
+        self.assertEqual([batch.estimated_rows for batch in plan.batches], [12, 3])
+        self.assertEqual((plan.tickers, plan.estimated_rows), (5, 15))
+
+    def test_empty_plan(self):
+        self.assertEqual(plan_batches({}, date(2024, 6, 7), 20).batches, [])
+
+
+class ShardingTest(SimpleTestCase):
+
+    def test_shard_of_is_stable(self):
+        # crc32 values are fixed, unlike hash() which is salted per process
+        self.assertEqual(shard_of('AAPL', 5), 3060094812 % 5)
+        self.assertEqual(shard_of('AAPL', 1), 0)
+
+    def test_sharded_plan_keeps_each_batch_in_one_shard(self):
+        tickers = [f'T{i}' for i in range(40)]
+        plan = plan_sharded_batches({ticker: date(2024, 6, 3) for ticker in tickers}, date(2024, 6, 7), batch_size=5, shards=3)
+
+        self.assertEqual(sorted(ticker for batch in plan.batches for ticker in batch.tickers), sorted(tickers))
+        for batch in plan.batches:
+            self.assertEqual({shard_of(ticker, 3) for ticker in batch.tickers}, {shard_of(batch.tickers[0], 3)})
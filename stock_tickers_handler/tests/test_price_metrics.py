@@ -0,0 +1,116 @@
+import io
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData, HistoricalData
+from stock_tickers_handler.price_metrics import BarMatrix, last_bar_dates, mean_of_last, price_metrics, refresh_price_fundamentals
+from stock_tickers_handler.refresh import RefreshCandidate, RefreshScheduler
+from stock_tickers_handler.tests import benchmark
+
+AS_OF = date(2024, 6, 28)
+
+
+def add_stock(ticker, days, end=AS_OF, **fundamentals):
+    """A ticker with fundamentals and one bar per day for `days` days up to `end`, closing at 100, 101, 102, ..."""
+    stock = ActiveStocksAlphaVantage.objects.create(
+        ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+    )
+    FundamentalData.objects.create(active_stocks_alpha_vantage=stock, long_name=f'{ticker} Inc.', **fundamentals)
+    HistoricalData.objects.bulk_create([
+        HistoricalData(active_stocks_alpha_vantage=stock, date=end - timedelta(days=days - 1 - day), open=100 + day,
+                       high=101 + day, low=99 + day, close=100 + day, adj_close=(100 + day) / 2, volume=1000 * (day + 1))
+        for day in range(days)
+    ])
+    return stock
+
+
+def random_bars(sessions, tickers):
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (sessions, tickers)), axis=0))
+    dates = np.arange(np.datetime64(AS_OF) - sessions + 1, np.datetime64(AS_OF) + 1)
+    return BarMatrix(dates, [f'T{ticker}' for ticker in range(tickers)], closes, closes * 1.01, closes * 0.99, closes,
+                     rng.uniform(1e5, 1e7, (sessions, tickers)))
+
+
+class PriceMetricsTest(SimpleTestCase):
+
+    def test_mean_of_last_skips_missing_bars(self):
+        values = np.array([[1.0, np.nan], [2.0, 5.0], [3.0, np.nan], [4.0, 7.0]])
+        np.testing.assert_array_equal(mean_of_last(values, 2), [3.5, 6.0])
+        np.testing.assert_array_equal(mean_of_last(values, 10), [2.5, 6.0])
+        self.assertTrue(np.isnan(mean_of_last(np.full((3, 1), np.nan), 2)[0]))
+
+    def test_whole_universe_in_one_vectorized_pass(self):
+        bars = random_bars(260, 50)
+        metrics = price_metrics(bars, AS_OF)
+        np.testing.assert_allclose(metrics['price_200_day_moving_average'], bars.close[-200:].mean(axis=0))
+        np.testing.assert_allclose(metrics['price_52_week_high'], bars.high.max(axis=0))
+        self.assertEqual(last_bar_dates(bars)[0], AS_OF)
+
+    @benchmark
+    def test_5000_tickers_benchmark(self):
+        bars = random_bars(260, 5000)
+        started = time.perf_counter()
+        price_metrics(bars, AS_OF)
+        elapsed = time.perf_counter() - started
+        # About 0.15 s here for 5000 tickers x a year of bars
+        self.assertLess(elapsed, 3)
+
+
+class RefreshPriceFundamentalsTest(TestCase):
+
+    def test_price_fields_come_from_local_bars(self):
+        add_stock('AAPL', 400, target_median_price=Decimal('600'), trailing_pe=Decimal('30'))
+        # Bars only up to 2 years ago: nothing in the 52 week range
+        old = add_stock('OLD', 5, end=date(2022, 1, 7))
+
+        self.assertEqual(refresh_price_fundamentals(as_of=AS_OF), 1)
+        apple = FundamentalData.objects.get(active_stocks_alpha_vantage__yahoo_ticker='AAPL')
+        self.assertEqual(apple.previous_close, Decimal('499'))
+        # 2023-06-29 .. 2024-06-28: days 34 .. 399
+        self.assertEqual(apple.price_52_week_low, Decimal('133'))
+        self.assertEqual(apple.price_52_week_high, Decimal('500'))
+        self.assertEqual(apple.price_50_day_moving_average, Decimal('474.5'))
+        self.assertEqual(apple.price_200_day_moving_average, Decimal('399.5'))
+        self.assertEqual(apple.average_volume_10_days, 395500)
+        self.assertEqual(apple.percent_52_week_change, Decimal('272.39'))
+        self.assertEqual(apple.price_metrics_date, AS_OF)
+        # Derived fields follow, untouched fields stay
+        self.assertEqual(apple.upside, Decimal('20.24'))
+        self.assertEqual(apple.trailing_pe, Decimal('30'))
+        self.assertIsNone(FundamentalData.objects.get(active_stocks_alpha_vantage=old).price_metrics_date)
+
+    def test_price_ratios_follow_the_local_close(self):
+        add_stock('AAPL', 400, shares_outstanding=1000, market_cap=400000, enterprise_value=450000,
+                  trailing_eps=Decimal('20'), trailing_pe=Decimal('20'), forward_eps=Decimal('-1'), forward_pe=Decimal('10'),
+                  book_value=Decimal('100'), price_to_book=Decimal('4'), dividend_rate=Decimal('4.99'), dividend_yield=Decimal('0.0125'))
+
+        refresh_price_fundamentals(as_of=AS_OF)
+        apple = FundamentalData.objects.get()
+        # Closing at 499 instead of the 400 the fetched ratios were based on
+        self.assertEqual(apple.market_cap, 499000)
+        # Debt and cash stay, so the enterprise value moves with the market cap
+        self.assertEqual(apple.enterprise_value, 549000)
+        self.assertEqual(apple.trailing_pe, Decimal('24.95'))
+        # Yahoo leaves the P/E over negative earnings empty
+        self.assertIsNone(apple.forward_pe)
+        self.assertEqual(apple.price_to_book, Decimal('4.99'))
+        self.assertEqual(apple.dividend_yield, Decimal('0.01'))
+
+    def test_command_and_scheduler(self):
+        add_stock('AAPL', 30, end=date.today())
+        out = io.StringIO()
+        call_command('rebuild_price_metrics', 'AAPL', stdout=out)
+        self.assertIn('for 1 tickers', out.getvalue())
+
+        now = datetime.now(timezone.utc)
+        fetched = RefreshCandidate('AAPL', 1, last_checked=now - timedelta(days=45))
+        local = fetched._replace(price_metrics_date=FundamentalData.objects.get().price_metrics_date)
+        scheduler = RefreshScheduler(clock=lambda: now)
+        self.assertAlmostEqual(scheduler.decide(fetched, now).staleness, 1.5)
+        # With prices kept fresh locally, Yahoo is needed a third as often
+        self.assertAlmostEqual(scheduler.decide(local, now).staleness, 0.5)
+        self.assertIn('prices from local bars', scheduler.decide(local, now).explain())
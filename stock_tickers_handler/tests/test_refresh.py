@@ -0,0 +1,120 @@
+import io
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData, RefreshState
+from stock_tickers_handler.refresh import MAX_STALENESS, RefreshCandidate, RefreshScheduler, load_candidates, record_attempts
+
+NOW = datetime(2024, 7, 22, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+def days_ago(days):
+    return NOW - timedelta(days=days)
+
+
+class RefreshSchedulerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = RefreshScheduler(clock=self.clock)
+
+    def test_budget_goes_to_valuable_stale_tickers(self):
+        candidates = [
+            RefreshCandidate('MEGA', 1, market_cap=3e12, average_volume=5e7, last_checked=days_ago(31)),
+            RefreshCandidate('MICRO', 2, market_cap=2e7, average_volume=1e4, last_checked=days_ago(31)),
+            RefreshCandidate('FRESH', 3, market_cap=3e12, average_volume=5e7, last_checked=days_ago(2)),
+            RefreshCandidate('NEW', 4),
+        ]
+        plan = self.scheduler.plan(candidates, budget=2)
+        # A ticker never fetched has no size yet but is as stale as can be
+        self.assertEqual(plan.tickers, ['MEGA', 'NEW'])
+        self.assertEqual([decision.candidate.ticker for decision in plan.decisions], ['MEGA', 'NEW', 'MICRO', 'FRESH'])
+        self.assertEqual(plan.decisions[1].staleness, MAX_STALENESS)
+        self.assertIn('MEGA: refresh', plan.decisions[0].explain())
+        self.assertIn('MICRO: skip', plan.decisions[2].explain())
+
+    def test_staleness_grows_with_the_clock(self):
+        candidate = RefreshCandidate('AAPL', 1, market_cap=3e12, last_checked=NOW - timedelta(hours=1))
+        self.assertEqual(self.scheduler.plan([candidate], budget=10).tickers, [])
+        self.clock.advance(days=15)
+        first = self.scheduler.plan([candidate], budget=10).decisions[0]
+        self.clock.advance(days=15)
+        second = self.scheduler.plan([candidate], budget=10).decisions[0]
+        self.assertAlmostEqual(first.staleness, 0.5, places=2)
+        self.assertGreater(second.score, first.score)
+        self.clock.advance(days=365)
+        self.assertEqual(self.scheduler.plan([candidate], budget=10).decisions[0].staleness, MAX_STALENESS)
+
+    def test_upcoming_and_unseen_events_boost_fresh_tickers(self):
+        candidates = [
+            RefreshCandidate('EARN', 1, last_checked=NOW - timedelta(hours=2), earnings_date=date(2024, 7, 25)),
+            RefreshCandidate('DIV', 2, last_checked=days_ago(5), ex_dividend_date=date(2024, 7, 20)),
+            RefreshCandidate('SEEN', 3, last_checked=NOW - timedelta(hours=2), ex_dividend_date=date(2024, 7, 20)),
+            RefreshCandidate('FAR', 4, last_checked=NOW - timedelta(hours=2), earnings_date=date(2024, 9, 1)),
+        ]
+        decisions = {decision.candidate.ticker: decision for decision in self.scheduler.plan(candidates, budget=10).decisions}
+        self.assertEqual(decisions['EARN'].event, 'earnings 2024-07-25')
+        self.assertEqual(decisions['DIV'].event, 'ex-dividend 2024-07-20')
+        self.assertIsNone(decisions['SEEN'].event)
+        self.assertIsNone(decisions['FAR'].event)
+        self.assertEqual(self.scheduler.plan(candidates, budget=10).tickers, ['DIV', 'EARN'])
+
+    def test_failing_tickers_lose_priority(self):
+        healthy = RefreshCandidate('GOOD', 1, market_cap=1e9, last_checked=days_ago(40))
+        failing = healthy._replace(ticker='BAD', stock_id=2, error_rate=1.0)
+        plan = self.scheduler.plan([failing, healthy], budget=1)
+        self.assertEqual(plan.tickers, ['GOOD'])
+        self.assertAlmostEqual(plan.decisions[1].error_factor, 0.2)
+        self.assertAlmostEqual(plan.decisions[1].score, plan.decisions[0].score * 0.2)
+
+
+class RefreshStateTest(TestCase):
+
+    def setUp(self):
+        self.apple = ActiveStocksAlphaVantage.objects.create(
+            ticker='AAPL', name='Apple', exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker='AAPL'
+        )
+        self.gone = ActiveStocksAlphaVantage.objects.create(
+            ticker='GONE', name='Gone', exchange='NYSE', assetType='Stock', status='Active', yahoo_ticker='GONE'
+        )
+
+    def test_record_attempts_decays_error_rate(self):
+        record_attempts({self.apple.id: True, self.gone.id: False}, NOW)
+        record_attempts({self.gone.id: False}, NOW)
+        apple, gone = RefreshState.objects.get(active_stocks_alpha_vantage=self.apple), RefreshState.objects.get(active_stocks_alpha_vantage=self.gone)
+        self.assertEqual((apple.error_rate, apple.attempts, apple.last_error), (0.0, 1, None))
+        self.assertAlmostEqual(gone.error_rate, 0.51)
+        self.assertEqual((gone.attempts, gone.last_error), (2, NOW))
+
+    def test_load_candidates_joins_fundamentals_and_errors(self):
+        FundamentalData.objects.create(
+            active_stocks_alpha_vantage=self.apple, market_cap=3_000_000_000_000, average_volume=50_000_000,
+            last_checked=days_ago(3), earnings_date=date(2024, 8, 1),
+        )
+        record_attempts({self.gone.id: False}, NOW)
+        candidates = {candidate.ticker: candidate for candidate in load_candidates()}
+        self.assertEqual(candidates['AAPL'], RefreshCandidate(
+            'AAPL', self.apple.id, 3_000_000_000_000, 50_000_000, days_ago(3), 0.0, date(2024, 8, 1), None
+        ))
+        self.assertEqual(candidates['GONE'].error_rate, 0.3)
+        self.assertIsNone(candidates['GONE'].last_checked)
+
+    @patch('stock_tickers_handler.management.commands.fetch_info.Command.fetch_data_for_ticker')
+    def test_dry_run_explains_without_fetching(self, fetch):
+        out = io.StringIO()
+        call_command('fetch_info', '--budget', '1', '--dry-run', stdout=out)
+        fetch.assert_not_called()
+        self.assertEqual(out.getvalue().count(': refresh'), 1)
+        self.assertEqual(out.getvalue().count(': skip'), 1)
@@ -0,0 +1,118 @@
+import io
+from datetime import date
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from stock_tickers_handler.ingestion import rebuild_watermarks
+from stock_tickers_handler.models import HistoricalData, RollingWindow
+from stock_tickers_handler.rolling import RollingSums, advance_windows, track_window
+from stock_tickers_handler.tests.test_correlations import random_prices
+from stock_tickers_handler.tests.test_ingestion import make_frame
+from stock_tickers_handler.tests.test_performance import add_bars
+
+
+class RollingSumsTest(SimpleTestCase):
+
+    def test_matches_full_recomputation(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.normal(0, 0.01, 50), rng.normal(0, 0.01, 50)
+        sums = RollingSums(window=20)
+        for xi, yi in zip(x, y):
+            sums.push(xi, yi)
+
+        correlation, covariance, beta = sums.stats()
+        tail_x, tail_y = x[-20:], y[-20:]
+        expected_cov = np.cov(tail_x, tail_y)[0, 1]
+        self.assertAlmostEqual(covariance, expected_cov)
+        self.assertAlmostEqual(correlation, np.corrcoef(tail_x, tail_y)[0, 1])
+        self.assertAlmostEqual(beta, expected_cov / np.var(tail_y, ddof=1))
+
+    def test_sums_do_not_drift_after_large_values_leave(self):
+        sums = RollingSums(window=3)
+        for x in [1e8, 1e8, 1e8, 0.01, 0.02, 0.04]:
+            sums.push(x, x / 2)
+        # Without re-summing, subtracting the 1e16 squares leaves an error far larger than these variances
+        self.assertAlmostEqual(sums.stats()[1], np.var([0.01, 0.02, 0.04], ddof=1) / 2, places=12)
+        self.assertAlmostEqual(sums.stats()[0], 1.0)
+
+    def test_constant_benchmark_has_no_beta(self):
+        sums = RollingSums(window=3, pairs=[(0.01, 0.0), (0.02, 0.0), (0.03, 0.0)])
+        self.assertEqual(sums.stats()[::2], (None, None))
+
+
+class RollingWindowTest(TestCase):
+
+    def setUp(self):
+        closes = random_prices(80, 2)
+        self.days = list(pd.bdate_range('2024-01-02', periods=80).date)
+        add_bars('AAPL', dict(zip(self.days, closes[:, 0].round(4))))
+        add_bars('SPY', dict(zip(self.days, closes[:, 1].round(4))))
+        rebuild_watermarks()
+
+    def test_incremental_advance_matches_full_recomputation(self):
+        later = list(HistoricalData.objects.filter(date__gt=self.days[49]))
+        HistoricalData.objects.filter(date__gt=self.days[49]).delete()
+        window = track_window('AAPL', 'SPY', 20)
+        self.assertEqual(window.stats.count(), 30)  # 49 returns; the first full window ends on the 20th
+
+        # The nightly run only feeds the 30 new sessions through the stored window
+        for bar in later:
+            bar.pk = None
+        HistoricalData.objects.bulk_create(later)
+        self.assertEqual(advance_windows(['AAPL']), 30)
+
+        closes = pd.DataFrame(
+            list(HistoricalData.objects.order_by('date').values_list('active_stocks_alpha_vantage__yahoo_ticker', 'date', 'adj_close'))
+        ).pivot(index=1, columns=0, values=2).astype(float)
+        returns = closes.pct_change().iloc[1:]
+        expected_corr = returns['AAPL'].rolling(20).corr(returns['SPY']).dropna()
+        expected_beta = (returns['AAPL'].rolling(20).cov(returns['SPY']) / returns['SPY'].rolling(20).var()).dropna()
+
+        stats = list(window.stats.all())
+        self.assertEqual([stat.date for stat in stats], list(expected_corr.index))
+        np.testing.assert_allclose([stat.correlation for stat in stats], expected_corr.to_numpy(), atol=1e-9)
+        np.testing.assert_allclose([stat.beta for stat in stats], expected_beta.to_numpy(), atol=1e-9)
+
+    def test_rolling_endpoint_returns_series(self):
+        call_command('track_rolling_windows', 'aapl', '--window=60', stdout=io.StringIO())
+        response = self.client.get(reverse('rolling_correlations'), {'ticker': 'aapl', 'window': '60'})
+        payload = response.json()
+        self.assertEqual((payload['ticker'], payload['benchmark'], payload['window']), ('AAPL', 'SPY', 60))
+        self.assertEqual(len(payload['dates']), 20)
+        self.assertEqual(payload['dates'][-1], self.days[-1].isoformat())
+        self.assertEqual(len(payload['beta']), 20)
+
+    def test_rolling_endpoint_does_not_track_new_windows(self):
+        for ticker in ['NOPE', 'AAPL']:
+            response = self.client.get(reverse('rolling_correlations'), {'ticker': ticker, 'window': '30'})
+            self.assertEqual(response.status_code, 404)
+        self.assertFalse(RollingWindow.objects.exists())
+
+    def test_track_command_registers_and_stops_windows(self):
+        out = io.StringIO()
+        call_command('track_rolling_windows', 'AAPL', '--window=60', stdout=out)
+        self.assertIn('Tracking AAPL against SPY over 60 sessions: 20 stats', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('track_rolling_windows', 'NOPE', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('track_rolling_windows', 'AAPL', '--window=5000', stdout=io.StringIO())
+
+        call_command('track_rolling_windows', 'AAPL', '--window=60', '--stop', stdout=io.StringIO())
+        self.assertFalse(RollingWindow.objects.exists())
+
+    @patch('yfinance.Ticker')
+    def test_fetch_historicals_advances_tracked_windows(self, mock_ticker):
+        window = track_window('AAPL', 'SPY', 60)
+        mock_ticker.return_value.history.return_value = make_frame('2024-04-23', periods=3)
+
+        out = io.StringIO()
+        call_command('fetch_historicals', '--rate=0', '--loader=bulk', stdout=out)
+
+        window.refresh_from_db()
+        self.assertEqual(window.last_date, date(2024, 4, 25))
+        self.assertEqual(window.stats.count(), 23)
+        self.assertIn('Rolling window stats added: 3', out.getvalue())
@@ -0,0 +1,121 @@
+import time
+from decimal import Decimal
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+from stock_tickers_handler.screener import (
+    NUMERIC_FIELDS, Criterion, Screen, ScreenerSnapshot, load_snapshot, parse_screen, screener_snapshot,
+)
+from stock_tickers_handler.tests import benchmark
+
+
+def add_fundamentals(ticker, **fields):
+    stock = ActiveStocksAlphaVantage.objects.create(
+        ticker=ticker, name=ticker, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+    )
+    return FundamentalData.objects.create(active_stocks_alpha_vantage=stock, long_name=f'{ticker} Inc.', **fields)
+
+
+def random_snapshot(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    numeric = {
+        'trailing_pe': rng.uniform(-20, 80, rows),
+        'market_cap': rng.lognormal(22, 2, rows),
+        'dividend_yield': np.where(rng.random(rows) < 0.4, np.nan, rng.uniform(0, 0.08, rows)),
+        'upside': rng.normal(5, 20, rows),
+    }
+    sectors = rng.choice(['Technology', 'Energy', 'Healthcare', 'Utilities', None], rows)
+    return ScreenerSnapshot([f'T{row:05d}' for row in range(rows)], [f'Company {row}' for row in range(rows)], numeric, {'sector': sectors})
+
+
+class ScreenerSnapshotTest(SimpleTestCase):
+
+    def setUp(self):
+        self.snapshot = ScreenerSnapshot(
+            ['AAA', 'BBB', 'CCC', 'DDD'], ['A', 'B', 'C', 'D'],
+            {'trailing_pe': [10, 25, np.nan, 12], 'market_cap': [5e9, 2e12, 1e8, 5e9]},
+            {'sector': ['Energy', 'Technology', None, 'Energy']},
+        )
+
+    def test_criteria_combine_and_skip_missing_values(self):
+        result = self.snapshot.screen(Screen([Criterion('trailing_pe', 'lt', 20), Criterion('sector', 'in', ['Energy'])]))
+        self.assertEqual(result.total, 2)
+        self.assertEqual([row['ticker'] for row in result.rows], ['AAA', 'DDD'])
+        self.assertEqual(result.rows[0], {'ticker': 'AAA', 'long_name': 'A', 'sector': 'Energy', 'trailing_pe': 10.0})
+
+    def test_order_and_limit_break_ties_by_ticker(self):
+        result = self.snapshot.screen(Screen([], order_by='market_cap', descending=True, limit=3))
+        self.assertEqual([row['ticker'] for row in result.rows], ['BBB', 'AAA', 'DDD'])
+        result = self.snapshot.screen(Screen([], order_by='trailing_pe', limit=10))
+        self.assertEqual([row['ticker'] for row in result.rows], ['AAA', 'DDD', 'BBB'])
+        # CCC has no trailing P/E, so it is neither listed nor counted
+        self.assertEqual(result.total, 3)
+        self.assertEqual(self.snapshot.screen(Screen([])).total, 4)
+
+    def test_top_n_matches_full_sort(self):
+        snapshot = random_snapshot(10000)
+        screen = Screen([Criterion('trailing_pe', 'gt', 0), Criterion('dividend_yield', 'gte', 0.02)], 'upside', True, 25)
+        result = snapshot.screen(screen)
+        mask = (snapshot.numeric['trailing_pe'] > 0) & (snapshot.numeric['dividend_yield'] >= 0.02)
+        expected = snapshot.tickers[mask][np.argsort(-snapshot.numeric['upside'][mask], kind='stable')][:25]
+        self.assertEqual([row['ticker'] for row in result.rows], list(expected))
+        self.assertEqual(result.total, mask.sum())
+
+    @benchmark
+    def test_multi_criteria_screen_over_10k_rows_is_fast(self):
+        snapshot = random_snapshot(10000)
+        screen = parse_screen({
+            'trailing_pe__gt': '0', 'trailing_pe__lt': '25', 'market_cap__gte': '1e9',
+            'sector': 'Technology,Healthcare', 'order': '-dividend_yield', 'limit': '50',
+        })
+        timings = []
+        for _ in range(50):
+            started = time.perf_counter()
+            snapshot.screen(screen)
+            timings.append(time.perf_counter() - started)
+        self.assertLess(np.median(timings), 0.01)
+
+
+class ParseScreenTest(SimpleTestCase):
+
+    def test_parses_filters_order_and_limit(self):
+        screen = parse_screen({'trailing_pe__lt': '15', 'sector': 'Technology, Energy', 'order': '-market_cap', 'limit': '9999'})
+        self.assertEqual(screen.criteria, [Criterion('trailing_pe', 'lt', 15.0), Criterion('sector', 'in', ['Technology', 'Energy'])])
+        self.assertEqual((screen.order_by, screen.descending, screen.limit), ('market_cap', True, 500))
+
+    def test_rejects_unknown_fields(self):
+        self.assertIn('upside', NUMERIC_FIELDS)
+        for params in ({'long_business_summary__lt': '1'}, {'trailing_pe__like': '1'}, {'order': 'sector'}, {'beta__gt': 'x'}):
+            with self.assertRaises(ValueError):
+                parse_screen(params)
+
+
+class ScreenerViewTest(TestCase):
+
+    def setUp(self):
+        screener_snapshot.invalidate()
+        add_fundamentals('AAPL', sector='Technology', trailing_pe=Decimal('30.5'), market_cap=3_000_000_000_000)
+        add_fundamentals('XOM', sector='Energy', trailing_pe=Decimal('12.1'), market_cap=450_000_000_000, upside=Decimal('8.50'))
+
+    def test_load_snapshot_casts_decimals_to_floats(self):
+        snapshot = load_snapshot()
+        self.assertEqual(list(snapshot.tickers), ['AAPL', 'XOM'])
+        np.testing.assert_array_equal(snapshot.numeric['trailing_pe'], [30.5, 12.1])
+        self.assertTrue(np.isnan(snapshot.numeric['upside'][0]))
+
+    def test_screen_endpoint(self):
+        response = self.client.get(reverse('screener'), {'trailing_pe__lt': '20', 'order': '-market_cap'})
+        self.assertEqual(response.json(), {'total': 1, 'results': [
+            {'ticker': 'XOM', 'long_name': 'XOM Inc.', 'sector': 'Energy', 'trailing_pe': 12.1, 'market_cap': 450_000_000_000.0}
+        ]})
+        self.assertEqual(self.client.get(reverse('screener'), {'nope__lt': '1'}).status_code, 400)
+
+    def test_snapshot_follows_updates(self):
+        self.client.get(reverse('screener'))
+        apple = FundamentalData.objects.get(active_stocks_alpha_vantage__yahoo_ticker='AAPL')
+        apple.trailing_pe = Decimal('15')
+        apple.save()
+        screener_snapshot.invalidate()
+        response = self.client.get(reverse('screener'), {'trailing_pe__lt': '20'})
+        self.assertEqual(response.json()['total'], 2)
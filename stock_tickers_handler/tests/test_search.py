@@ -0,0 +1,136 @@
+import random
+import string
+import time
+import numpy as np
+from unittest.mock import patch
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from stock_tickers_handler.models import ActiveStocksAlphaVantage, FundamentalData
+from stock_tickers_handler.search import (
+    LISTING_FIELDS, VERSION_CHECK_INTERVAL, RankKey, SearchIndex, search_index, search_page, trigrams,
+)
+from stock_tickers_handler.tests import benchmark
+from stock_tickers_handler.tests.test_downloader import FakeClock
+
+
+def add_company(ticker, long_name):
+    stock = ActiveStocksAlphaVantage.objects.create(
+        ticker=ticker, name=long_name, exchange='NASDAQ', assetType='Stock', status='Active', yahoo_ticker=ticker
+    )
+    return FundamentalData.objects.create(active_stocks_alpha_vantage=stock, long_name=long_name)
+
+
+class SearchIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = SearchIndex([
+            (1, 'AAPL', 'Apple Inc.'),
+            (2, 'AAP', 'Advance Auto Parts, Inc.'),
+            (3, 'AAPB', 'GraniteShares 2x Long AAPL Daily ETF'),
+            (4, 'APLE', 'Apple Hospitality REIT, Inc.'),
+            (5, 'MSFT', 'Microsoft Corporation'),
+        ])
+
+    def test_trigrams_follow_pg_trgm(self):
+        self.assertEqual(trigrams('Cat'), {'  c', ' ca', 'cat', 'at '})
+
+    def test_exact_then_prefix_then_fuzzy(self):
+        self.assertEqual(self.index.search('aap'), [2, 3, 1])
+        self.assertEqual(self.index.search('apple'), [1, 4])
+        self.assertEqual(self.index.search('AAPL')[0], 1)
+
+    def test_limit_and_empty_query(self):
+        self.assertEqual(self.index.search('A', limit=2), [2, 3])
+        self.assertEqual(self.index.search('  '), [])
+
+    def test_ranked_resumes_after_any_key(self):
+        self.assertEqual([key.tier for key, _ in self.index.ranked('aap')], [0, 1, 1])
+        self.assertEqual([key.tier for key, _ in self.index.ranked('ap')], [1, 2])
+        for query in ('aap', 'ap', 'apple'):
+            ranked = list(self.index.ranked(query))
+            for position, (key, _) in enumerate(ranked):
+                self.assertEqual(list(self.index.ranked(query, after=key)), ranked[position + 1:])
+
+    def test_cursor_round_trip(self):
+        key = RankKey(2, -667, 'BRK-B')
+        self.assertEqual(RankKey.decode(key.encode()), key)
+        self.assertIsNone(RankKey.decode('garbage'))
+
+    @benchmark
+    def test_p95_latency_on_12k_tickers(self):
+        rng = random.Random(0)
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(3000)]
+        entries = []
+        for entry_id in range(12000):
+            ticker = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 5))) + str(entry_id)
+            entries.append((entry_id, ticker, ' '.join(rng.choices(words, k=3)) + ' Inc.'))
+        index = SearchIndex(entries)
+        queries = [entries[rng.randrange(12000)][1][:rng.randint(1, 3)] for _ in range(100)]
+        queries += [rng.choice(words)[:rng.randint(3, 8)] for _ in range(100)]
+
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - started)
+        self.assertLess(np.percentile(timings, 95), 0.02)
+
+
+class SearchViewTest(TestCase):
+
+    def setUp(self):
+        search_index.invalidate()
+
+    def test_ranked_results(self):
+        add_company('APLE', 'Apple Hospitality REIT, Inc.')
+        add_company('AAPL', 'Apple Inc.')
+        response = self.client.get(reverse('search'), {'query': 'apple'})
+        self.assertEqual([stock['long_name'] for stock in response.context['results']], ['Apple Inc.', 'Apple Hospitality REIT, Inc.'])
+
+    def test_index_picks_up_new_fundamentals_after_check_interval(self):
+        clock = FakeClock()
+        add_company('AAPL', 'Apple Inc.')
+        with patch.object(search_index, 'clock', clock):
+            self.assertEqual(search_page('micro').results, [])
+            add_company('MSFT', 'Microsoft Corporation')
+            # Within the interval the index is answered from memory, without probing the version
+            with self.assertNumQueries(0):
+                self.assertEqual(search_page('microsoft').results, [])
+
+            clock.now = VERSION_CHECK_INTERVAL
+            self.assertEqual([stock['long_name'] for stock in search_page('microsoft').results], ['Microsoft Corporation'])
+
+
+class SearchPageTest(TestCase):
+
+    def setUp(self):
+        search_index.invalidate()
+        for position in range(7):
+            add_company(f'AB{position}', f'Company {position}')
+        add_company('AB', 'Abacus Holdings')
+        add_company('XYZ', 'Abacus Mining')
+
+    def test_pages_follow_cursor_without_gaps_or_repeats(self):
+        tickers, cursor, pages = [], None, 0
+        while True:
+            page = search_page('ab', cursor, page_size=3)
+            tickers.extend(row['ticker'] for row in page.results)
+            pages += 1
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(tickers, ['AB', *(f'AB{position}' for position in range(7)), 'XYZ'])
+
+    def test_rows_hold_only_listing_columns_without_count(self):
+        # Version check, index build, one projected page query; no COUNT(*) and no per-row queries
+        with self.assertNumQueries(3):
+            page = search_page('ab', page_size=4)
+        self.assertEqual(set(page.results[0]), set(LISTING_FIELDS))
+        self.assertNotIn('long_business_summary', page.results[0])
+        self.assertIsNotNone(page.next_cursor)
+
+    def test_json_api(self):
+        first = self.client.get(reverse('search_results'), {'query': 'abacus'}).json()
+        self.assertEqual([row['ticker'] for row in first['results']], ['AB', 'XYZ'])
+        self.assertIsNone(first['next_cursor'])
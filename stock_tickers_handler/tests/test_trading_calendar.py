@@ -0,0 +1,46 @@
+from datetime import date, datetime, time
+from django.test import SimpleTestCase
+from stock_tickers_handler.trading_calendar import (
+    EXCHANGE_TZ, easter_sunday, is_trading_day, last_closed_session, missing_sessions,
+    nyse_early_closes, nyse_holidays, session_close, trading_days,
+)
+
+
+class TradingCalendarTest(SimpleTestCase):
+
+    def test_2024_holidays_match_published_schedule(self):
+        self.assertEqual(sorted(nyse_holidays(2024)), [
+            date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29),
+            date(2024, 5, 27), date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2),
+            date(2024, 11, 28), date(2024, 12, 25),
+        ])
+        self.assertEqual(sorted(nyse_early_closes(2024)), [date(2024, 7, 3), date(2024, 11, 29), date(2024, 12, 24)])
+
+    def test_weekend_observance_rules(self):
+        # New Year's Day on a Saturday is not observed, Christmas on a Sunday moves to Monday
+        self.assertNotIn(date(2021, 12, 31), nyse_holidays(2021))
+        self.assertIn(date(2022, 12, 26), nyse_holidays(2022))
+        self.assertIn(date(2021, 12, 24), nyse_holidays(2021))
+        self.assertNotIn(date(2021, 12, 24), nyse_early_closes(2021))
+
+    def test_easter(self):
+        self.assertEqual(easter_sunday(2024), date(2024, 3, 31))
+        self.assertEqual(easter_sunday(2025), date(2025, 4, 20))
+
+    def test_special_closures_and_sessions(self):
+        self.assertFalse(is_trading_day(date(2025, 1, 9)))
+        self.assertEqual(len(trading_days(date(2024, 1, 1), date(2024, 12, 31))), 252)
+        self.assertEqual(session_close(date(2024, 11, 29)).time(), time(13, 0))
+
+    def test_last_closed_session(self):
+        # Before the close on a trading day the previous session is the latest final one
+        self.assertEqual(last_closed_session(datetime(2024, 7, 5, 12, 0, tzinfo=EXCHANGE_TZ)), date(2024, 7, 3))
+        self.assertEqual(last_closed_session(datetime(2024, 7, 5, 17, 0, tzinfo=EXCHANGE_TZ)), date(2024, 7, 5))
+        # Early close day is final in the afternoon
+        self.assertEqual(last_closed_session(datetime(2024, 12, 24, 14, 0, tzinfo=EXCHANGE_TZ)), date(2024, 12, 24))
+        # Monday holiday looks back past the weekend
+        self.assertEqual(last_closed_session(datetime(2024, 9, 2, 20, 0, tzinfo=EXCHANGE_TZ)), date(2024, 8, 30))
+
+    def test_missing_sessions_ignore_holidays(self):
+        dates = [date(2024, 3, 27), date(2024, 3, 28), date(2024, 4, 2)]
+        self.assertEqual(missing_sessions(dates), [date(2024, 4, 1)])
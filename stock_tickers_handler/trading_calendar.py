@@ -0,0 +1,149 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+# NYSE sessions are defined in New York local time
+EXCHANGE_TZ = ZoneInfo('America/New_York')
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# Daily bars are treated as final this long after the closing bell
+SETTLE_DELAY = timedelta(minutes=30)
+
+# Unscheduled full-day closures that no rule can predict
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11): 'September 11 attacks',
+    date(2001, 9, 12): 'September 11 attacks',
+    date(2001, 9, 13): 'September 11 attacks',
+    date(2001, 9, 14): 'September 11 attacks',
+    date(2004, 6, 11): 'National Day of Mourning for Ronald Reagan',
+    date(2007, 1, 2): 'National Day of Mourning for Gerald Ford',
+    date(2012, 10, 29): 'Hurricane Sandy',
+    date(2012, 10, 30): 'Hurricane Sandy',
+    date(2018, 12, 5): 'National Day of Mourning for George H. W. Bush',
+    date(2025, 1, 9): 'National Day of Mourning for Jimmy Carter',
+}
+
+
+def easter_sunday(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """The n-th given weekday (Monday=0) of a month; n=-1 means the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(holiday: date) -> date:
+    """Move a fixed-date holiday falling on a weekend to the nearest weekday."""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> Dict[date, str]:
+    """Full-day NYSE closures in a year, computed from the exchange's holiday rules."""
+    holidays = {}
+    new_year = date(year, 1, 1)
+    # New Year's Day on a Saturday is not observed on the preceding Friday
+    if new_year.weekday() != 5:
+        holidays[observed(new_year)] = "New Year's Day"
+    if year >= 1998:
+        holidays[nth_weekday(year, 1, 0, 3)] = 'Martin Luther King Jr. Day'
+    holidays[nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    holidays[easter_sunday(year) - timedelta(days=2)] = 'Good Friday'
+    holidays[nth_weekday(year, 5, 0, -1)] = 'Memorial Day'
+    if year >= 2022:
+        holidays[observed(date(year, 6, 19))] = 'Juneteenth'
+    holidays[observed(date(year, 7, 4))] = 'Independence Day'
+    holidays[nth_weekday(year, 9, 0, 1)] = 'Labor Day'
+    holidays[nth_weekday(year, 11, 3, 4)] = 'Thanksgiving Day'
+    holidays[observed(date(year, 12, 25))] = 'Christmas Day'
+    holidays.update({day: name for day, name in SPECIAL_CLOSURES.items() if day.year == year})
+    return holidays
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year: int) -> Dict[date, time]:
+    """Sessions in a year that close at 13:00 instead of 16:00."""
+    early_closes = {}
+    # Day before Independence Day and Christmas Eve close early only when they fall Monday to Thursday
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 4:
+            early_closes[day] = EARLY_CLOSE
+    early_closes[nth_weekday(year, 11, 3, 4) + timedelta(days=1)] = EARLY_CLOSE  # Day after Thanksgiving
+    return early_closes
+
+
+def is_trading_day(day: date) -> bool:
+    """True if NYSE holds a session on `day`."""
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+def session_close(day: date) -> datetime:
+    """Timezone-aware closing time of the session on `day`."""
+    close = nyse_early_closes(day.year).get(day, REGULAR_CLOSE)
+    return datetime.combine(day, close, tzinfo=EXCHANGE_TZ)
+
+
+def previous_trading_day(day: date) -> date:
+    """The last session strictly before `day`."""
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_trading_day(day: date) -> date:
+    """The first session strictly after `day`."""
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def last_closed_session(now: Optional[datetime] = None) -> date:
+    """The most recent session whose daily bar is final at `now` (timezone-aware, defaults to the current time)."""
+    now = (now or datetime.now(tz=EXCHANGE_TZ)).astimezone(EXCHANGE_TZ)
+    today = now.date()
+    if is_trading_day(today) and now >= session_close(today) + SETTLE_DELAY:
+        return today
+    return previous_trading_day(today)
+
+
+def trading_days(start: date, end: date) -> List[date]:
+    """All sessions between `start` and `end`, inclusive."""
+    days = []
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def missing_sessions(dates: Iterable[date], start: Optional[date] = None, end: Optional[date] = None) -> List[date]:
+    """Sessions between `start` and `end` (default: first and last of `dates`) that have no bar in `dates`."""
+    dates = set(dates)
+    if not dates:
+        return []
+    return [day for day in trading_days(start or min(dates), end or max(dates)) if day not in dates]
@@ -1,7 +1,7 @@
 from django.urls import path,include
 from stock_tickers_handler import views
 from django.views.generic import TemplateView
-from .views import indexes_view, search_view, charts_view, sectors_view, correlations_view,home
+from .views import indexes_view, search_view, search_results_view, autocomplete_view, screener_view, charts_view, sectors_view, correlations_view, rolling_correlations_view, home
 from debug_toolbar.toolbar import debug_toolbar_urls
 
 urlpatterns = [
@@ -9,9 +9,13 @@ urlpatterns = [
     path('', home, name='home'),
     path('indexes/', indexes_view, name='indexes'),
     path('search/', search_view, name='search'),
+    path('search/results/', search_results_view, name='search_results'),
+    path('search/autocomplete/', autocomplete_view, name='autocomplete'),
+    path('screener/', screener_view, name='screener'),
     path('charts/', charts_view, name='charts'),
     path('sectors/', sectors_view, name='sectors'),
     path('correlations/', correlations_view, name='correlations'),
+    path('correlations/rolling/', rolling_correlations_view, name='rolling_correlations'),
 
 ]+ debug_toolbar_urls()
 
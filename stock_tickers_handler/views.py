@@ -1,8 +1,18 @@
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
-from .models import HistoricalData,FundamentalData ,ActiveStocksAlphaVantage
+from .models import HistoricalData,FundamentalData ,ActiveStocksAlphaVantage, PerformanceSnapshot
+from .indexes import get_index_history
+from .correlations import (
+    MAX_TICKERS as MAX_CORRELATION_TICKERS, MAX_WINDOW_DAYS as MAX_CORRELATION_WINDOW_DAYS, METHODS as CORRELATION_METHODS,
+    get_correlations,
+)
+from .rolling import DEFAULT_BENCHMARK, DEFAULT_WINDOW, find_window
+from .search import search_page
+from .autocomplete import AUTOCOMPLETE_LIMIT, autocomplete
+from .screener import parse_screen, run_screen
 from datetime import datetime, timedelta
 import json
-import yfinance as yf
+import numpy as np
 from django.utils import timezone
 # TICKERS dictionary updated with sector names
 TICKERS = {
@@ -19,45 +29,31 @@ TICKERS = {
     'XLY': "Consumer Discretionary"
 }
 
-def get_sectors_data(tickers):
-    start_date = datetime.now().date() - timedelta(days=1000)
-    historical_data = HistoricalData.objects.filter(
-        active_stocks_alpha_vantage__yahoo_ticker=ticker,
-        date__gte=start_date
-    ).order_by('date')
-    
-    if historical_data.exists():
-        start_price = historical_data.first().adj_close
-        end_price = historical_data.last().adj_close
-        performance_change = ((end_price - start_price) / start_price) * 100
-        return float('{:.2f}'.format(performance_change))  # Format to 2 decimal places and return performance_change
-    
-    return None
+# Page periods and the PerformanceSnapshot columns holding them
+PERIOD_FIELDS = {
+    '5_years': 'return_5y',
+    '2_years': 'return_2y',
+    '1_year': 'return_1y',
+    '3_months': 'return_3m',
+    '1_month': 'return_1m',
+    '1_week': 'return_1w',
+}
 
-def sectors_view(request):
-    performance_data = {
-        '5_years': {},
-        '2_years': {},
-        '1_year': {},
-        '3_months': {},
-        '1_month': {},
-        '1_week': {},
-    }
+def get_sectors_data(tickers=TICKERS):
+    # Returns {period: {sector: change %}} read from the precomputed snapshots (refreshed by fetch_historicals)
+    snapshots = PerformanceSnapshot.objects.filter(
+        active_stocks_alpha_vantage__yahoo_ticker__in=list(tickers)
+    ).values_list('active_stocks_alpha_vantage__yahoo_ticker', *PERIOD_FIELDS.values())
 
-    for ticker, sector in TICKERS.items():
-        for period in performance_data.keys():
-            days = {
-                '5_years': 1825,
-                '2_years': 730,
-                '1_year': 365,
-                '3_months': 90,
-                '1_month': 30,
-                '1_week': 7,
-            }[period]
-            
-            performance = get_sector_performance(ticker, days)
-            if performance is not None:
-                performance_data[period][sector] = performance
+    performance_data = {period: {} for period in PERIOD_FIELDS}
+    for ticker, *changes in snapshots:
+        for period, change in zip(PERIOD_FIELDS, changes):
+            if change is not None:
+                performance_data[period][tickers[ticker]] = change
+    return performance_data
+
+def sectors_view(request):
+    performance_data = get_sectors_data()
 
     # Sort data by performance
     sorted_performance_data = {
@@ -65,47 +61,22 @@ def sectors_view(request):
         for period, data in performance_data.items()
     }
 
-    return render(request, 'sectors.html', {'performance_data': json.dumps(performance_data)})
+    return render(request, 'sectors.html', {'performance_data': json.dumps(sorted_performance_data)})
 
 
 
 
 
 def indexes_view(request):
-    # Definiuj tickery dla różnych indeksów i surowców
-    tickers = {
-        'S&P 500': '^GSPC',
-        'NASDAQ': '^IXIC',
-        'Dow Jones': '^DJI',
-        'DAX': '^GDAXI',
-        'FTSE 100': '^FTSE',
-        'CAC 40': '^FCHI',
-        'Hang Seng': '^HSI',
-        'Nikkei 225': '^N225',
-        'Gold': 'GC=F',
-        'Silver': 'SI=F',
-        'Palladium': 'PA=F',
-        'Platinum': 'PL=F',
-        'Crude Oil': 'CL=F',
-        'Natural Gas': 'NG=F',
-    }
-
-    # Oblicz daty początkową i końcową
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=365 * 2)  # 2 lata wstecz
-
+    # One multi-symbol download shared by all requests through a stale-while-revalidate cache
     index_data = {}
-    for index, ticker in tickers.items():
-        # Pobierz dane z yfinance
-        data = yf.download(ticker, start=start_date, end=end_date)
-
-        if not data.empty:  # Sprawdź, czy dane zostały pobrane
-            index_data[index] = {
-                'current_price': data['Close'].iloc[-1],  # Ostatnia cena zamknięcia
-                'day_change': ((data['Close'].iloc[-1] - data['Close'].iloc[-2]) / data['Close'].iloc[-2]) * 100,  # Procentowa zmiana w ciągu ostatniego dnia
-                'prices': data['Close'].tolist(),  # Lista cen zamknięcia
-                'dates': data.index.strftime('%Y-%m-%d').tolist()  # Lista dat
-            }
+    for index, series in get_index_history().items():
+        index_data[index] = {
+            'current_price': series.current_price,  # Ostatnia cena zamknięcia
+            'day_change': series.day_change,  # Procentowa zmiana w ciągu ostatniego dnia
+            'prices': series.closes.tolist(),  # Lista cen zamknięcia
+            'dates': np.datetime_as_string(series.dates).tolist()  # Lista dat
+        }
 
     context = {
         'index_data': index_data,
@@ -113,17 +84,32 @@ def indexes_view(request):
     return render(request, 'indexes.html', context)
 def search_view(request):
     query = request.GET.get('query', '')  # Get the search query from the request
-    results = []
-
-    if query:  # If a query is provided
-        # Filtering the FundamentalData based on the search query
-        results = FundamentalData.objects.filter(
-            active_stocks_alpha_vantage__yahoo_ticker__icontains=query
-        ) | FundamentalData.objects.filter(
-            long_name__icontains=query
-        )
-
-    return render(request, 'search.html', {'results': results})
+    # Ranked (exact ticker, ticker prefix, fuzzy company name) and keyset-paginated through the cursor
+    page = search_page(query, request.GET.get('cursor'))
+    return render(request, 'search.html', {'query': query, 'results': page.results, 'next_cursor': page.next_cursor})
+
+def search_results_view(request):
+    # Same pages as search_view as JSON: follow next_cursor until it is null
+    page = search_page(request.GET.get('query', ''), request.GET.get('cursor'))
+    return JsonResponse({'results': page.results, 'next_cursor': page.next_cursor})
+
+def autocomplete_view(request):
+    # Ticker and company name prefix suggestions, answered from the in-process index
+    query = request.GET.get('query', '')
+    try:
+        limit = min(max(1, int(request.GET.get('limit', AUTOCOMPLETE_LIMIT))), 50)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    return JsonResponse({'query': query, 'results': autocomplete.complete(query, limit)})
+
+def screener_view(request):
+    # Filters and sorts the whole universe in memory, e.g. ?trailing_pe__lt=15&sector=Technology&order=-market_cap
+    try:
+        screen = parse_screen(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    result = run_screen(screen)
+    return JsonResponse({'total': result.total, 'results': result.rows})
 
 def charts_view(request):
     # Logika widoku dla Charts
@@ -134,8 +120,67 @@ def charts_view(request):
     }
     return render(request, 'charts.html', {'performance_data': json.dumps(performance_data)})
 def correlations_view(request):
-    # Logika widoku dla Correlations
-    return render(request, 'correlations.html')
+    # Tickers come as a comma-separated list; the sector ETFs are shown by default
+    tickers = [ticker.strip().upper() for ticker in request.GET.get('tickers', '').split(',') if ticker.strip()] or list(TICKERS)
+    if len(set(tickers)) > MAX_CORRELATION_TICKERS:
+        return HttpResponseBadRequest(f'At most {MAX_CORRELATION_TICKERS} tickers can be correlated at once')
+    method = request.GET.get('method', 'pearson')
+    if method not in CORRELATION_METHODS:
+        method = 'pearson'
+    try:
+        window = min(max(30, int(request.GET.get('window', 365))), MAX_CORRELATION_WINDOW_DAYS)
+    except ValueError:
+        window = 365
+
+    result = get_correlations(tickers, window)
+    matrix = getattr(result, method)
+    pairs = [
+        {'ticker_1': result.tickers[i], 'ticker_2': result.tickers[j], 'correlation': float(matrix[i, j]), 'observations': int(result.observations[i, j])}
+        for i, j in zip(*np.triu_indices(len(result.tickers), k=1))
+        if not np.isnan(matrix[i, j])
+    ]
+    pairs.sort(key=lambda pair: abs(pair['correlation']), reverse=True)
+
+    context = {
+        'tickers': ','.join(result.tickers),
+        'window': window,
+        'method': method,
+        'methods': CORRELATION_METHODS,
+        'pairs': pairs,
+    }
+    return render(request, 'correlations.html', context)
+
+def rolling_correlations_view(request):
+    # Rolling correlation, covariance and beta of a ticker against a benchmark (SPY by default) as JSON;
+    # only windows registered with the track_rolling_windows command are served
+    ticker = request.GET.get('ticker', '').strip().upper()
+    benchmark = request.GET.get('benchmark', DEFAULT_BENCHMARK).strip().upper()
+    try:
+        window = int(request.GET.get('window', DEFAULT_WINDOW))
+    except ValueError:
+        return JsonResponse({'error': 'window must be a number of sessions'}, status=400)
+    if not ticker:
+        return JsonResponse({'error': 'ticker is required'}, status=400)
+
+    rolling_window = find_window(ticker, benchmark, window)
+    if rolling_window is None:
+        return JsonResponse({'error': f'{ticker} against {benchmark} over {window} sessions is not tracked'}, status=404)
+
+    dates, correlation, covariance, beta = [], [], [], []
+    for day, corr, cov, b in rolling_window.stats.values_list('date', 'correlation', 'covariance', 'beta'):
+        dates.append(day.isoformat())
+        correlation.append(corr)
+        covariance.append(cov)
+        beta.append(b)
+    return JsonResponse({
+        'ticker': ticker,
+        'benchmark': benchmark,
+        'window': window,
+        'dates': dates,
+        'correlation': correlation,
+        'covariance': covariance,
+        'beta': beta,
+    })
      
 def home(request):
     return render(request, 'base.html')
\ No newline at end of file